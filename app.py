@@ -1,5 +1,8 @@
 # app.py
-import gradio as gr
+import os
+import re
+from functools import partial
+
 from builder_utils import (
     DEFAULT_SYSTEM,
     DEFAULT_TEMPLATE,
@@ -8,16 +11,98 @@ from builder_utils import (
     DEFAULT_CODE,
     DEFAULT_ANSWER,
     COLUMNS,
+    DEFAULT_PAGE_SIZE,
     # core ops
     render_preview_with_template,
-    add_example_and_summarize_with_template,
+    add_example_incremental,
     get_example_detail,
-    delete_example_and_summarize,
+    dataset_page,
+    page_of_index,
     export_jsonl_with_options,
     export_single_json_object,
+    RENDER_CACHE,
+    _timestamped_path,
+)
+from dataset_store import open_dataset, valid_dataset_id
+from export_jobs import EXPORT_JOBS, FINISHED, DONE, QUEUED, RUNNING, CANCELLED, FAILED
+from edit_history import (
+    DEFAULT_REPLACE_FIELDS,
+    EDITABLE_FIELDS,
+    history_for_dataset,
+    parse_positions,
+)
+from code_validation import VALIDATOR, format_issues, issue_rows, summarize as summarize_code_issues, validate_records
+from metrics import METRICS, SUMMARY_COLUMNS, SamplingProfiler, handler, timed
+from sharded_export import export_sharded
+from incremental_export import export_incremental_for_dataset
+from import_utils import import_into, format_import_status
+from retrieval_index import (
+    export_with_index,
+    index_for_dataset,
+    on_records_added,
+    on_record_deleted,
+    drop_dataset_index,
+    similar_rows,
+)
+from search_index import (
+    search_index_for_dataset,
+    search_page,
+    on_records_added as search_on_records_added,
+    on_record_deleted as search_on_record_deleted,
+    drop_dataset_index as search_drop_dataset_index,
 )
+from dedup_utils import (
+    dedup_index_for_dataset,
+    format_duplicates,
+    on_record_deleted as dedup_on_record_deleted,
+    drop_dataset_index as dedup_drop_dataset_index,
+)
+
+SIMILAR_K = 10
+CODE_ISSUE_ROWS = 500
+EXPORT_POLL_SECONDS = 1.0
+SEARCH_SCOPES = {"Any": None, "Per-example": "per", "Global (one-time)": "global"}
+
+# Opt-in latency metrics for the core ops (FEWSHOT_METRICS=1; unchanged functions otherwise)
+render_preview_with_template = timed(render_preview_with_template)
+add_example_incremental = timed(add_example_incremental)
+get_example_detail = timed(get_example_detail)
+dataset_page = timed(dataset_page)
+export_jsonl_with_options = timed(export_jsonl_with_options)
+export_single_json_object = timed(export_single_json_object)
+export_sharded = timed(export_sharded)
+export_incremental_for_dataset = timed(export_incremental_for_dataset)
+
+def _register_gauges():
+    METRICS.gauge(
+        "fewshot_render_cache_entries", "Texts held by the shared render cache.",
+        lambda: RENDER_CACHE.stats()["entries"],
+    )
+    METRICS.gauge(
+        "fewshot_render_cache_hit_rate", "Share of renders served from the cache since start.",
+        lambda: RENDER_CACHE.stats()["hit_rate"],
+    )
+    METRICS.gauge(
+        "fewshot_export_jobs", "Tracked export jobs by status.",
+        lambda: {(("status", st),): n for st, n in EXPORT_JOBS.counts().items()} or {(("status", QUEUED),): 0},
+    )
+
+def _diagnostics_text():
+    cache = RENDER_CACHE.stats()
+    code = VALIDATOR.stats()
+    jobs = EXPORT_JOBS.counts()
+    return (
+        f"Render cache: {cache['entries']}/{cache['max_entries']} entries, "
+        f"{cache['hits']} hits, {cache['misses']} misses ({cache['hit_rate']:.0%} hit rate)\n"
+        f"Code check cache: {code['results']} results, {code['api_blocks']} API blocks "
+        f"({code['hit_rate']:.0%} hit rate)\n"
+        f"Export jobs: {jobs[RUNNING]} running, {jobs[QUEUED]} queued, "
+        f"{jobs[DONE]} done, {jobs[FAILED]} failed, {jobs[CANCELLED]} cancelled"
+    )
 
 def build_app():
+    import gradio as gr     # deferred: `import app` stays cheap; Gradio is paid for only when the UI is built
+
     with gr.Blocks(title="Few-shot Prompt Builder — Custom Template", theme=gr.themes.Soft()) as demo:
         gr.Markdown(
             "## 🧪 Few-shot Prompt Builder — Custom Template\n"
@@ -25,7 +110,15 @@ def build_app():
         )
 
         # States
-        dataset_state = gr.State([])                 # list[dict]
+        # Only the dataset id travels with events; records live server-side (dataset_store.SqliteDataset).
+        # Kept in localStorage so a browser refresh reopens the same dataset.
+        dataset_id = gr.BrowserState("", storage_key="fewshot_dataset_id")
+
+        def _open(did):
+            """This session's dataset. Events before demo.load restored the id are refused, not given a new one."""
+            if not valid_dataset_id(did):
+                raise gr.Error("The dataset is still loading. Please try again in a moment.")
+            return open_dataset(did)
         template_state = gr.State(DEFAULT_TEMPLATE.copy())
         keep_system_state = gr.State(True)           # hidden bool for JSONL export
 
@@ -134,7 +227,7 @@ def build_app():
                         gr.Markdown("Tip: copy from the preview box after rendering.")
 
                 preview_btn.click(
-                        render_preview_with_template,
+                        handler("render")(render_preview_with_template),
                         inputs=[template_state, system_global, global_apis, apis, question, thought, code, answer],
                         outputs=[preview, copy_helper]
                     )
@@ -154,8 +247,18 @@ def build_app():
                             value=[],
                             wrap=True,
                             interactive=False,
-                            label="Dataset (truncated previews)"
+                            label="Dataset (truncated previews, current page)"
                         )
+                        with gr.Row():
+                            prev_page_btn = gr.Button("◀ Prev page")
+                            page_num = gr.Number(  # 1-based page
+                                label="Page",
+                                value=1,
+                                precision=0,
+                                minimum=1,
+                                step=1,
+                            )
+                            next_page_btn = gr.Button("Next page ▶")
                         with gr.Row():
                             view_index = gr.Number(  # 1-based index
                                 label="Select example # (1-based)",
@@ -182,66 +285,548 @@ def build_app():
                     return max(1, min(i, total))
 
                 # On number change (typing or arrow keys): coerce to int and update viewer
-                def _on_index_change(idx, state):
-                    total = len(state or [])
+                @handler("view")
+                def _on_index_change(idx, did):
+                    ds = _open(did)
+                    total = len(ds)
                     clean = _sanitize_index(idx, total)
-                    view = get_example_detail(state, clean) if total else "Dataset is empty."
+                    view = get_example_detail(ds, clean) if total else "Dataset is empty."
                     return clean, view
 
                 view_index.change(
                     _on_index_change,
-                    inputs=[view_index, dataset_state],
+                    inputs=[view_index, dataset_id],
                     outputs=[view_index, full_view],
                 )
 
                 # View button: clamp index, update viewer and write back the cleaned index
-                def _view_and_fix(state, idx):
-                    total = len(state or [])
-                    idx1 = _sanitize_index(idx, total)
-                    return get_example_detail(state, idx1), idx1
+                @handler("view")
+                def _view_and_fix(did, idx):
+                    ds = _open(did)
+                    idx1 = _sanitize_index(idx, len(ds))
+                    return get_example_detail(ds, idx1), idx1
 
                 view_btn.click(
                     _view_and_fix,
-                    inputs=[dataset_state, view_index],
+                    inputs=[dataset_id, view_index],
                     outputs=[full_view, view_index]
                 )
 
-                # Delete: refresh viewer & clamp index
-                def _delete_and_refresh(state, idx):
-                    new_state, msg, new_count, rows = delete_example_and_summarize(state, idx)
+                # Pagination: only the visible page of rows is sent to the browser
+                @handler("page")
+                def _show_page(did, page):
+                    rows, page, _ = dataset_page(_open(did), page, DEFAULT_PAGE_SIZE)
+                    return rows, page
+
+                page_num.submit(
+                    _show_page,
+                    inputs=[dataset_id, page_num],
+                    outputs=[dataset_table, page_num],
+                )
+                prev_page_btn.click(
+                    lambda did, page: _show_page(did, (page or 1) - 1),
+                    inputs=[dataset_id, page_num],
+                    outputs=[dataset_table, page_num],
+                )
+                next_page_btn.click(
+                    lambda did, page: _show_page(did, (page or 1) + 1),
+                    inputs=[dataset_id, page_num],
+                    outputs=[dataset_table, page_num],
+                )
+
+                # Delete: recorded in the edit history (undoable like batch deletes); refresh viewer & clamp index
+                @handler("delete")
+                def _delete_and_refresh(did, idx):
+                    ds = _open(did)
+                    before = len(ds)
+                    try:
+                        i = int(float(idx))
+                    except (TypeError, ValueError):
+                        i = None
+                    if i is None or not 1 <= i <= before:
+                        msg = ("Please enter a valid integer index." if i is None
+                               else f"Index out of range. Enter 1–{before}.")
+                        rows, page, _ = dataset_page(ds, 1, DEFAULT_PAGE_SIZE)
+                        return msg, before, rows, page, gr.skip(), gr.skip()
+                    history = history_for_dataset(ds)
+                    history.delete([i - 1])
+                    on_record_deleted(ds.id, i - 1)
+                    search_on_record_deleted(ds.id, i - 1)
+                    dedup_on_record_deleted(ds.id, i - 1)
+                    new_count = len(ds)
+                    msg = f"🗑️ Deleted example #{i}.\n({history.describe()})"
+                    page = page_of_index(min(i, max(new_count, 1)), DEFAULT_PAGE_SIZE)
+                    rows, page, _ = dataset_page(ds, page, DEFAULT_PAGE_SIZE)
                     if new_count == 0:
-                        return new_state, msg, new_count, rows, "Dataset is now empty.", 1
-                    idx1 = _sanitize_index(idx, new_count)
-                    full = get_example_detail(new_state, idx1)
-                    return new_state, msg, new_count, rows, full, idx1
+                        return msg, new_count, rows, page, "Dataset is now empty.", 1
+                    idx1 = _sanitize_index(i, new_count)
+                    return msg, new_count, rows, page, get_example_detail(ds, idx1), idx1
 
                 delete_btn.click(
                     _delete_and_refresh,
-                    inputs=[dataset_state, view_index],
-                    outputs=[dataset_state, builder_feedback, count, dataset_table, full_view, view_index]
+                    inputs=[dataset_id, view_index],
+                    outputs=[builder_feedback, count, dataset_table, page_num, full_view, view_index]
+                )
+
+                # Batch edit: multi / range delete, field edit, find-and-replace; every step can be undone
+                gr.Markdown("#### ✏️ Batch edit")
+                with gr.Row():
+                    edit_positions = gr.Textbox(label="Examples to delete (e.g. 3, 7, 10-20)", lines=1)
+                    delete_listed_btn = gr.Button("🗑️ Delete listed", variant="stop")
+                with gr.Row():
+                    edit_field = gr.Dropdown(
+                        label="Field of the selected example", choices=list(EDITABLE_FIELDS), value="question"
+                    )
+                    load_field_btn = gr.Button("📝 Load field")
+                    save_field_btn = gr.Button("💾 Save field")
+                edit_value = gr.Textbox(label="Field text", lines=6)
+                with gr.Row():
+                    find_text = gr.Textbox(label="Find", lines=1)
+                    replace_text = gr.Textbox(label="Replace with", lines=1)
+                    replace_fields = gr.CheckboxGroup(
+                        label="In fields", choices=list(EDITABLE_FIELDS), value=list(DEFAULT_REPLACE_FIELDS)
+                    )
+                    replace_regex = gr.Checkbox(label="Regular expression", value=False)
+                    replace_case = gr.Checkbox(label="Match case", value=True)
+                    replace_btn = gr.Button("🔁 Replace all")
+                with gr.Row():
+                    undo_btn = gr.Button("↩️ Undo")
+                    redo_btn = gr.Button("↪️ Redo")
+                    edit_status = gr.Textbox(label="Edit status", lines=2, interactive=False)
+
+                def _after_edit(ds, msg, page, idx):
+                    # Positions shifted or texts changed: positional indexes are rebuilt on next use
+                    drop_dataset_index(ds.id)
+                    search_drop_dataset_index(ds.id)
+                    dedup_drop_dataset_index(ds.id)
+                    rows, page, _ = dataset_page(ds, page, DEFAULT_PAGE_SIZE)
+                    n = len(ds)
+                    view = get_example_detail(ds, _sanitize_index(idx, n)) if n else "Dataset is empty."
+                    return f"{msg}\n({history_for_dataset(ds).describe()})", n, rows, page, view
+
+                def _no_change(ds, msg, page):
+                    rows, page, _ = dataset_page(ds, page, DEFAULT_PAGE_SIZE)
+                    return msg, len(ds), rows, page, gr.skip()
+
+                @handler("delete_many")
+                def _delete_listed(did, text, page, idx):
+                    ds = _open(did)
+                    try:
+                        positions = parse_positions(text, len(ds))
+                    except ValueError as e:
+                        return _no_change(ds, f"⚠️ {e}", page)
+                    if not positions:
+                        return _no_change(ds, "Enter example numbers or ranges to delete.", page)
+                    history = history_for_dataset(ds)
+                    if positions[-1] - positions[0] + 1 == len(positions):
+                        n = history.delete_range(positions[0], positions[-1] + 1)
+                    else:
+                        n = history.delete(positions)
+                    return _after_edit(ds, f"🗑️ Deleted {n} examples.", page, idx)
+
+                @handler("view")
+                def _load_field(did, idx, field):
+                    ds = _open(did)
+                    if not len(ds):
+                        return gr.skip(), "Dataset is empty."
+                    i = _sanitize_index(idx, len(ds))
+                    return ds[i - 1].get(field) or "", f"Loaded {field} of example #{i}."
+
+                @handler("edit")
+                def _save_field(did, idx, field, value, page):
+                    ds = _open(did)
+                    if not len(ds):
+                        return _no_change(ds, "Dataset is empty.", page)
+                    i = _sanitize_index(idx, len(ds))
+                    try:
+                        changed = history_for_dataset(ds).edit(i - 1, {field: value})
+                    except ValueError as e:
+                        return _no_change(ds, f"⚠️ {e}", page)
+                    if not changed:
+                        return _no_change(ds, f"Example #{i} unchanged.", page)
+                    return _after_edit(ds, f"💾 Saved {field} of example #{i}.", page, i)
+
+                @handler("replace")
+                def _replace_all(did, find, repl, fields, regex, case, page, idx, progress=gr.Progress()):
+                    ds = _open(did)
+                    def _report(done, total):
+                        progress((done, total), desc="Replacing")
+                    try:
+                        n, total = history_for_dataset(ds).replace(
+                            find, repl or "", fields or DEFAULT_REPLACE_FIELDS, regex, case, progress=_report
+                        )
+                    except (ValueError, re.error) as e:
+                        return _no_change(ds, f"⚠️ {e}", page)
+                    if not n:
+                        return _no_change(ds, "No matches.", page)
+                    return _after_edit(ds, f"🔁 Replaced {total} matches in {n} examples.", page, idx)
+
+                @handler("undo")
+                def _undo_edit(did, page, idx, redo=False):
+                    ds = _open(did)
+                    history = history_for_dataset(ds)
+                    label = history.redo() if redo else history.undo()
+                    if label is None:
+                        return _no_change(ds, "Nothing to redo." if redo else "Nothing to undo.", page)
+                    return _after_edit(ds, f"{'↪️ Redid' if redo else '↩️ Undid'}: {label}.", page, idx)
+
+                edit_outputs = [edit_status, count, dataset_table, page_num, full_view]
+                delete_listed_btn.click(
+                    _delete_listed, inputs=[dataset_id, edit_positions, page_num, view_index], outputs=edit_outputs
+                )
+                load_field_btn.click(
+                    _load_field, inputs=[dataset_id, view_index, edit_field], outputs=[edit_value, edit_status]
+                )
+                save_field_btn.click(
+                    _save_field, inputs=[dataset_id, view_index, edit_field, edit_value, page_num], outputs=edit_outputs
+                )
+                replace_btn.click(
+                    _replace_all,
+                    inputs=[dataset_id, find_text, replace_text, replace_fields, replace_regex, replace_case,
+                            page_num, view_index],
+                    outputs=edit_outputs,
+                )
+                undo_btn.click(_undo_edit, inputs=[dataset_id, page_num, view_index], outputs=edit_outputs)
+                redo_btn.click(
+                    lambda did, page, idx: _undo_edit(did, page, idx, redo=True),
+                    inputs=[dataset_id, page_num, view_index],
+                    outputs=edit_outputs,
+                )
+
+                with gr.Row():
+                    import_file = gr.File(
+                        label="Import JSONL / JSON (exports of this tool)",
+                        file_types=[".jsonl", ".json"],
+                        type="filepath",
+                    )
+                    import_btn = gr.Button("📥 Import into dataset")
+                @handler("import")
+                def _import_dataset(did, path, system, progress=gr.Progress()):
+                    ds = _open(did)
+                    if not path:
+                        rows, page, _ = dataset_page(ds, 1, DEFAULT_PAGE_SIZE)
+                        return "Please choose a file to import.", len(ds), rows, page
+                    before = len(ds)
+                    def _report(done, total):
+                        progress(None, desc=f"Imported {done} records")
+                    # Flag imported records that duplicate existing ones or each other
+                    dedup = dedup_index_for_dataset(ds)
+                    dups = []
+                    def _check(batch):
+                        start = len(dedup)
+                        for i, rec in enumerate(batch):
+                            found = dedup.check_and_add(rec)
+                            if found:
+                                dups.append((start + i, found[0][0]))
+                    # Records exported without 'system' take the current System message
+                    try:
+                        n, errors = import_into(ds, path, default_system=system, progress=_report, on_batch=_check)
+                    except Exception:
+                        dedup_drop_dataset_index(ds.id)
+                        raise
+                    finally:
+                        drop_dataset_index(ds.id)   # rebuilt in bulk on the next similarity search
+                        search_drop_dataset_index(ds.id)
+                    msg = format_import_status(n, errors, path)
+                    if dups:
+                        shown = ", ".join(f"#{a + 1} ≈ #{b + 1}" for a, b in dups[:10])
+                        more = f" … and {len(dups) - 10} more" if len(dups) > 10 else ""
+                        msg += f"\n⚠️ {len(dups)} imported records look like duplicates: {shown}{more}"
+                    if n:
+                        found = validate_records(ds[before:])
+                        if found:
+                            msg += "\n" + summarize_code_issues(found, n, offset=before)
+                    rows, page, _ = dataset_page(ds, 10 ** 9, DEFAULT_PAGE_SIZE)
+                    return msg, len(ds), rows, page
+
+                import_btn.click(
+                    _import_dataset,
+                    inputs=[dataset_id, import_file, system_global],
+                    outputs=[builder_feedback, count, dataset_table, page_num],
+                )
+
+                with gr.Row():
+                    similar_query = gr.Textbox(label="Find similar examples (question)", lines=2)
+                    similar_btn = gr.Button("🔍 Find similar")
+                similar_table = gr.Dataframe(
+                    headers=["#", "score", "question", "answer"],
+                    value=[],
+                    wrap=True,
+                    interactive=False,
+                    label=f"Top {SIMILAR_K} similar examples",
+                )
+                @handler("similar")
+                def _find_similar(did, query):
+                    ds = _open(did)
+                    if not (query or "").strip() or not len(ds):
+                        return []
+                    return similar_rows(ds, index_for_dataset(ds), query, SIMILAR_K)
+
+                similar_btn.click(
+                    _find_similar,
+                    inputs=[dataset_id, similar_query],
+                    outputs=[similar_table],
+                )
+
+                # Code check: syntax and calls to APIs not declared in the record's APIs blocks
+                with gr.Row():
+                    validate_btn = gr.Button("🧪 Check code against APIs")
+                    validate_status = gr.Textbox(label="Code check status", lines=2, interactive=False)
+                validate_table = gr.Dataframe(
+                    headers=["#", "line", "problem"],
+                    value=[],
+                    wrap=True,
+                    interactive=False,
+                    label=f"Code issues (first {CODE_ISSUE_ROWS})",
+                )
+                @handler("validate")
+                def _validate_code(did, progress=gr.Progress()):
+                    ds = _open(did)
+                    if not len(ds):
+                        return [], "Dataset is empty."
+                    def _report(done, total):
+                        progress((done, total), desc="Checking code")
+                    found = validate_records(ds, progress=_report)
+                    return issue_rows(found, limit=CODE_ISSUE_ROWS), summarize_code_issues(found, len(ds))
+
+                validate_btn.click(_validate_code, inputs=[dataset_id], outputs=[validate_table, validate_status])
+
+                # Search: words of answer/question/thought/code (all must match) + template filters
+                with gr.Row():
+                    search_query = gr.Textbox(label="Search examples (all words must match)", lines=1)
+                    search_scope = gr.Radio(label="APIs scope", choices=list(SEARCH_SCOPES), value="Any")
+                    search_sections = gr.CheckboxGroup(
+                        label="Must include sections",
+                        choices=["APIs", "Question", "Thought", "Code", "Answer"],
+                        value=[],
+                    )
+                    search_btn = gr.Button("🔎 Search")
+                search_table = gr.Dataframe(
+                    headers=COLUMNS,
+                    value=[],
+                    wrap=True,
+                    interactive=False,
+                    label="Matches (# is the example number to view or delete)",
+                )
+                with gr.Row():
+                    search_prev_btn = gr.Button("◀ Prev matches")
+                    search_page_num = gr.Number(label="Matches page", value=1, precision=0, minimum=1, step=1)
+                    search_next_btn = gr.Button("Next matches ▶")
+                    search_status = gr.Textbox(label="Search status", interactive=False)
+
+                @handler("search")
+                def _search(did, query, scope, sections, page):
+                    ds = _open(did)
+                    rows, page, n_pages, total = search_page(
+                        ds, search_index_for_dataset(ds), query, SEARCH_SCOPES.get(scope), sections,
+                        page, DEFAULT_PAGE_SIZE,
+                    )
+                    return rows, page, f"{total} matching examples (page {page} of {n_pages})."
+
+                search_inputs = [dataset_id, search_query, search_scope, search_sections]
+                search_outputs = [search_table, search_page_num, search_status]
+                search_btn.click(lambda *a: _search(*a, 1), inputs=search_inputs, outputs=search_outputs)
+                search_query.submit(lambda *a: _search(*a, 1), inputs=search_inputs, outputs=search_outputs)
+                search_page_num.submit(_search, inputs=search_inputs + [search_page_num], outputs=search_outputs)
+                search_prev_btn.click(
+                    lambda *a: _search(*a[:-1], (a[-1] or 1) - 1),
+                    inputs=search_inputs + [search_page_num],
+                    outputs=search_outputs,
+                )
+                search_next_btn.click(
+                    lambda *a: _search(*a[:-1], (a[-1] or 1) + 1),
+                    inputs=search_inputs + [search_page_num],
+                    outputs=search_outputs,
                 )
 
+                # Exports run as background jobs; a timer polls the job while it runs
+                jsonl_job = gr.State("")
+                json_job = gr.State("")
                 with gr.Row():
                     export_btn = gr.Button("📤 Export JSONL (per-line records)")
+                    export_cancel_btn = gr.Button("✖️ Cancel", variant="stop")
                     export_file = gr.File(label="Download JSONL", interactive=False)
                     export_status = gr.Textbox(label="Export status", lines=2)
-                export_btn.click(
-                    export_jsonl_with_options,
-                    inputs=[dataset_state, keep_system_state],
-                    outputs=[export_file, export_status]
+                export_pooled = gr.Checkbox(
+                    label="Deduplicate System/APIs text in JSONL (string table + references)",
+                    value=False,
+                )
+                export_index = gr.Checkbox(
+                    label="Save the retrieval index next to JSONL / JSON / sharded exports (.index.npz)",
+                    value=False,
                 )
+                export_timer = gr.Timer(EXPORT_POLL_SECONDS, active=False)
 
                 with gr.Row():
                     export_json_btn = gr.Button("📦 Export JSON (single object)")
+                    export_json_cancel_btn = gr.Button("✖️ Cancel", variant="stop")
                     export_json_file = gr.File(label="Download JSON", interactive=False)
                     export_json_status = gr.Textbox(label="Export status", lines=2)
+                export_json_timer = gr.Timer(EXPORT_POLL_SECONDS, active=False)
+
+                # Sharded: size-bounded shards of compressed blocks + offset index (see sharded_export)
+                shards_job = gr.State("")
+                with gr.Row():
+                    export_shards_btn = gr.Button("🗂️ Export sharded (random access)")
+                    export_shards_compression = gr.Radio(
+                        label="Block compression", choices=["gzip", "lzma", "none"], value="gzip"
+                    )
+                    export_shards_cancel_btn = gr.Button("✖️ Cancel", variant="stop")
+                    export_shards_files = gr.File(label="Download shards", file_count="multiple", interactive=False)
+                    export_shards_status = gr.Textbox(label="Export status", lines=2)
+                export_shards_timer = gr.Timer(EXPORT_POLL_SECONDS, active=False)
+
+                # Incremental: one file per dataset; only changes since the last export are appended
+                incremental_job = gr.State("")
+                with gr.Row():
+                    export_incremental_btn = gr.Button("➕ Export changes (incremental JSONL)")
+                    export_incremental_cancel_btn = gr.Button("✖️ Cancel", variant="stop")
+                    export_incremental_file = gr.File(label="Download incremental JSONL", interactive=False)
+                    export_incremental_status = gr.Textbox(label="Export status", lines=2)
+                export_incremental_timer = gr.Timer(EXPORT_POLL_SECONDS, active=False)
+
+                @handler("export")
+                def _start_export(label, fn, ds, *args, **kwargs):
+                    if not len(ds):
+                        return "", None, "No examples to export yet.", gr.Timer(active=False)
+                    job = EXPORT_JOBS.submit(label, fn, ds, *args, **kwargs)
+                    return job.id, None, job.describe(), gr.Timer(active=True)
+
+                def _exporter(fn, with_index):
+                    return partial(export_with_index, fn) if with_index else fn
+
+                @handler("export_poll")
+                def _poll_export(job_id):
+                    job = EXPORT_JOBS.get(job_id)
+                    if job is None:
+                        return gr.skip(), gr.skip(), gr.Timer(active=False)
+                    if job.status in FINISHED:
+                        path = job.path if job.status == DONE else None
+                        return path, job.describe(), gr.Timer(active=False)
+                    return gr.skip(), job.describe(), gr.Timer(active=True)
+
+                @handler("export_cancel")
+                def _cancel_export(job_id):
+                    if EXPORT_JOBS.cancel(job_id):
+                        return "Cancelling…"
+                    return gr.skip()
+
+                export_btn.click(
+                    lambda did, keep_system, pooled, with_index: _start_export(
+                        "JSONL export", _exporter(export_jsonl_with_options, with_index), _open(did), keep_system,
+                        pooled=pooled,
+                    ),
+                    inputs=[dataset_id, keep_system_state, export_pooled, export_index],
+                    outputs=[jsonl_job, export_file, export_status, export_timer],
+                )
+                export_timer.tick(_poll_export, inputs=[jsonl_job], outputs=[export_file, export_status, export_timer])
+                export_cancel_btn.click(_cancel_export, inputs=[jsonl_job], outputs=[export_status])
+
                 export_json_btn.click(
-                    export_single_json_object,
-                    inputs=[dataset_state, system_global, template_state, global_apis],
-                    outputs=[export_json_file, export_json_status]
+                    lambda did, system, tmpl, gapis, with_index: _start_export(
+                        "JSON export", _exporter(export_single_json_object, with_index), _open(did), system, tmpl,
+                        gapis,
+                    ),
+                    inputs=[dataset_id, system_global, template_state, global_apis, export_index],
+                    outputs=[json_job, export_json_file, export_json_status, export_json_timer],
                 )
+                export_json_timer.tick(
+                    _poll_export, inputs=[json_job], outputs=[export_json_file, export_json_status, export_json_timer]
+                )
+                export_json_cancel_btn.click(_cancel_export, inputs=[json_job], outputs=[export_json_status])
+
+                export_shards_btn.click(
+                    lambda did, keep_system, compression, with_index: _start_export(
+                        "Sharded export", _exporter(export_sharded, with_index), _open(did), compression, keep_system
+                    ),
+                    inputs=[dataset_id, keep_system_state, export_shards_compression, export_index],
+                    outputs=[shards_job, export_shards_files, export_shards_status, export_shards_timer],
+                )
+                export_shards_timer.tick(
+                    _poll_export,
+                    inputs=[shards_job],
+                    outputs=[export_shards_files, export_shards_status, export_shards_timer],
+                )
+                export_shards_cancel_btn.click(_cancel_export, inputs=[shards_job], outputs=[export_shards_status])
+
+                export_incremental_btn.click(
+                    lambda did, keep_system: _start_export(
+                        "Incremental export", export_incremental_for_dataset, _open(did), did, keep_system
+                    ),
+                    inputs=[dataset_id, keep_system_state],
+                    outputs=[incremental_job, export_incremental_file, export_incremental_status, export_incremental_timer],
+                )
+                export_incremental_timer.tick(
+                    _poll_export,
+                    inputs=[incremental_job],
+                    outputs=[export_incremental_file, export_incremental_status, export_incremental_timer],
+                )
+                export_incremental_cancel_btn.click(
+                    _cancel_export, inputs=[incremental_job], outputs=[export_incremental_status]
+                )
+
+            # -------------------- Diagnostics Tab (FEWSHOT_METRICS=1) --------------------
+            # Rarely opened: its components are built (with current numbers) when the tab is selected,
+            # not at startup.
+            if METRICS.enabled:
+                profiler = SamplingProfiler()
+
+                def _refresh_diagnostics():
+                    return METRICS.summary_rows(), _diagnostics_text()
+
+                def _reset_diagnostics():
+                    METRICS.reset()
+                    return _refresh_diagnostics()
+
+                def _start_profiler():
+                    if profiler.running:
+                        return "Profiler is already running."
+                    profiler.start()
+                    return f"Sampling every {profiler.interval * 1000:.0f} ms…"
+
+                def _stop_profiler():
+                    if not profiler.running:
+                        return None, "Profiler is not running."
+                    stacks = profiler.stop()
+                    path = _timestamped_path("./fewshot_profile", ".txt")
+                    with open(path, "w", encoding="utf-8") as f:
+                        f.write(stacks)
+                    return path, f"{profiler.samples} samples → {path}"
+
+                with gr.TabItem("Diagnostics") as diag_tab:
+                    gr.Markdown(
+                        "Latency and response-size histograms of this instance since start "
+                        "(all users). The same numbers are served as plain text at `/metrics`."
+                    )
+
+                    @gr.render(triggers=[diag_tab.select])
+                    def _diagnostics_panel():
+                        rows, text = _refresh_diagnostics()
+                        with gr.Row():
+                            diag_refresh_btn = gr.Button("🔄 Refresh")
+                            diag_reset_btn = gr.Button("Reset counters")
+                        diag_table = gr.Dataframe(
+                            headers=SUMMARY_COLUMNS, value=rows, wrap=True, interactive=False,
+                            label="Histograms (seconds / bytes / records per second)",
+                        )
+                        diag_text = gr.Textbox(value=text, label="Caches and export jobs", lines=3, interactive=False)
+                        with gr.Row():
+                            profile_start_btn = gr.Button("▶️ Start sampling profiler")
+                            profile_stop_btn = gr.Button("⏹️ Stop and download")
+                            profile_file = gr.File(
+                                label="Collapsed stacks (flamegraph.pl / speedscope)", interactive=False
+                            )
+                            profile_status = gr.Textbox(
+                                value="Sampling…" if profiler.running else "", label="Profiler status", interactive=False
+                            )
+
+                        diag_refresh_btn.click(_refresh_diagnostics, outputs=[diag_table, diag_text])
+                        diag_reset_btn.click(_reset_diagnostics, outputs=[diag_table, diag_text])
+                        profile_start_btn.click(_start_profiler, outputs=[profile_status])
+                        profile_stop_btn.click(_stop_profiler, outputs=[profile_file, profile_status])
 
         # ---------- Template apply wiring (toggles Single Example & global APIs visibility)
+        @handler("apply_template")
         def _apply_template(includes, scope_label, show_sys, show_global_apis, tmpl_state):
             scope = "global" if scope_label.startswith("Global") else "per"
             if not includes:
@@ -273,10 +858,44 @@ def build_app():
         )
 
         # Add example uses current template + system + global/per APIs
+        @handler("add")
+        def _add_example(did, tmpl, system, gapis, apis_, question_, thought_, code_, answer_):
+            ds = _open(did)
+            before = len(ds)
+            dedup = dedup_index_for_dataset(ds)
+            _, msg, n, rows, page = add_example_incremental(
+                ds, tmpl, system, gapis, apis_, question_, thought_, code_, answer_, DEFAULT_PAGE_SIZE
+            )
+            if n > before:
+                rec = ds[n - 1]
+                on_records_added(ds.id, [rec])
+                search_on_records_added(ds.id, [rec])
+                # Flag (but keep) exact and near-duplicates of earlier examples
+                dups = dedup.check_and_add(rec)
+                if dups:
+                    msg += "\n" + format_duplicates(dups)
+                issues = VALIDATOR.validate_record(rec)
+                if issues:
+                    msg += "\n" + format_issues(issues)
+            return msg, n, rows, page
+
         add_btn.click(
-            add_example_and_summarize_with_template,
-            inputs=[dataset_state, template_state, system_global, global_apis, apis, question, thought, code, answer],
-            outputs=[dataset_state, feedback_single, count, dataset_table]
+            _add_example,
+            inputs=[dataset_id, template_state, system_global, global_apis, apis, question, thought, code, answer],
+            outputs=[feedback_single, count, dataset_table, page_num]
+        )
+
+        # Reopen (or create) this browser's dataset on page load
+        @handler("restore")
+        def _restore_dataset(did):
+            ds = open_dataset(did if valid_dataset_id(did) else None)     # stale or tampered ids get a new dataset
+            rows, page, _ = dataset_page(ds, 1, DEFAULT_PAGE_SIZE)
+            return ds.id, len(ds), rows, page
+
+        demo.load(
+            _restore_dataset,
+            inputs=[dataset_id],
+            outputs=[dataset_id, count, dataset_table, page_num],
         )
 
         gr.Markdown(
@@ -289,6 +908,26 @@ def build_app():
 
     return demo
 
+def serve_with_metrics(demo, host="0.0.0.0", port=None):
+    """Serve the UI with a plain-text /metrics endpoint next to it (Prometheus format)."""
+    import gradio as gr
+    import uvicorn
+    from fastapi import FastAPI
+    from fastapi.responses import PlainTextResponse
+
+    _register_gauges()
+    server = FastAPI()
+    server.add_api_route(
+        "/metrics",
+        lambda: PlainTextResponse(METRICS.render_text(), media_type="text/plain; version=0.0.4"),
+        methods=["GET"],
+    )
+    app = gr.mount_gradio_app(server, demo, path="/")
+    uvicorn.run(app, host=host, port=port or int(os.environ.get("GRADIO_SERVER_PORT", 7860)))
+
 if __name__ == "__main__":
     demo = build_app()
-    demo.launch()
+    if METRICS.enabled:
+        serve_with_metrics(demo)
+    else:
+        demo.launch()
@@ -0,0 +1,336 @@
+# benchmark.py
+"""
+Benchmarks for the builder_utils hot paths on synthetic datasets.
+
+    python benchmark.py                                   # default sizes, print a table
+    python benchmark.py --sizes 10,1000,100000,1000000 --fields short,long
+    python benchmark.py --save baseline.json              # keep the numbers
+    python benchmark.py --compare baseline.json           # exit 1 on regressions
+    python benchmark.py --startup [--save / --compare]    # cold-start import times
+
+Every case is timed (best of --repeat runs) and then run once more under
+tracemalloc for its peak memory. Per-record cases report the whole batch;
+us/op is the time per record, or per add or delete for the add_delete cases
+(which always run 2 x ADD_DELETE_CYCLES operations, whatever the size).
+Startup cases run in fresh interpreters and fail when a light entry point
+(builder_utils, `import app`) pulls in Gradio or numpy.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from builder_utils import (
+    DEFAULT_SYSTEM,
+    DEFAULT_TEMPLATE,
+    RENDER_CACHE,
+    _build_text,
+    add_example_and_summarize_with_template,
+    add_example_incremental,
+    dataset_rows,
+    delete_example_and_summarize,
+    delete_example_incremental,
+    export_jsonl_with_options,
+    export_single_json_object,
+    render_preview_with_template,
+    to_json_record_with_template,
+)
+from dataset_store import Dataset
+
+DEFAULT_SIZES = (10, 1000, 100000)
+DEFAULT_FIELDS = ("short", "long")
+ADD_DELETE_CYCLES = 200
+LEGACY_MAX_SIZE = 10000        # the list-copying add/delete is quadratic; skip it above this
+REGRESSION_THRESHOLD = 1.25
+
+# ---------- Synthetic data ----------
+_WORDS = (
+    "image lesion region mask organ scan slice contrast left right upper lower "
+    "volume density border margin nodule tissue bone lung liver kidney heart"
+).split()
+
+def _sentence(rng, n_words):
+    return " ".join(rng.choice(_WORDS) for _ in range(n_words))
+
+def _api_doc(rng, n_funcs):
+    out = []
+    for i in range(n_funcs):
+        name = f"{rng.choice(_WORDS)}_{rng.choice(_WORDS)}_{i}"
+        out.append(f"def {name}(img: np.array, region: str = None) -> dict:\n"
+                   f'    """{_sentence(rng, 24)}"""\n')
+    return "\n".join(out)
+
+def _code(rng, n_lines):
+    return "\n".join(f"x{i} = {rng.choice(_WORDS)}_{rng.choice(_WORDS)}(img, '{rng.choice(_WORDS)}')"
+                     for i in range(n_lines))
+
+def synthetic_fields(n, size="short", seed=0):
+    """
+    n raw field dicts (system, global_apis, apis, question, thought, code, answer).
+    "short": one-line fields; "long": multi-KB APIs and code. API texts repeat
+    across records (a handful of distinct docs), as in real datasets.
+    """
+    rng = random.Random(seed)
+    long = size == "long"
+    apis_pool = [_api_doc(rng, 40 if long else 2) for _ in range(4)]
+    out = []
+    for i in range(n):
+        out.append({
+            "system": DEFAULT_SYSTEM,
+            "global_apis": apis_pool[0],
+            "apis": apis_pool[i % len(apis_pool)],
+            "question": _sentence(rng, 12) + "?",
+            "thought": _sentence(rng, 60 if long else 15),
+            "code": _code(rng, 60 if long else 3),
+            "answer": rng.choice(_WORDS),
+        })
+    return out
+
+def _args(f):
+    return (f["system"], f["global_apis"], f["apis"], f["question"], f["thought"], f["code"], f["answer"])
+
+def synthetic_records(fields, tmpl=DEFAULT_TEMPLATE):
+    return [to_json_record_with_template(tmpl, *_args(f)) for f in fields]
+
+
+# ---------- Cases ----------
+# Each case: (name, setup(fields, records) -> state, run(state), max size or None).
+# setup runs outside the timed region and again before every run.
+def _fields_cold(fields, records):
+    # The render paths go through the shared RENDER_CACHE; start every run empty so rendering is timed
+    RENDER_CACHE.clear()
+    return fields
+
+def _fields_warm(fields, records):
+    RENDER_CACHE.clear()
+    _run_render_preview(fields)
+    return fields
+
+def _records_only(fields, records):
+    return records
+
+def _run_build_text(fields):
+    for f in fields:
+        _build_text(DEFAULT_TEMPLATE, *_args(f))
+
+def _run_render_preview(fields):
+    for f in fields:
+        render_preview_with_template(DEFAULT_TEMPLATE, *_args(f))
+
+def _run_to_json_record(fields):
+    for f in fields:
+        to_json_record_with_template(DEFAULT_TEMPLATE, *_args(f))
+
+def _run_dataset_rows(records):
+    dataset_rows(records)
+
+def _setup_dataset(fields, records):
+    return Dataset(records), fields[:ADD_DELETE_CYCLES]
+
+def _run_add_delete(state):
+    ds, extra = state
+    for i in range(ADD_DELETE_CYCLES):
+        f = extra[i % len(extra)]
+        add_example_incremental(ds, DEFAULT_TEMPLATE, *_args(f))
+    for _ in range(ADD_DELETE_CYCLES):
+        delete_example_incremental(ds, len(ds))
+
+def _setup_legacy(fields, records):
+    return list(records), fields[:ADD_DELETE_CYCLES]
+
+def _run_add_delete_legacy(state):
+    records, extra = state
+    for i in range(ADD_DELETE_CYCLES):
+        f = extra[i % len(extra)]
+        records, _, _, _ = add_example_and_summarize_with_template(records, DEFAULT_TEMPLATE, *_args(f))
+    for _ in range(ADD_DELETE_CYCLES):
+        records, _, _, _ = delete_example_and_summarize(records, len(records))
+
+def _run_export_jsonl(records):
+    path, _ = export_jsonl_with_options(records, True)
+    os.remove(path)
+
+def _run_export_json(records):
+    path, _ = export_single_json_object(records, DEFAULT_SYSTEM, DEFAULT_TEMPLATE, None)
+    os.remove(path)
+
+# Each case: (name, setup, run, max n or None, operations per run or None for one per record).
+ADD_DELETE_OPS = 2 * ADD_DELETE_CYCLES
+
+CASES = (
+    ("build_text", _fields_cold, _run_build_text, None, None),
+    ("render_preview", _fields_cold, _run_render_preview, None, None),
+    ("render_preview_cached", _fields_warm, _run_render_preview, None, None),    # hits while n <= RENDER_CACHE_SIZE
+    ("to_json_record", _fields_cold, _run_to_json_record, None, None),
+    ("dataset_rows", _records_only, _run_dataset_rows, None, None),
+    ("add_delete", _setup_dataset, _run_add_delete, None, ADD_DELETE_OPS),
+    ("add_delete_legacy", _setup_legacy, _run_add_delete_legacy, LEGACY_MAX_SIZE, ADD_DELETE_OPS),
+    ("export_jsonl", _records_only, _run_export_jsonl, None, None),
+    ("export_json", _records_only, _run_export_json, None, None),
+)
+
+
+# ---------- Startup ----------
+# Each case: (name, statement, modules it must not import). Timed in a fresh interpreter.
+STARTUP_CASES = (
+    ("import_builder_utils", "import builder_utils", ("gradio", "numpy", "fastapi")),
+    ("import_app", "import app", ("gradio", "fastapi")),
+    ("build_app", "import app; app.build_app()", ()),
+)
+
+_STARTUP_SCRIPT = """
+import sys, time
+t = time.perf_counter()
+{statement}
+seconds = time.perf_counter() - t
+print(seconds, *[m for m in {forbidden!r} if m in sys.modules])
+"""
+
+def run_startup(repeat=3, log=None):
+    """Returns {"startup/<case>": {"seconds", "process_seconds", "heavy_imports"}}; seconds exclude interpreter start."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, FEWSHOT_DB_PATH=os.path.join(tmp, "fewshot.sqlite3"))
+        for name, statement, forbidden in STARTUP_CASES:
+            script = _STARTUP_SCRIPT.format(statement=statement, forbidden=forbidden)
+            best = None
+            for _ in range(repeat):
+                t = time.perf_counter()
+                out = subprocess.run(
+                    [sys.executable, "-c", script], cwd=here, env=env, capture_output=True, text=True, check=True,
+                ).stdout.split()
+                process = time.perf_counter() - t
+                if best is None or float(out[0]) < best["seconds"]:
+                    best = {"seconds": float(out[0]), "process_seconds": process, "heavy_imports": out[1:]}
+            results[f"startup/{name}"] = best
+            if log is not None:
+                log(f"startup/{name}", best)
+    return results
+
+
+# ---------- Running ----------
+def _time(fn, state):
+    gc.collect()
+    t = time.perf_counter()
+    fn(state)
+    return time.perf_counter() - t
+
+def _peak(fn, state):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn(state)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run_benchmarks(sizes=DEFAULT_SIZES, field_sizes=DEFAULT_FIELDS, cases=None, repeat=3, memory=True, log=None):
+    """Returns {"<case>/<fields>/<n>": {"seconds", "us_per_op", "peak_mib"}}."""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)          # the export functions write into the working directory
+        try:
+            for field_size in field_sizes:
+                for n in sizes:
+                    fields = synthetic_fields(n, field_size)
+                    records = synthetic_records(fields)
+                    for name, setup, fn, max_n, ops in CASES:
+                        if cases and name not in cases or (max_n is not None and n > max_n):
+                            continue
+                        key = f"{name}/{field_size}/{n}"
+                        # mutating cases get a fresh state per run
+                        seconds = min(_time(fn, setup(fields, records)) for _ in range(repeat))
+                        res = {"seconds": seconds, "us_per_op": seconds / (ops or n) * 1e6}
+                        if memory:
+                            res["peak_mib"] = _peak(fn, setup(fields, records)) / (1 << 20)
+                        results[key] = res
+                        if log is not None:
+                            log(key, res)
+                    del fields, records
+        finally:
+            os.chdir(cwd)
+    return results
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+    }
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """[(key, metric, baseline, current, ratio)] for metrics that got worse by more than `threshold`x."""
+    regressions = []
+    for key, res in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        for metric in ("seconds", "peak_mib"):
+            if metric in res and base.get(metric):
+                ratio = res[metric] / base[metric]
+                if ratio > threshold:
+                    regressions.append((key, metric, base[metric], res[metric], ratio))
+    return regressions
+
+
+# ---------- Command line ----------
+def _format_row(key, res):
+    mem = f"{res['peak_mib']:9.1f} MiB" if "peak_mib" in res else ""
+    return f"{key:<34} {res['seconds']:10.4f} s {res['us_per_op']:12.2f} us/op {mem}"
+
+def _format_startup_row(key, res):
+    heavy = f"  imports {', '.join(res['heavy_imports'])}!" if res["heavy_imports"] else ""
+    return f"{key:<34} {res['seconds'] * 1000:10.1f} ms {res['process_seconds'] * 1000:10.1f} ms process{heavy}"
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark the builder_utils hot paths.")
+    p.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="comma-separated record counts")
+    p.add_argument("--fields", default=",".join(DEFAULT_FIELDS), help="field sizes: short,long")
+    p.add_argument("--cases", help="comma-separated case names (default: all): " + ", ".join(c[0] for c in CASES))
+    p.add_argument("--repeat", type=int, default=3, help="timed runs per case (best is kept)")
+    p.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run")
+    p.add_argument("--startup", action="store_true", help="time cold imports / app construction instead")
+    p.add_argument("--save", help="write results to this JSON file")
+    p.add_argument("--compare", help="baseline JSON file to compare against")
+    p.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="regression ratio (default 1.25)")
+    args = p.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    field_sizes = [s.strip() for s in args.fields.split(",") if s.strip()]
+    cases = set(c.strip() for c in args.cases.split(",")) if args.cases else None
+    if args.startup:
+        results = run_startup(args.repeat, log=lambda key, res: print(_format_startup_row(key, res), flush=True))
+    else:
+        results = run_benchmarks(sizes, field_sizes, cases, args.repeat, not args.no_memory,
+                                 log=lambda key, res: print(_format_row(key, res), flush=True))
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=2)
+        print(f"Saved {len(results)} results → {args.save}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"], args.threshold)
+        for key, metric, base, cur, ratio in regressions:
+            print(f"REGRESSION {key} {metric}: {base:.4g} → {cur:.4g} ({ratio:.2f}x)")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.compare} (threshold {args.threshold:.2f}x).")
+    if any(res.get("heavy_imports") for res in results.values()):
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
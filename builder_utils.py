@@ -1,6 +1,11 @@
 # builder_utils.py
 import json
-from datetime import datetime
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
 
 # ---------- Defaults ----------
 DEFAULT_SYSTEM = (
@@ -33,6 +38,9 @@ DEFAULT_CODE = '''def answer_code():
 '''
 DEFAULT_ANSWER = "MRI"
 
+# Per-record text fields, in the key order of to_json_record_with_template
+RECORD_FIELDS = ("system", "global_apis", "apis", "question", "thought", "code", "answer")
+
 # Superset of columns for the dataset preview
 COLUMNS = ["#", "answer", "thought", "question", "code", "apis", "instruction"]
 
@@ -41,9 +49,9 @@ def _truncate(s, max_len=120):
     s = (s or "").replace("\n", " ⏎ ")
     return s if len(s) <= max_len else s[:max_len - 1] + "…"
 
-def _record_to_row(idx_one_based, record, max_len=120):
+def _record_cells(record, max_len=120):
+    """Row for one record, without the '#' column."""
     return [
-        idx_one_based,
         (record.get("answer") or ""),
         _truncate(record.get("thought") or "", max_len),
         _truncate(record.get("question") or "", max_len),
@@ -52,6 +60,9 @@ def _record_to_row(idx_one_based, record, max_len=120):
         _truncate(record.get("system") or "", max_len),
     ]
 
+def _record_to_row(idx_one_based, record, max_len=120):
+    return [idx_one_based] + _record_cells(record, max_len)
+
 def dataset_rows(state, max_len=120):
     return [_record_to_row(i, rec, max_len=max_len) for i, rec in enumerate(state, start=1)]
 
@@ -69,48 +80,274 @@ def _validate_inputs_template(tmpl, system, global_apis, apis, question, code, a
     return True, ""
 
 
-def _build_text(tmpl, system, global_apis, apis, question, thought, code, answer):
-    """Render a formatted few-shot example according to the template & scope.
-       Arg order: (..., question, thought, code, answer)
-    """
-    sections = set((tmpl or {}).get("include_sections", []))
-    scope = (tmpl or {}).get("apis_scope", "per")
-    show_system = bool((tmpl or {}).get("show_system_in_preview", True))
-    show_global_apis = bool((tmpl or {}).get("show_global_apis_in_preview", True))
-    answer = _resolve_default_answer(answer)
+# ---------- String pool ----------
+# Long texts that repeat across records (system prompt, API docs) are pooled.
+POOLED_FIELDS = ("system", "global_apis", "apis")
+POOL_TABLE_KEY = "__strings__"   # JSONL line holding {ref: text} entries for pooled exports
 
-    blocks = []
-    idx = 1
-
-    if show_system:
-        blocks.append(f"{idx}. Instruction\n<SYSTEM>{(system or '').strip()}</SYSTEM>\n")
-        idx += 1
+class StringPool:
+    """
+    Content-addressed store for repeated texts. `intern` returns one shared
+    str object per distinct text, so records built from the same System or
+    APIs text hold references instead of copies; `ref` gives its stable hash key.
+    """
+    __slots__ = ("max_entries", "_canon", "_keys", "_texts")
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._canon = {}   # text -> canonical text object
+        self._keys = {}    # canonical text -> hash key (computed on first ref)
+        self._texts = {}   # hash key -> canonical text
+
+    @staticmethod
+    def key_for(text):
+        import hashlib      # deferred: keeps `import builder_utils` cheap for workers and scripts
+
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+    def intern(self, text):
+        if not isinstance(text, str):
+            return text
+        canon = self._canon.get(text)
+        if canon is None:
+            if self.max_entries and len(self._canon) >= self.max_entries:
+                # Existing records keep their strings; we only stop sharing with new ones.
+                self.clear()
+            canon = self._canon[text] = text
+        return canon
+
+    def ref(self, text):
+        text = self.intern(text)
+        key = self._keys.get(text)
+        if key is None:
+            key = self._keys[text] = self.key_for(text)
+            self._texts[key] = text
+        return key
+
+    def get(self, key, default=None):
+        return self._texts.get(key, default)
+
+    def add(self, key, text):
+        """Register a (key, text) pair read back from a pooled export."""
+        text = self.intern(text)
+        self._keys[text] = key
+        self._texts[key] = text
+        return text
+
+    def clear(self):
+        self._canon.clear()
+        self._keys.clear()
+        self._texts.clear()
+
+    def __len__(self):
+        return len(self._canon)
+
+SHARED_POOL = StringPool()
+
+def intern_record(rec, pool=None):
+    """Intern the pooled fields of a record in place; returns the record."""
+    intern = (pool or SHARED_POOL).intern
+    for field in POOLED_FIELDS:
+        if field in rec:
+            rec[field] = intern(rec[field])
+    return rec
 
-    if scope == "global" and show_global_apis and (global_apis or "").strip():
-        blocks.append(f"{idx}. Tool APIs (Global)\n<APIs>\n{(global_apis or '').rstrip()}\n</APIs>\n")
-        idx += 1
+def expand_record(rec, table):
+    """Replace '<field>_ref' keys of a pooled-export record with the text from `table`."""
+    if not any(f + "_ref" in rec for f in POOLED_FIELDS):
+        return rec
+    out = {}
+    for k, v in rec.items():
+        if k.endswith("_ref") and k[:-4] in POOLED_FIELDS:
+            out[k[:-4]] = table[v]
+        else:
+            out[k] = v
+    return out
+
+# ---------- Compiled templates ----------
+# How each field is normalized before it is placed in its block.
+_STRIP, _RSTRIP, _ALWAYS, _ANSWER = 0, 1, 2, 3
+_DEFAULT_ANSWER_STRIPPED = DEFAULT_ANSWER.strip()
+
+
+class CompiledTemplate:
+    """A template whose section plan is resolved once and reused for every record.
+
+    The plan is an ordered tuple of (field, head, tail, mode). Numbering still
+    depends on which optional fields are non-empty, so it is assigned while
+    rendering, but no template lookups happen per record.
+    """
+    __slots__ = ("key", "plan", "fields", "pairs")
+
+    def __init__(self, include_sections=(), apis_scope="per",
+                 show_system_in_preview=True, show_global_apis_in_preview=True):
+        sections = frozenset(include_sections or ())
+        show_system = bool(show_system_in_preview)
+        show_global_apis = bool(show_global_apis_in_preview)
+        self.key = (sections, apis_scope, show_system, show_global_apis)
+
+        plan = []
+        if show_system:
+            plan.append(("system", ". Instruction\n<SYSTEM>", "</SYSTEM>", _ALWAYS))
+        if apis_scope == "global" and show_global_apis:
+            plan.append(("global_apis", ". Tool APIs (Global)\n<APIs>\n", "\n</APIs>", _RSTRIP))
+        if apis_scope == "per" and "APIs" in sections:
+            plan.append(("apis", ". Tool APIs\n<APIs>\n", "\n</APIs>", _RSTRIP))
+        if "Question" in sections:
+            plan.append(("question", ". The VQA question:\n", "", _STRIP))
+        if "Thought" in sections:
+            plan.append(("thought", ". Thought\n<THOUGHT>\n", "\n</THOUGHT>", _STRIP))
+        if "Code" in sections:
+            plan.append(("code", ". The generated code\n<CODE>\n", "\n</CODE>", _RSTRIP))
+        if "Answer" in sections:
+            plan.append(("answer", ". Answer: ", "", _ANSWER))
+        self.plan = tuple(plan)
+        self.fields = tuple(field for field, _, _, _ in plan)
+        self.pairs = tuple((field, mode) for field, _, _, mode in plan)
+
+    def render(self, record):
+        """Render one record (any mapping with the field names as keys)."""
+        return self.render_normalized(normalize_fields(record, self.pairs))
+
+    def render_many(self, records):
+        """Render an iterable of records, returning a list of strings."""
+        render = self.render
+        return [render(rec) for rec in records]
+
+    def render_normalized(self, norm):
+        """
+        Render from pre-normalized fields: {(field, mode): text, or None when
+        the block is skipped}, as built by normalize_fields. Lets several
+        templates share one normalization pass over a record.
+        """
+        blocks = []
+        n = 0
+        for field, head, tail, mode in self.plan:
+            value = norm[field, mode]
+            if value is None:
+                continue
+            n += 1
+            blocks.append(f"{n}{head}{value}{tail}")
+        # Blocks are separated by one blank line, same as joining "...\n" blocks and stripping.
+        return "\n\n".join(blocks)
+
+
+def normalize_fields(record, pairs):
+    """{(field, mode): normalized text or None} for the (field, mode) pairs of one or more plans."""
+    norm = {}
+    for field, mode in pairs:
+        value = record.get(field) or ""
+        if mode == _RSTRIP:
+            value = value.rstrip()
+        else:
+            value = value.strip()
+        if not value:
+            if mode == _ANSWER:
+                value = _DEFAULT_ANSWER_STRIPPED
+            elif mode != _ALWAYS:
+                value = None
+        norm[field, mode] = value
+    return norm
+
+
+@lru_cache(maxsize=256)
+def _compiled(sections, scope, show_system, show_global_apis):
+    return CompiledTemplate(sections, scope, show_system, show_global_apis)
+
+def compile_template(tmpl):
+    """Compile a DEFAULT_TEMPLATE-shaped dict. Identical settings share one instance."""
+    tmpl = tmpl or {}
+    return _compiled(
+        frozenset(tmpl.get("include_sections", []) or ()),
+        tmpl.get("apis_scope", "per"),
+        bool(tmpl.get("show_system_in_preview", True)),
+        bool(tmpl.get("show_global_apis_in_preview", True)),
+    )
 
-    if scope == "per" and "APIs" in sections and (apis or "").strip():
-        blocks.append(f"{idx}. Tool APIs\n<APIs>\n{(apis or '').rstrip()}\n</APIs>\n")
-        idx += 1
+def compile_record_template(meta):
+    """Compile the template frozen into a record's 'meta' (uses 'included_sections')."""
+    meta = meta or {}
+    return _compiled(
+        frozenset(meta.get("included_sections") or ()),
+        meta.get("apis_scope", "per"),
+        bool(meta.get("show_system_in_preview", True)),
+        bool(meta.get("show_global_apis_in_preview", True)),
+    )
 
-    if "Question" in sections and (question or "").strip():
-        blocks.append(f"{idx}. The VQA question:\n{(question or '').strip()}\n")
-        idx += 1
+# ---------- Render cache ----------
+RENDER_CACHE_SIZE = 2048
 
-    if "Thought" in sections and (thought or "").strip():
-        blocks.append(f"{idx}. Thought\n<THOUGHT>\n{(thought or '').strip()}\n</THOUGHT>\n")
-        idx += 1
 
-    if "Code" in sections and (code or "").strip():
-        blocks.append(f"{idx}. The generated code\n<CODE>\n{(code or '').rstrip()}\n</CODE>\n")
-        idx += 1
+class RenderCache:
+    """
+    Bounded LRU of rendered texts, shared by the preview pane, the full view
+    and prompt exports. The key is the compiled template's key plus the values
+    of the fields its plan uses, so a change to either is a miss. Python caches
+    the hash of every str object, so the long System/APIs texts shared through
+    SHARED_POOL cost nothing to hash again.
+    """
+    __slots__ = ("max_entries", "hits", "misses", "_entries", "_lock")
+
+    def __init__(self, max_entries=RENDER_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def render(self, compiled, record):
+        key = (compiled.key, tuple(record.get(f) for f in compiled.fields))
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return text
+            self.misses += 1
+        text = compiled.render(record)
+        with self._lock:
+            self._entries[key] = text
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return text
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+RENDER_CACHE = RenderCache()
+
+def render_cached(compiled, record):
+    return RENDER_CACHE.render(compiled, record)
 
-    if "Answer" in sections:
-        blocks.append(f"{idx}. Answer: {(answer or '').strip()}\n")
-        idx += 1
 
-    return "\n".join(blocks).strip()
+def _build_text(tmpl, system, global_apis, apis, question, thought, code, answer):
+    """Render a formatted few-shot example according to the template & scope.
+       Arg order: (..., question, thought, code, answer)
+    """
+    return render_cached(compile_template(tmpl), {
+        "system": system,
+        "global_apis": global_apis,
+        "apis": apis,
+        "question": question,
+        "thought": thought,
+        "code": code,
+        "answer": answer,
+    })
 
 def render_preview_with_template(tmpl, system, global_apis, apis, question, thought, code, answer):
     # Only keep fields that are enabled in the template
@@ -141,6 +378,7 @@ def to_json_record_with_template(tmpl, system, global_apis, apis, question, thou
     Record contains only enabled per-example sections, plus 'system' always.
     For global APIs scope, we also store a snapshot 'global_apis' on the record,
     so viewing later reproduces the same preview even if the template changes.
+    System/APIs texts are interned in SHARED_POOL, so records share one copy.
     """
     sections = set((tmpl or {}).get("include_sections", []))
     scope = (tmpl or {}).get("apis_scope", "per")
@@ -148,18 +386,18 @@ def to_json_record_with_template(tmpl, system, global_apis, apis, question, thou
 
     rec = {
         "meta": {
-            "included_sections": list(sections),
+            "included_sections": list(dict.fromkeys((tmpl or {}).get("include_sections", []))),
             "apis_scope": scope,
             "show_system_in_preview": bool((tmpl or {}).get("show_system_in_preview", True)),
             "show_global_apis_in_preview": bool((tmpl or {}).get("show_global_apis_in_preview", True)),
         },
-        "system": system,
+        "system": SHARED_POOL.intern(system),
     }
 
     if scope == "global" and (global_apis or "").strip():
-        rec["global_apis"] = global_apis
+        rec["global_apis"] = SHARED_POOL.intern(global_apis)
     elif "APIs" in sections and (apis or "").strip():
-        rec["apis"] = apis
+        rec["apis"] = SHARED_POOL.intern(apis)
 
     if "Question" in sections and (question or "").strip():
         rec["question"] = question
@@ -182,24 +420,7 @@ def add_example_and_summarize_with_template(state, tmpl, system, global_apis, ap
 
 
 def _format_record_for_view(record):
-    meta = record.get("meta") or {}
-    included = set(meta.get("included_sections") or [])
-    tmpl = {
-        "include_sections": list(included),
-        "apis_scope": meta.get("apis_scope", "per"),
-        "show_system_in_preview": bool(meta.get("show_system_in_preview", True)),
-        "show_global_apis_in_preview": bool(meta.get("show_global_apis_in_preview", True)),
-    }
-    return _build_text(
-        tmpl=tmpl,
-        system=record.get("system"),
-        global_apis=record.get("global_apis"),
-        apis=record.get("apis"),
-        question=record.get("question"),
-        thought=record.get("thought"),
-        code=record.get("code"),
-        answer=record.get("answer"),
-    )
+    return render_cached(compile_record_template(record.get("meta")), record)
 
 def get_example_detail(state, index_one_based):
     try:
@@ -225,25 +446,252 @@ def delete_example_and_summarize(state, index_one_based):
     new_state, msg, count = delete_example(state, index_one_based)
     return new_state, msg, count, dataset_rows(new_state)
 
-def export_jsonl_with_options(state, duplicate_system=True):
+# ---------- Incremental, paginated table ----------
+DEFAULT_PAGE_SIZE = 50
+
+def page_count(total, page_size=DEFAULT_PAGE_SIZE):
+    return max(1, -(-total // page_size))
+
+def _sanitize_page(page, total, page_size=DEFAULT_PAGE_SIZE):
+    try:
+        p = int(float(page))
+    except Exception:
+        p = 1
+    return max(1, min(p, page_count(total, page_size)))
+
+def dataset_page(state, page=1, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Rows for one page of the dataset table (1-based page, clamped); the '#'
+    column is filled in only for that page. Returns (rows, page, n_pages).
+    """
+    state = state if state is not None else []
+    total = len(state)
+    page = _sanitize_page(page, total, page_size)
+    start = (page - 1) * page_size
+    end = min(start + page_size, total)
+    if hasattr(state, "page_cells"):
+        # dataset_store backends keep their own cached cells and fetch a page at once
+        page_cells = state.page_cells(start, end)
+    else:
+        page_cells = [_record_cells(state[i]) for i in range(start, end)]
+    rows = [[i] + c for i, c in enumerate(page_cells, start=start + 1)]
+    return rows, page, page_count(total, page_size)
+
+def page_of_index(index_one_based, page_size=DEFAULT_PAGE_SIZE):
+    return max(1, (int(index_one_based) - 1) // page_size + 1)
+
+def add_example_incremental(state, tmpl, system, global_apis, apis, question, thought, code, answer,
+                            page_size=DEFAULT_PAGE_SIZE):
+    """
+    Like add_example_and_summarize_with_template, but appends to `state` in place
+    and returns only the last page of rows: (state, msg, count, rows, page).
+    """
+    state = state if state is not None else []
+    ok, msg = _validate_inputs_template(tmpl, system, global_apis, apis, question, code, answer)
+    if not ok:
+        page = page_count(len(state), page_size)
+        rows, page, _ = dataset_page(state, page, page_size)
+        return state, f"⚠️ {msg}", len(state), rows, page
+    rec = to_json_record_with_template(tmpl, system, global_apis, apis, question, thought, code, answer)
+    state.append(rec)
+    rows, page, _ = dataset_page(state, page_count(len(state), page_size), page_size)
+    return state, "✅ Added example.", len(state), rows, page
+
+def delete_example_incremental(state, index_one_based, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Like delete_example_and_summarize, but deletes from `state` in place and
+    returns the page holding the (clamped) index: (state, msg, count, rows, page).
+    """
+    state = state if state is not None else []
+    try:
+        idx = int(float(index_one_based))
+    except Exception:
+        rows, page, _ = dataset_page(state, 1, page_size)
+        return state, "Please enter a valid integer index.", len(state), rows, page
+    if idx < 1 or idx > len(state):
+        rows, page, _ = dataset_page(state, 1, page_size)
+        return state, f"Index out of range. Enter 1–{len(state) if state else 0}.", len(state), rows, page
+    state.pop(idx - 1)
+    page = page_of_index(min(idx, max(len(state), 1)), page_size)
+    rows, page, _ = dataset_page(state, page, page_size)
+    return state, f"🗑️ Deleted example #{idx}.", len(state), rows, page
+
+# ---------- Streaming export ----------
+# One shared encoder: json.dumps(..., ensure_ascii=False) builds a new encoder per call.
+_encode_json = json.JSONEncoder(ensure_ascii=False).encode
+
+EXPORT_BATCH_SIZE = 1000
+_WRITE_BUFFER = 1 << 20
+
+_PATH_LOCK = threading.Lock()
+
+def _timestamped_path(stem, ext, directory=False):
+    """'<stem>_<timestamp><ext>', claimed on disk so concurrent exports never share a file."""
+    ts = time.strftime("%Y%m%d_%H%M%S")
+    with _PATH_LOCK:
+        path, n = f"{stem}_{ts}{ext}", 1
+        while os.path.exists(path):
+            n += 1
+            path = f"{stem}_{ts}_{n}{ext}"
+        if directory:
+            os.makedirs(path)
+        else:
+            open(path, "w").close()
+    return path
+
+@contextmanager
+def _export_file(path):
+    """Open an export for writing; a partly written file is removed if writing fails."""
+    f = open(path, "w", encoding="utf-8", buffering=_WRITE_BUFFER)
+    try:
+        with f:
+            yield f
+    except BaseException:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
+
+def _pooled_record(rec, duplicate_system, ref, seen, new_entries):
+    out = {}
+    for k, v in rec.items():
+        if k in POOLED_FIELDS and isinstance(v, str):
+            if k == "system" and not duplicate_system:
+                continue
+            key = ref(v)
+            if key not in seen:
+                seen.add(key)
+                new_entries[key] = v
+            out[k + "_ref"] = key
+        else:
+            out[k] = v
+    return out
+
+def iter_jsonl_batches(records, duplicate_system=True, batch_size=EXPORT_BATCH_SIZE, pooled=False, seen=None):
+    """
+    Serialize any iterable of records to JSONL text in batches.
+    Yields (n_records, text) per batch so callers can write and report progress.
+    Records are encoded as-is when duplicate_system=True (no per-record copy).
+
+    With pooled=True, system/APIs texts are written once in {"__strings__": {...}}
+    table lines (placed before the first record using them) and records carry
+    '<field>_ref' keys instead; import_utils expands them back. To continue one
+    pooled stream across calls, pass the same `seen` set (refs already written).
+    """
+    encode = _encode_json
+    ref = SHARED_POOL.ref
+    seen = set() if seen is None else seen
+    lines = []
+    n = 0
+    for rec in records:
+        if pooled:
+            new_entries = {}
+            rec = _pooled_record(rec, duplicate_system, ref, seen, new_entries)
+            if new_entries:
+                lines.append(encode({POOL_TABLE_KEY: new_entries}))
+        elif not duplicate_system and "system" in rec:
+            rec = {k: v for k, v in rec.items() if k != "system"}
+        lines.append(encode(rec))
+        n += 1
+        if n >= batch_size:
+            yield n, "\n".join(lines) + "\n"
+            lines = []
+            n = 0
+    if lines:
+        yield n, "\n".join(lines) + "\n"
+
+def stream_export_jsonl(records, path, duplicate_system=True, batch_size=EXPORT_BATCH_SIZE, progress=None, total=None,
+                        pooled=False):
+    """
+    Write records (list, generator, ...) to `path` as JSONL without materializing them.
+    `progress(done, total)` is called after every batch; `total` defaults to len(records)
+    when available, else None. Returns the number of records written.
+    """
+    if total is None and hasattr(records, "__len__"):
+        total = len(records)
+    done = 0
+    with _export_file(path) as f:
+        for n, chunk in iter_jsonl_batches(records, duplicate_system, batch_size, pooled):
+            f.write(chunk)
+            done += n
+            if progress is not None:
+                progress(done, total)
+    return done
+
+def export_jsonl_with_options(state, duplicate_system=True, progress=None, pooled=False):
     """
     Export dataset to JSONL (per-line records).
     If duplicate_system=True, keep 'system' in each record; otherwise remove it.
     Global APIs snapshots (if present) remain on the records.
+    If pooled=True, repeated system/APIs texts are written once in string-table lines.
     """
     if not state:
         return None, "No examples to export yet."
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    path = f"./fewshot_{ts}.jsonl"
-    with open(path, "w", encoding="utf-8") as f:
-        for rec in state:
-            out = dict(rec)
-            if not duplicate_system:
-                out.pop("system", None)
-            f.write(json.dumps(out, ensure_ascii=False) + "\n")
-    return path, f"📦 Exported {len(state)} records → {path}"
-
-def export_single_json_object(state, system_text, template, global_apis_from_ui):
+    path = _timestamped_path("./fewshot", ".jsonl")
+    n = stream_export_jsonl(state, path, duplicate_system=duplicate_system, progress=progress, pooled=pooled)
+    note = " (deduplicated string table)" if pooled else ""
+    return path, f"📦 Exported {n} records{note} → {path}"
+
+def _json_object_example(rec, scope):
+    ex = {}
+    # Include per-example APIs only when scope is "per"
+    if scope == "per" and "apis" in rec:
+        ex["apis"] = rec["apis"]
+    if "question" in rec: ex["question"] = rec["question"]
+    if "code" in rec:     ex["code"] = rec["code"]
+    if "thought" in rec:  ex["thought"] = rec["thought"]
+    if "answer" in rec:   ex["answer"] = rec["answer"]
+    return ex
+
+_encode_json_indented = json.JSONEncoder(ensure_ascii=False, indent=2).encode
+
+def iter_json_object_batches(state, system_text, template, global_apis_from_ui, batch_size=EXPORT_BATCH_SIZE):
+    """
+    The single-object export as text, written incrementally: yields
+    (n_examples, text) per batch. The concatenated text is identical to
+    json.dump of the whole {system, example: [...], apis?} object with
+    ensure_ascii=False, indent=2.
+    """
+    scope = (template or {}).get("apis_scope", "per")
+    encode = _encode_json_indented
+    head = "{\n  " + _encode_json("system") + ": " + encode(system_text) + ",\n  " + _encode_json("example") + ": ["
+    parts = [head]
+    n = 0
+    first = True
+    for rec in state:
+        # Strings are escaped, so every newline of an encoded example is indentation
+        ex = encode(_json_object_example(rec, scope)).replace("\n", "\n    ")
+        parts.append(("\n    " if first else ",\n    ") + ex)
+        first = False
+        n += 1
+        if n >= batch_size:
+            yield n, "".join(parts)
+            parts = []
+            n = 0
+    tail = "]" if first else "\n  ]"
+    if scope == "global":
+        tail += ",\n  " + _encode_json("apis") + ": " + encode(global_apis_from_ui)
+    parts.append(tail + "\n}")
+    yield n, "".join(parts)
+
+def write_json_object(state, path, system_text, template, global_apis_from_ui, progress=None, total=None):
+    """
+    Stream the single-object export to `path`; returns the number of examples.
+    `progress(done, total)` is called after every batch, as in stream_export_jsonl.
+    """
+    if total is None and hasattr(state, "__len__"):
+        total = len(state)
+    done = 0
+    with _export_file(path) as f:
+        for n, chunk in iter_json_object_batches(state, system_text, template, global_apis_from_ui):
+            f.write(chunk)
+            done += n
+            if progress is not None:
+                progress(done, total)
+    return done
+
+def export_single_json_object(state, system_text, template, global_apis_from_ui, progress=None):
     """
     Export a single JSON object:
     {
@@ -258,24 +706,6 @@ def export_single_json_object(state, system_text, template, global_apis_from_ui)
     if not state:
         return None, "No examples to export yet."
 
-    scope = (template or {}).get("apis_scope", "per")
-    obj = {"system": system_text, "example": []}
-    if scope == "global":
-        obj["apis"] = global_apis_from_ui
-
-    for rec in state:
-        ex = {}
-        # Include per-example APIs only when scope is "per"
-        if scope == "per" and "apis" in rec:
-            ex["apis"] = rec["apis"]
-        if "question" in rec: ex["question"] = rec["question"]
-        if "code" in rec:     ex["code"] = rec["code"]
-        if "thought" in rec:  ex["thought"] = rec["thought"]
-        if "answer" in rec:   ex["answer"] = rec["answer"]
-        obj["example"].append(ex)
-
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    path = f"./fewshot_object_{ts}.json"
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(obj, f, ensure_ascii=False, indent=2)
-    return path, f"📦 Exported object with {len(obj['example'])} examples → {path}"
+    path = _timestamped_path("./fewshot_object", ".json")
+    n = write_json_object(state, path, system_text, template, global_apis_from_ui, progress=progress)
+    return path, f"📦 Exported object with {n} examples → {path}"
@@ -0,0 +1,214 @@
+# cli.py
+"""
+Headless batch formatter: render previews and build JSONL / JSON exports from
+raw fields without starting the Gradio UI.
+
+    python cli.py --input raw.csv --template template.json \\
+        --previews previews.txt --jsonl fewshot.jsonl --json fewshot.json
+
+    python cli.py --input raw.csv --sharded fewshot_shards/ --compression lzma
+
+With --index, a retrieval index (retrieval_index.RetrievalIndex) is saved next
+to each export as <export>.index.npz for dynamic few-shot selection.
+
+Input rows (CSV columns or JSONL keys) may hold apis, question, thought, code,
+answer and optionally system / global_apis to override the global values.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from builder_utils import (
+    DEFAULT_APIS,
+    DEFAULT_SYSTEM,
+    DEFAULT_TEMPLATE,
+    intern_record,
+    iter_jsonl_batches,
+    render_preview_with_template,
+    to_json_record_with_template,
+    write_json_object,
+)
+from retrieval_index import RetrievalIndex, save_index_for_export
+from sharded_export import COMPRESSIONS, write_sharded_export
+
+RAW_FIELDS = ("apis", "question", "thought", "code", "answer")
+CHUNK_ROWS = 2000
+PREVIEW_SEPARATOR = "\n\n" + "=" * 60 + "\n\n"
+
+
+# ---------- Input ----------
+def iter_raw_rows(path):
+    """
+    Yield raw field dicts from a .csv or .jsonl/.json-lines file. An unreadable
+    line is yielded as a ValueError, so it keeps its row number and is reported
+    as a row error instead of ending the run.
+    """
+    if path.lower().endswith(".csv"):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            yield from csv.DictReader(f)
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield ValueError(f"invalid JSON: {e}")
+                continue
+            yield row if isinstance(row, dict) else ValueError("row must be a JSON object")
+
+def load_template(path):
+    """Template JSON with DEFAULT_TEMPLATE keys; missing keys fall back to the defaults."""
+    tmpl = DEFAULT_TEMPLATE.copy()
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            tmpl.update(json.load(f))
+    return tmpl
+
+def _chunks(rows, size):
+    chunk, first = [], 1
+    for i, row in enumerate(rows, start=1):
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield first, chunk
+            chunk, first = [], i + 1
+    if chunk:
+        yield first, chunk
+
+
+# ---------- Work ----------
+def build_chunk(tmpl, system, global_apis, first_row, rows, with_previews=True):
+    """Records, previews and (row, message) errors for one chunk of raw rows."""
+    records, previews, errors = [], [], []
+    for n, row in enumerate(rows, start=first_row):
+        if isinstance(row, ValueError):
+            errors.append((n, str(row)))
+            continue
+        sys_text = row.get("system") or system
+        gapis = row.get("global_apis") or global_apis
+        fields = [row.get(f) or "" for f in RAW_FIELDS]
+        apis, question, thought, code, answer = fields
+        text, ok = render_preview_with_template(tmpl, sys_text, gapis, apis, question, thought, code, answer)
+        if ok is None:
+            errors.append((n, text))
+            continue
+        records.append(to_json_record_with_template(tmpl, sys_text, gapis, apis, question, thought, code, answer))
+        if with_previews:
+            previews.append(text)
+    return records, previews, errors
+
+def _build_chunk_args(args):
+    return build_chunk(*args)
+
+def _ordered_map(pool, fn, items, max_pending):
+    """Like pool.map, but with a bounded number of chunks in flight."""
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def iter_built_chunks(rows, tmpl, system, global_apis, workers=None, with_previews=True, chunk_rows=CHUNK_ROWS):
+    """Build chunks in order; uses a process pool when more than one worker is available."""
+    jobs = ((tmpl, system, global_apis, first, chunk, with_previews) for first, chunk in _chunks(rows, chunk_rows))
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        for job in jobs:
+            yield build_chunk(*job)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for records, previews, errors in _ordered_map(pool, _build_chunk_args, jobs, workers * 2):
+            # records come back pickled: share pooled texts again in this process
+            yield [intern_record(r) for r in records], previews, errors
+
+
+# ---------- Entry point ----------
+def _read_text(path, default):
+    if not path:
+        return default
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def run(args):
+    tmpl = load_template(args.template)
+    system = args.system if args.system is not None else _read_text(args.system_file, DEFAULT_SYSTEM)
+    global_apis = _read_text(args.global_apis_file, DEFAULT_APIS)
+
+    previews_f = open(args.previews, "w", encoding="utf-8") if args.previews else None
+    jsonl_f = open(args.jsonl, "w", encoding="utf-8", buffering=1 << 20) if args.jsonl else None
+    kept = [] if (args.json or args.sharded or args.index) else None
+    n_ok, n_err, first_preview = 0, 0, True
+    pooled_seen = set()         # one string table for the whole --jsonl stream, not one per chunk
+    try:
+        chunks = iter_built_chunks(iter_raw_rows(args.input), tmpl, system, global_apis,
+                                   workers=args.workers, with_previews=previews_f is not None)
+        for records, previews, errors in chunks:
+            if previews_f is not None:
+                for text in previews:
+                    previews_f.write(text if first_preview else PREVIEW_SEPARATOR + text)
+                    first_preview = False
+            if jsonl_f is not None:
+                for _, text in iter_jsonl_batches(records, duplicate_system=not args.no_system, pooled=args.pooled,
+                                                  seen=pooled_seen):
+                    jsonl_f.write(text)
+            if kept is not None:
+                kept.extend(records)
+            for row, msg in errors:
+                print(f"row {row}: {msg}", file=sys.stderr)
+            n_ok += len(records)
+            n_err += len(errors)
+            if not args.quiet:
+                print(f"… {n_ok} records", file=sys.stderr)
+    finally:
+        if previews_f is not None:
+            previews_f.close()
+        if jsonl_f is not None:
+            jsonl_f.close()
+    if args.json:
+        write_json_object(kept, args.json, system, tmpl, global_apis)
+    if args.sharded:
+        write_sharded_export(kept, args.sharded, args.compression, duplicate_system=not args.no_system)
+    if args.index:
+        index = RetrievalIndex.build(kept)
+        for target in (args.jsonl, args.json, args.sharded):
+            if target:
+                save_index_for_export(index, target.rstrip("/\\"))
+    print(f"Built {n_ok} records ({n_err} skipped).", file=sys.stderr)
+    return 0 if n_ok or not n_err else 1
+
+def build_parser():
+    p = argparse.ArgumentParser(description="Format few-shot examples without the web UI.")
+    p.add_argument("--input", required=True, help="raw fields as .csv or .jsonl")
+    p.add_argument("--template", help="JSON file with DEFAULT_TEMPLATE keys (default: DEFAULT_TEMPLATE)")
+    p.add_argument("--system", help="System message (overrides --system-file)")
+    p.add_argument("--system-file", help="file holding the System message (default: DEFAULT_SYSTEM)")
+    p.add_argument("--global-apis-file", help="file holding the global APIs block (default: DEFAULT_APIS)")
+    p.add_argument("--previews", help="write rendered previews here")
+    p.add_argument("--jsonl", help="write per-line records here")
+    p.add_argument("--json", help="write the single-object export here")
+    p.add_argument("--sharded", help="write a sharded, randomly accessible export into this directory")
+    p.add_argument("--compression", choices=sorted(COMPRESSIONS), default="gzip", help="--sharded block compression")
+    p.add_argument("--pooled", action="store_true", help="JSONL: write System/APIs texts once in a string table")
+    p.add_argument("--no-system", action="store_true", help="JSONL / sharded: drop 'system' from each record")
+    p.add_argument("--index", action="store_true",
+                   help="save a retrieval index next to each export (<export>.index.npz)")
+    p.add_argument("--workers", type=int, default=None, help="processes to use (default: all cores; 1 = no pool)")
+    p.add_argument("--quiet", action="store_true", help="no progress output")
+    return p
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not (args.previews or args.jsonl or args.json or args.sharded):
+        build_parser().error("nothing to do: give at least one of --previews, --jsonl, --json, --sharded")
+    return run(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+# code_validation.py
+"""
+Static checks of example code against the APIs it is allowed to use.
+
+The code section is parsed with `ast`; a record gets an issue for a syntax
+error, or for each bare-name call that is not declared in its APIs /
+global APIs block, not bound in the code itself (def, import, assignment,
+argument) and not a builtin. Attribute calls such as `np.mean(x)` or
+`img.crop()` cannot be resolved statically and are not checked. Records
+without any declared API are only checked for syntax.
+
+API blocks are parsed with `ast` too, falling back to `def name(` / `class name`
+lines when the doc is not valid Python. They repeat across thousands of
+records, so declarations are cached by the block's content hash (its
+SHARED_POOL ref) and results by code hash + API refs. validate_records()
+checks a whole dataset or import on a process pool; every distinct API text
+is sent to a worker once per chunk, not once per record.
+
+    python code_validation.py fewshot.jsonl [--workers 4]
+"""
+import argparse
+import ast
+import builtins
+import hashlib
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from builder_utils import SHARED_POOL
+
+SYNTAX, UNDECLARED = "syntax", "undeclared"
+RESULT_CACHE_SIZE = 65536
+CHUNK_RECORDS = 2000
+PARALLEL_MIN_RECORDS = 5000     # smaller datasets are checked in-process
+MAX_REPORTED = 20
+
+_BUILTINS = frozenset(dir(builtins))
+_DECL_RE = re.compile(r"^[ \t]*(?:async[ \t]+)?(?:def|class)[ \t]+([A-Za-z_]\w*)", re.M)
+
+
+# ---------- Parsing ----------
+_DEFS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+_IMPORTS = (ast.Import, ast.ImportFrom)
+
+def _scan(tree):
+    """
+    (bound names, [(called name, line)]) in one pass. Bound: defs, classes,
+    imports, assignment targets, arguments. Called: bare-name calls only.
+    Hand-rolled instead of ast.walk, which dominates the cost on short code.
+    """
+    bound, calls = set(), []
+    AST, Name, Call, Load, arg = ast.AST, ast.Name, ast.Call, ast.Load, ast.arg
+    stack = [tree]
+    pop, push, extend = stack.pop, stack.append, stack.extend
+    while stack:
+        node = pop()
+        t = type(node)
+        if t is Name:
+            if type(node.ctx) is not Load:
+                bound.add(node.id)
+            continue
+        if t is Call:
+            if type(node.func) is Name:
+                calls.append((node.func.id, node.lineno))
+        elif t is arg:
+            bound.add(node.arg)
+        elif t in _DEFS:
+            bound.add(node.name)
+        elif t in _IMPORTS:
+            for alias in node.names:
+                bound.add(alias.asname or alias.name.split(".")[0])
+        elif t is ast.ExceptHandler and node.name:
+            bound.add(node.name)
+        for field in node._fields:
+            value = getattr(node, field, None)
+            if type(value) is list:
+                extend(v for v in value if isinstance(v, AST))
+            elif isinstance(value, AST) and field != "ctx":
+                push(value)
+    return bound, calls
+
+def declared_names(apis_text):
+    """Functions / classes / names an API block declares."""
+    if not (apis_text or "").strip():
+        return frozenset()
+    try:
+        tree = ast.parse(apis_text)
+    except (SyntaxError, ValueError):
+        return frozenset(_DECL_RE.findall(apis_text))
+    return frozenset(_scan(tree)[0])
+
+def check_code(code, declared):
+    """Issues of one code text, as a tuple of (kind, line, message)."""
+    if not (code or "").strip():
+        return ()
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return ((SYNTAX, e.lineno or 0, f"syntax error: {e.msg}"),)
+    except ValueError as e:       # e.g. null bytes
+        return ((SYNTAX, 0, f"syntax error: {e}"),)
+    if not declared:
+        return ()
+    bound, calls = _scan(tree)
+    issues, seen = [], set()
+    for name, line in sorted(calls, key=lambda call: call[1]):
+        if name not in seen and name not in declared and name not in bound and name not in _BUILTINS:
+            seen.add(name)
+            issues.append((UNDECLARED, line, f"call to undeclared API: {name}()"))
+    return tuple(issues)
+
+
+# ---------- Cached validator ----------
+class CodeValidator:
+    """
+    validate(code, apis, global_apis) with two caches: API declarations by
+    content hash, and results by (code hash, API hashes). Safe to share
+    between threads.
+    """
+
+    def __init__(self, max_results=RESULT_CACHE_SIZE):
+        self.max_results = max_results
+        self.hits = 0
+        self.misses = 0
+        self._declared = {}              # API ref -> frozenset of names
+        self._results = OrderedDict()    # (code hash, refs) -> issues
+        self._lock = threading.Lock()
+
+    def _names(self, ref, text):
+        names = self._declared.get(ref)
+        if names is None:
+            names = self._declared[ref] = declared_names(text)
+        return names
+
+    def declared(self, apis="", global_apis=""):
+        names = frozenset()
+        for text in (apis, global_apis):
+            if text:
+                names |= self._names(SHARED_POOL.ref(text), text)
+        return names
+
+    def key(self, code, apis="", global_apis=""):
+        return (
+            hashlib.sha1(code.encode("utf-8")).digest(),
+            SHARED_POOL.ref(apis) if apis else "",
+            SHARED_POOL.ref(global_apis) if global_apis else "",
+        )
+
+    def cached(self, key):
+        """Cached issues for `key`, or None (counted as a hit / miss)."""
+        with self._lock:
+            issues = self._results.get(key)
+            if issues is None:
+                self.misses += 1
+                return None
+            self._results.move_to_end(key)
+            self.hits += 1
+            return issues
+
+    def store(self, key, issues):
+        with self._lock:
+            self._results[key] = issues
+            if len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+
+    def validate(self, code, apis="", global_apis=""):
+        if not (code or "").strip():
+            return ()
+        key = self.key(code, apis, global_apis)
+        issues = self.cached(key)
+        if issues is None:
+            issues = check_code(code, self.declared(apis, global_apis))
+            self.store(key, issues)
+        return issues
+
+    def validate_record(self, rec):
+        return self.validate(rec.get("code") or "", rec.get("apis") or "", rec.get("global_apis") or "")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "api_blocks": len(self._declared),
+            "results": len(self._results),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+VALIDATOR = CodeValidator()
+
+
+# ---------- Whole datasets ----------
+def _check_chunk(texts, items, declared=None):
+    """texts {ref: API text}, items [(key, code)] -> [(key, issues)]; runs in pool workers."""
+    if declared is None:
+        declared = VALIDATOR._declared    # per worker process, kept across chunks
+    out = []
+    for key, code in items:
+        names = frozenset()
+        for ref in key[1:]:
+            if ref:
+                if ref not in declared:
+                    declared[ref] = declared_names(texts[ref])
+                names |= declared[ref]
+        out.append((key, check_code(code, names)))
+    return out
+
+def _chunk_jobs(pending, api_texts, chunk_records):
+    items = list(pending.items())
+    for i in range(0, len(items), chunk_records):
+        chunk = [(key, code) for key, (code, _) in items[i:i + chunk_records]]
+        refs = {ref for key, _ in chunk for ref in key[1:] if ref}
+        yield chunk, {ref: api_texts[ref] for ref in refs}
+
+def validate_records(records, workers=None, validator=VALIDATOR, progress=None, chunk_records=CHUNK_RECORDS):
+    """
+    [(position, issues)] for the records with issues, in order. Cached results
+    are used first and identical code + APIs is checked once; the rest runs on
+    a process pool when there are at least PARALLEL_MIN_RECORDS distinct
+    items (workers == 1 keeps it in-process). `progress(done, total)` counts
+    distinct items checked.
+    """
+    found = []
+    pending = {}        # key -> (code, [positions])
+    api_texts = {}
+    for pos, rec in enumerate(records):
+        code = rec.get("code") or ""
+        if not code.strip():
+            continue
+        apis, gapis = rec.get("apis") or "", rec.get("global_apis") or ""
+        key = validator.key(code, apis, gapis)
+        if key in pending:
+            pending[key][1].append(pos)
+            continue
+        issues = validator.cached(key)
+        if issues is not None:
+            if issues:
+                found.append((pos, issues))
+            continue
+        pending[key] = (code, [pos])
+        if key[1]:
+            api_texts[key[1]] = apis
+        if key[2]:
+            api_texts[key[2]] = gapis
+
+    total = len(pending)
+    done = 0
+    def _collect(results):
+        nonlocal done
+        for key, issues in results:
+            validator.store(key, issues)
+            if issues:
+                found.extend((pos, issues) for pos in pending[key][1])
+        done += len(results)
+        if progress is not None:
+            progress(done, total)
+
+    jobs = _chunk_jobs(pending, api_texts, chunk_records)
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(pending) < PARALLEL_MIN_RECORDS:
+        for chunk, texts in jobs:
+            _collect(_check_chunk(texts, chunk, validator._declared))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            queue = deque()
+            for chunk, texts in jobs:
+                queue.append(pool.submit(_check_chunk, texts, chunk))
+                if len(queue) >= 2 * workers:
+                    _collect(queue.popleft().result())
+            while queue:
+                _collect(queue.popleft().result())
+    found.sort(key=lambda item: item[0])
+    return found
+
+
+# ---------- Reporting ----------
+def format_issues(issues):
+    """Short message for the add-example status box."""
+    return "⚠️ Code check: " + "; ".join(
+        f"line {line}: {msg}" if line else msg for _, line, msg in issues
+    )
+
+def issue_rows(found, offset=0, limit=None):
+    """Table rows [#, line, problem] (1-based example numbers)."""
+    rows = []
+    for pos, issues in found:
+        for _, line, msg in issues:
+            rows.append([pos + offset + 1, line, msg])
+            if limit is not None and len(rows) >= limit:
+                return rows
+    return rows
+
+def summarize(found, n_records, offset=0):
+    if not found:
+        return f"✅ Code of all {n_records} examples parses and only calls declared APIs."
+    shown = ", ".join(f"#{pos + offset + 1}" for pos, _ in found[:MAX_REPORTED])
+    more = f" … and {len(found) - MAX_REPORTED} more" if len(found) > MAX_REPORTED else ""
+    return f"⚠️ {len(found)} of {n_records} examples have code issues: {shown}{more}"
+
+
+# ---------- Command line ----------
+def main(argv=None):
+    from import_utils import load_records
+
+    p = argparse.ArgumentParser(description="Check example code against the declared APIs.")
+    p.add_argument("input", help="JSONL or single-object JSON export")
+    p.add_argument("--workers", type=int, default=None, help="processes to use (default: all cores; 1 = no pool)")
+    args = p.parse_args(argv)
+
+    records, errors = load_records(args.input)
+    found = validate_records(records, workers=args.workers)
+    for row in issue_rows(found):
+        print(f"#{row[0]} line {row[1]}: {row[2]}")
+    print(summarize(found, len(records)) + f" ({len(errors)} unreadable lines)", file=sys.stderr)
+    return 1 if found else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,681 @@
+# dataset_store.py
+import json
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import datetime
+
+from builder_utils import (
+    POOLED_FIELDS,
+    RECORD_FIELDS,
+    SHARED_POOL,
+    _encode_json,
+    _pooled_record,
+    _record_cells,
+    compile_record_template,
+    expand_record,
+    render_cached,
+)
+
+_POOLED = frozenset(POOLED_FIELDS)
+
+# ---------- Shared template-configuration table ----------
+# Every record carries the same handful of 'meta' dicts (included sections, scope,
+# preview flags). They are stored once here and records keep a small int id.
+_META_TABLE = []      # id -> frozen meta (tuple of (key, value) with lists as tuples)
+_META_IDS = {}        # frozen meta -> id
+NO_META = -1
+
+def _freeze_meta(meta):
+    return tuple((k, tuple(v) if isinstance(v, list) else v) for k, v in meta.items())
+
+def meta_id(meta):
+    """Id of a meta dict in the shared table (added on first use)."""
+    if meta is None:
+        return NO_META
+    frozen = _freeze_meta(meta)
+    mid = _META_IDS.get(frozen)
+    if mid is None:
+        mid = _META_IDS[frozen] = len(_META_TABLE)
+        _META_TABLE.append(frozen)
+    return mid
+
+def meta_for(mid):
+    """Fresh meta dict for an id (callers may mutate it)."""
+    if mid == NO_META:
+        return None
+    return {k: list(v) if isinstance(v, tuple) else v for k, v in _META_TABLE[mid]}
+
+
+# ---------- Columnar dataset ----------
+class Dataset:
+    """
+    Column-oriented replacement for the list[dict] dataset state.
+
+    Each field of RECORD_FIELDS is one list (None where the record has no such
+    key), 'meta' is an id into the shared table above, and pooled texts
+    (system/APIs) are interned so repeated prompts are held once. Indexing and
+    iteration return plain record dicts identical to to_json_record_with_template
+    output, so the builder_utils functions work on either representation.
+    """
+    __slots__ = ("_cols", "_meta", "_extra", "_cells", "_cells_max_len")
+
+    def __init__(self, records=None):
+        self._cols = {field: [] for field in RECORD_FIELDS}
+        self._meta = []       # meta id per record
+        self._extra = []      # dict of unknown keys per record, usually None
+        self._cells = []      # cached table cells per record, None until shown
+        self._cells_max_len = 120
+        if records:
+            self.extend(records)
+
+    # ----- sequence protocol -----
+    def __len__(self):
+        return len(self._meta)
+
+    def __iter__(self):
+        record = self._record
+        for i in range(len(self._meta)):
+            yield record(i)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._take(range(*index.indices(len(self))))
+        return self._record(self._index(index))
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            for col in self._columns():
+                del col[index]
+            return
+        i = self._index(index)
+        for col in self._columns():
+            del col[i]
+
+    def __add__(self, other):
+        out = self.copy()
+        out.extend(other)
+        return out
+
+    def __reduce__(self):
+        # Meta ids are process-local, so pickling/deepcopy goes through the portable form.
+        return (Dataset.from_dict, (self.to_dict(),))
+
+    def __repr__(self):
+        return f"Dataset({len(self)} records, {len(set(self._meta))} template configs)"
+
+    # ----- mutation -----
+    def append(self, rec):
+        cols = self._cols
+        extra = None
+        for k, v in rec.items():
+            if k == "meta" or k in cols:
+                continue
+            if extra is None:
+                extra = {}
+            extra[k] = v
+        intern = SHARED_POOL.intern
+        for field, col in cols.items():
+            v = rec.get(field)
+            col.append(intern(v) if field in _POOLED else v)
+        self._meta.append(meta_id(rec.get("meta")))
+        self._extra.append(extra)
+        self._cells.append(None)
+
+    def extend(self, records):
+        if isinstance(records, Dataset):
+            for field, col in self._cols.items():
+                col.extend(records._cols[field])
+            self._meta.extend(records._meta)
+            self._extra.extend(records._extra)
+            self._cells.extend(records._cells if records._cells_max_len == self._cells_max_len
+                               else [None] * len(records))
+            return
+        for rec in records:
+            self.append(rec)
+
+    def pop(self, index=-1):
+        i = self._index(index)
+        rec = self._record(i)
+        del self[i]
+        return rec
+
+    def clear(self):
+        for col in self._columns():
+            col.clear()
+
+    def copy(self):
+        out = Dataset()
+        out.extend(self)
+        return out
+
+    # ----- per-record helpers -----
+    def meta_id(self, index):
+        return self._meta[self._index(index)]
+
+    def row_cells(self, index, max_len=120):
+        """Truncated table cells for one record (without '#'), computed once."""
+        if max_len != self._cells_max_len:
+            self._cells = [None] * len(self)
+            self._cells_max_len = max_len
+        i = self._index(index)
+        cells = self._cells[i]
+        if cells is None:
+            cells = self._cells[i] = _record_cells(self._record(i), max_len)
+        return cells
+
+    def page_cells(self, start, end, max_len=120):
+        return [self.row_cells(i, max_len) for i in range(start, min(end, len(self)))]
+
+    def render(self, index):
+        i = self._index(index)
+        return render_cached(compile_record_template(meta_for(self._meta[i])), self._record(i))
+
+    def render_all(self):
+        """Render every record; the template is compiled once per distinct meta id."""
+        compiled = {}
+        out = []
+        for i, mid in enumerate(self._meta):
+            tmpl = compiled.get(mid)
+            if tmpl is None:
+                tmpl = compiled[mid] = compile_record_template(meta_for(mid))
+            out.append(tmpl.render(self._record(i)))
+        return out
+
+    # ----- serialization -----
+    def to_records(self):
+        return list(self)
+
+    @classmethod
+    def from_records(cls, records):
+        return cls(records)
+
+    def to_dict(self):
+        """Compact column form: the meta table is written once, not per record."""
+        used = sorted({m for m in self._meta if m != NO_META})
+        local = {mid: n for n, mid in enumerate(used)}
+        return {
+            "format": "columnar-v1",
+            "meta_table": [meta_for(mid) for mid in used],
+            "meta": [local.get(m, NO_META) for m in self._meta],
+            "columns": {field: list(col) for field, col in self._cols.items()},
+            "extra": list(self._extra),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        out = cls()
+        ids = [meta_id(m) for m in data.get("meta_table") or []]
+        out._meta = [ids[m] if m != NO_META else NO_META for m in data["meta"]]
+        n = len(out._meta)
+        intern = SHARED_POOL.intern
+        for field in RECORD_FIELDS:
+            col = (data.get("columns") or {}).get(field) or [None] * n
+            out._cols[field] = [intern(v) for v in col] if field in _POOLED else list(col)
+        out._extra = list(data.get("extra") or [None] * n)
+        out._cells = [None] * n
+        return out
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_dict(json.loads(text))
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    # ----- internals -----
+    def _columns(self):
+        return (*self._cols.values(), self._meta, self._extra, self._cells)
+
+    def _index(self, index):
+        n = len(self._meta)
+        if index < 0:
+            index += n
+        if index < 0 or index >= n:
+            raise IndexError("Dataset index out of range")
+        return index
+
+    def _record(self, i):
+        # Same key order as to_json_record_with_template, so exports are unchanged.
+        mid = self._meta[i]
+        rec = {} if mid == NO_META else {"meta": meta_for(mid)}
+        for field, col in self._cols.items():
+            v = col[i]
+            if v is not None:
+                rec[field] = v
+        extra = self._extra[i]
+        if extra:
+            rec.update(extra)
+        return rec
+
+    def _take(self, indices):
+        out = Dataset()
+        for field, col in self._cols.items():
+            out._cols[field] = [col[i] for i in indices]
+        out._meta = [self._meta[i] for i in indices]
+        out._extra = [self._extra[i] for i in indices]
+        out._cells = [self._cells[i] for i in indices]
+        out._cells_max_len = self._cells_max_len
+        return out
+
+
+# ---------- SQLite-backed dataset ----------
+# Server-side store so UI handlers pass a dataset id instead of the whole dataset.
+# Records are kept in insertion order (seq). Each process keeps the ordered seqs
+# of the datasets it uses (_SEQS), so a position is a list index and rows are
+# read by seq (keyset) instead of scanning past them with OFFSET.
+DEFAULT_DB_PATH = os.environ.get("FEWSHOT_DB_PATH", "./fewshot_datasets.sqlite3")
+ITER_CHUNK = 1000
+_SEQ_BATCH = 500       # seqs per IN (...) list, below SQLite's variable limit
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS datasets (
+    id      TEXT PRIMARY KEY,
+    n       INTEGER NOT NULL DEFAULT 0,
+    created TEXT,
+    updated TEXT
+);
+CREATE TABLE IF NOT EXISTS strings (
+    ref  TEXT PRIMARY KEY,
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS records (
+    seq     INTEGER PRIMARY KEY AUTOINCREMENT,
+    dataset TEXT NOT NULL,
+    body    TEXT NOT NULL,   -- record JSON, pooled texts as '<field>_ref'
+    cells   TEXT NOT NULL    -- truncated table cells JSON
+);
+CREATE INDEX IF NOT EXISTS records_by_dataset ON records (dataset, seq);
+"""
+
+_local = threading.local()
+
+# ---------- Per-dataset caches ----------
+# Indexes, histories and seq lists are kept per dataset id for as long as the
+# process runs. On a shared instance every browser session brings a dataset,
+# so each such registry keeps only the most recently used ones; an evicted
+# entry is rebuilt from the dataset the next time it is needed.
+MAX_CACHED_DATASETS = int(os.environ.get("FEWSHOT_MAX_CACHED_DATASETS", "32"))
+
+
+class DatasetLRU:
+    """Thread-safe LRU of per-dataset objects, keyed by dataset id."""
+    __slots__ = ("max_datasets", "_items", "_lock")
+
+    def __init__(self, max_datasets=MAX_CACHED_DATASETS):
+        self.max_datasets = max_datasets
+        self._items = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+            return item
+
+    def put(self, key, item):
+        with self._lock:
+            self._items[key] = item
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_datasets:
+                self._items.popitem(last=False)
+            return item
+
+    def get_or_create(self, key, factory):
+        """The cached object, or factory() cached under `key` (built under the lock, once)."""
+        with self._lock:
+            item = self.get(key)
+            return item if item is not None else self.put(key, factory())
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._items.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+
+_SEQS = DatasetLRU()            # (db path, dataset id) -> array('q') of row seqs in position order
+_SEQS_LOCK = threading.RLock()  # held across a write and the matching _SEQS update
+
+def _connect(path):
+    """One connection per (thread, db path); Gradio runs handlers on a thread pool."""
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        conns[path] = conn
+    return conn
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class SqliteDataset:
+    """
+    A dataset stored in SQLite under an id, with the same interface as Dataset
+    (len, indexing, iteration, append, pop, page_cells, render). System/APIs
+    texts are stored once in the 'strings' table and referenced by hash.
+    """
+    __slots__ = ("id", "path")
+
+    def __init__(self, dataset_id, path=DEFAULT_DB_PATH):
+        self.id = dataset_id
+        self.path = path
+        conn = _connect(path)
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO datasets (id, n, created, updated) VALUES (?, 0, ?, ?)",
+                (dataset_id, _now(), _now()),
+            )
+
+    @property
+    def _conn(self):
+        return _connect(self.path)
+
+    # ----- sequence protocol -----
+    def __len__(self):
+        row = self._conn.execute("SELECT n FROM datasets WHERE id = ?", (self.id,)).fetchone()
+        return row[0] if row else 0
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        for _, body, _ in self.iter_rows():
+            yield self._decode(body)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return [self._decode(body) for _, body, _ in self._rows(start, stop)]
+        seq, body, _ = self._row(index)
+        return self._decode(body)
+
+    def __delitem__(self, index):
+        with _SEQS_LOCK:
+            self.delete_seqs([self._seq_at(index)])
+
+    def __repr__(self):
+        return f"SqliteDataset({self.id!r}, {len(self)} records)"
+
+    # ----- mutation -----
+    def append(self, rec):
+        self.extend([rec])
+
+    def extend(self, records):
+        """Insert many records in one transaction."""
+        seen = set()
+        added = array("q")
+        with _SEQS_LOCK:
+            with self._conn as conn:
+                for rec in records:
+                    body, cells = self._encode(conn, rec, seen)
+                    added.append(conn.execute(
+                        "INSERT INTO records (dataset, body, cells) VALUES (?, ?, ?)", (self.id, body, cells)
+                    ).lastrowid)
+                conn.execute("UPDATE datasets SET n = n + ?, updated = ? WHERE id = ?",
+                             (len(added), _now(), self.id))
+            seqs = _SEQS.get(self._key)
+            if seqs is not None:
+                seqs.extend(added)      # AUTOINCREMENT: new seqs are larger than every existing one
+        return len(added)
+
+    def pop(self, index=-1):
+        with _SEQS_LOCK:
+            seq, body, _ = self._row(index)
+            self.delete_seqs([seq])
+        return self._decode(body)
+
+    def clear(self):
+        with _SEQS_LOCK:
+            with self._conn as conn:
+                conn.execute("DELETE FROM records WHERE dataset = ?", (self.id,))
+                conn.execute("UPDATE datasets SET n = 0, updated = ? WHERE id = ?", (_now(), self.id))
+            _SEQS.pop(self._key, None)
+
+    # ----- batch edits (by row seq, for edit_history) -----
+    def seqs(self, start=0, stop=None):
+        """Row seqs of positions [start, stop), in order (index-only scan)."""
+        with _SEQS_LOCK:
+            return self._seqs()[start:stop].tolist()
+
+    def seqs_at(self, positions):
+        """Row seqs of the given positions (sorted, distinct); raises IndexError when out of range."""
+        positions = sorted(set(positions))
+        if not positions:
+            return []
+        with _SEQS_LOCK:
+            seqs = self._seqs()
+            if positions[0] < 0 or positions[-1] >= len(seqs):
+                raise IndexError("Dataset index out of range")
+            return [seqs[p] for p in positions]
+
+    def rows_by_seq(self, seqs):
+        """[(seq, body, cells)] for row seqs, in seq order."""
+        out = []
+        for i in range(0, len(seqs), _SEQ_BATCH):
+            chunk = seqs[i:i + _SEQ_BATCH]
+            out.extend(self._conn.execute(
+                f"SELECT seq, body, cells FROM records WHERE seq IN ({','.join('?' * len(chunk))})", chunk
+            ))
+        out.sort()
+        return out
+
+    def iter_rows(self):
+        """(seq, body, cells) of every row, in order."""
+        conn = self._conn
+        last = -1
+        while True:
+            rows = conn.execute(
+                "SELECT seq, body, cells FROM records WHERE dataset = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (self.id, last, ITER_CHUNK),
+            ).fetchall()
+            if not rows:
+                return
+            yield from rows
+            last = rows[-1][0]
+
+    def encode_rows(self, items):
+        """[(seq, body, cells)] for (seq, record) pairs; pooled texts go to the strings table."""
+        seen = set()
+        with self._conn as conn:
+            return [(seq, *self._encode(conn, rec, seen)) for seq, rec in items]
+
+    def delete_seqs(self, seqs):
+        with _SEQS_LOCK:
+            with self._conn as conn:
+                n = 0
+                for i in range(0, len(seqs), _SEQ_BATCH):
+                    chunk = seqs[i:i + _SEQ_BATCH]
+                    n += conn.execute(
+                        f"DELETE FROM records WHERE dataset = ? AND seq IN ({','.join('?' * len(chunk))})",
+                        (self.id, *chunk),
+                    ).rowcount
+                conn.execute("UPDATE datasets SET n = n - ?, updated = ? WHERE id = ?", (n, _now(), self.id))
+            cached = _SEQS.get(self._key)
+            if cached is not None:
+                _remove_seqs(cached, seqs)
+        return n
+
+    def restore_rows(self, rows):
+        """Re-insert deleted (seq, body, cells) rows under their old seqs, i.e. at their old positions."""
+        with _SEQS_LOCK:
+            with self._conn as conn:
+                conn.executemany(
+                    "INSERT INTO records (seq, dataset, body, cells) VALUES (?, ?, ?, ?)",
+                    ((seq, self.id, body, cells) for seq, body, cells in rows),
+                )
+                conn.execute("UPDATE datasets SET n = n + ?, updated = ? WHERE id = ?",
+                             (len(rows), _now(), self.id))
+            cached = _SEQS.get(self._key)
+            if cached is not None:
+                _insert_seqs(cached, [row[0] for row in rows])
+        return len(rows)
+
+    def update_rows(self, rows):
+        """Overwrite (seq, body, cells) rows in place."""
+        with self._conn as conn:
+            conn.executemany(
+                "UPDATE records SET body = ?, cells = ? WHERE seq = ? AND dataset = ?",
+                ((body, cells, seq, self.id) for seq, body, cells in rows),
+            )
+            conn.execute("UPDATE datasets SET updated = ? WHERE id = ?", (_now(), self.id))
+        return len(rows)
+
+    def drop(self):
+        """Remove the dataset and its records (pooled strings are shared and kept)."""
+        with _SEQS_LOCK:
+            with self._conn as conn:
+                conn.execute("DELETE FROM records WHERE dataset = ?", (self.id,))
+                conn.execute("DELETE FROM datasets WHERE id = ?", (self.id,))
+            _SEQS.pop(self._key, None)
+
+    # ----- per-record helpers -----
+    def row_cells(self, index, max_len=120):
+        seq, body, cells = self._row(index)
+        if max_len != 120:
+            return _record_cells(self._decode(body), max_len)
+        return json.loads(cells)
+
+    def page_cells(self, start, end, max_len=120):
+        rows = self._rows(start, end)
+        if max_len != 120:
+            return [_record_cells(self._decode(body), max_len) for _, body, _ in rows]
+        return [json.loads(cells) for _, _, cells in rows]
+
+    def render(self, index):
+        rec = self[index]
+        return render_cached(compile_record_template(rec.get("meta")), rec)
+
+    def to_dataset(self):
+        """Load into an in-memory columnar Dataset."""
+        return Dataset(self)
+
+    # ----- internals -----
+    @property
+    def _key(self):
+        return (self.path, self.id)
+
+    def _seqs(self):
+        """Row seqs in position order (call with _SEQS_LOCK held); reloaded when the count is off."""
+        seqs = _SEQS.get(self._key)
+        if seqs is None or len(seqs) != len(self):
+            seqs = _SEQS.put(self._key, array("q", (seq for (seq,) in self._conn.execute(
+                "SELECT seq FROM records WHERE dataset = ? ORDER BY seq", (self.id,)
+            ))))
+        return seqs
+
+    def _seq_at(self, index):
+        with _SEQS_LOCK:
+            seqs = self._seqs()
+            if not -len(seqs) <= index < len(seqs):
+                raise IndexError("Dataset index out of range")
+            return seqs[index]
+
+    def _row(self, index):
+        return self._conn.execute(
+            "SELECT seq, body, cells FROM records WHERE seq = ?", (self._seq_at(index),)
+        ).fetchone()
+
+    def _rows(self, start, end):
+        with _SEQS_LOCK:
+            seqs = self._seqs()[start:end]
+        if not seqs:
+            return []
+        return self._conn.execute(
+            "SELECT seq, body, cells FROM records WHERE dataset = ? AND seq BETWEEN ? AND ? ORDER BY seq",
+            (self.id, seqs[0], seqs[-1]),
+        ).fetchall()
+
+    def _encode(self, conn, rec, seen):
+        entries = {}
+        body = _pooled_record(rec, True, SHARED_POOL.ref, seen, entries)
+        if entries:
+            conn.executemany("INSERT OR IGNORE INTO strings (ref, text) VALUES (?, ?)", entries.items())
+        return _encode_json(body), _encode_json(_record_cells(rec))
+
+    def decode(self, body):
+        return self._decode(body)
+
+    def _decode(self, body):
+        rec = json.loads(body)
+        return expand_record(rec, _StringTable(self._conn))
+
+
+def _remove_seqs(seqs, removed):
+    if len(removed) > 64:
+        drop = set(removed)
+        seqs[:] = array("q", (seq for seq in seqs if seq not in drop))
+        return
+    for seq in removed:
+        i = bisect_left(seqs, seq)
+        if i < len(seqs) and seqs[i] == seq:
+            del seqs[i]
+
+def _insert_seqs(seqs, added):
+    if len(added) > 64:
+        seqs[:] = array("q", sorted(set(seqs).union(added)))
+        return
+    for seq in added:
+        insort(seqs, seq)
+
+
+class _StringTable:
+    """Resolve pooled refs through SHARED_POOL, falling back to the 'strings' table."""
+    __slots__ = ("_conn",)
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getitem__(self, ref):
+        text = SHARED_POOL.get(ref)
+        if text is None:
+            row = self._conn.execute("SELECT text FROM strings WHERE ref = ?", (ref,)).fetchone()
+            if row is None:
+                raise KeyError(ref)
+            text = SHARED_POOL.add(ref, row[0])
+        return text
+
+
+_DATASET_ID = re.compile(r"[0-9a-f]{32}")
+
+def valid_dataset_id(dataset_id):
+    """Ids are uuid4 hex; anything else (e.g. a tampered BrowserState value) is rejected."""
+    return isinstance(dataset_id, str) and _DATASET_ID.fullmatch(dataset_id) is not None
+
+def open_dataset(dataset_id=None, path=DEFAULT_DB_PATH):
+    """Open (creating if needed) a SQLite dataset; a new random id is used when none is given."""
+    if dataset_id and not valid_dataset_id(dataset_id):
+        raise ValueError("Invalid dataset id.")
+    return SqliteDataset(dataset_id or uuid.uuid4().hex, path)
@@ -0,0 +1,279 @@
+# dedup_utils.py
+import argparse
+import hashlib
+import re
+import sys
+import threading
+import zlib
+from bisect import bisect_left
+
+import numpy as np
+
+from dataset_store import DatasetLRU
+
+# ---------- Normalization & shingles ----------
+DEFAULT_FIELDS = ("question", "code")
+DEFAULT_THRESHOLD = 0.8
+NUM_PERM = 64
+BANDS = 16            # 16 bands x 4 rows: candidates from roughly 0.5 Jaccard upwards
+SHINGLE_WORDS = 3
+
+_WORD_RE = re.compile(r"\w+")
+_PRIME = (1 << 61) - 1
+
+def normalize_text(record, fields=DEFAULT_FIELDS):
+    """Lower-cased words of the chosen fields, joined by single spaces."""
+    parts = []
+    for field in fields:
+        words = _WORD_RE.findall((record.get(field) or "").lower())
+        parts.append(" ".join(words))
+    return " | ".join(parts)
+
+def _shingles(text, k=SHINGLE_WORDS):
+    words = text.split()
+    if len(words) <= k:
+        grams = {text}
+    else:
+        grams = {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+class MinHasher:
+    """MinHash signatures computed for all permutations at once with NumPy."""
+    __slots__ = ("num_perm", "_a", "_b")
+
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        # (a*x + b) mod p with a, b < p; the product wraps mod 2**64 like in datasketch
+        self._a = rng.randint(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, _PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text):
+        x = _shingles(text)
+        h = (np.outer(x, self._a) + self._b) % _PRIME
+        return (h.min(axis=0) & 0xFFFFFFFF).astype(np.uint32)
+
+
+# ---------- Index ----------
+class DuplicateIndex:
+    """
+    Exact + near-duplicate detection over dataset records.
+
+    Exact duplicates are found by a hash of the normalized text; near
+    duplicates by MinHash signatures bucketed with LSH banding, so a check
+    compares against a handful of candidates instead of the whole dataset.
+    Positions follow the dataset (append / delete by 0-based position).
+    Records with none of the compared fields filled in are kept in position
+    but never match anything: they have no text to compare.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_perm=NUM_PERM, bands=BANDS, fields=DEFAULT_FIELDS):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.fields = tuple(fields)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._hasher = MinHasher(num_perm)
+        self._lock = threading.RLock()
+        self._sigs = np.zeros((0, num_perm), dtype=np.uint32)
+        self._n = 0               # doc ids handed out
+        self._exact = {}          # text digest -> [doc ids]
+        self._buckets = [dict() for _ in range(bands)]   # per band: band key -> [doc ids]
+        self._keys = {}           # doc id -> (digest, band keys)
+        self._order = []          # live doc ids in dataset order (ascending)
+
+    def _prepare(self, record):
+        text = normalize_text(record, self.fields)
+        if not text.strip(" |"):
+            return None, None, ()
+        digest = hashlib.sha1(text.encode("utf-8")).digest()
+        sig = self._hasher.signature(text)
+        r = self.rows
+        keys = [sig[i * r:(i + 1) * r].tobytes() for i in range(self.bands)]
+        return digest, sig, keys
+
+    def _position(self, doc):
+        return bisect_left(self._order, doc)
+
+    def _matches(self, prepared, exclude=None):
+        digest, sig, keys = prepared
+        found = {}
+        if digest is None:
+            return found
+        for doc in self._exact.get(digest, ()):
+            if doc != exclude:
+                found[doc] = (1.0, "exact")
+        candidates = set()
+        for band, key in zip(self._buckets, keys):
+            candidates.update(band.get(key, ()))
+        candidates.discard(exclude)
+        candidates.difference_update(found)
+        if candidates:
+            cand = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            sims = (self._sigs[cand] == sig).mean(axis=1)
+            for doc, sim in zip(cand.tolist(), sims.tolist()):
+                if sim >= self.threshold:
+                    found[doc] = (sim, "near")
+        return found
+
+    def check(self, record):
+        """Duplicates of `record` already indexed: [(position, similarity, "exact"|"near")], best first."""
+        prepared = self._prepare(record)
+        with self._lock:
+            found = self._matches(prepared)
+            out = [(self._position(doc), sim, kind) for doc, (sim, kind) in found.items()]
+        return sorted(out, key=lambda t: (-t[1], t[0]))
+
+    def add(self, record, prepared=None):
+        """Append one record (same position as its append to the dataset)."""
+        digest, sig, keys = prepared or self._prepare(record)
+        with self._lock:
+            doc = self._n
+            self._n += 1
+            if doc >= len(self._sigs):
+                grown = np.zeros((max(1024, 2 * len(self._sigs)), self._sigs.shape[1]), dtype=np.uint32)
+                grown[:len(self._sigs)] = self._sigs
+                self._sigs = grown
+            if digest is not None:
+                self._sigs[doc] = sig
+                self._exact.setdefault(digest, []).append(doc)
+                for band, key in zip(self._buckets, keys):
+                    band.setdefault(key, []).append(doc)
+            self._keys[doc] = (digest, keys)
+            self._order.append(doc)
+        return doc
+
+    def check_and_add(self, record):
+        """check() then add(); returns the duplicates found before adding."""
+        prepared = self._prepare(record)
+        with self._lock:
+            found = self._matches(prepared)
+            out = [(self._position(doc), sim, kind) for doc, (sim, kind) in found.items()]
+            self.add(record, prepared)
+        return sorted(out, key=lambda t: (-t[1], t[0]))
+
+    def extend(self, records):
+        for rec in records:
+            self.add(rec)
+
+    def delete(self, position):
+        """Remove the record at a 0-based dataset position."""
+        with self._lock:
+            doc = self._order.pop(position)
+            digest, keys = self._keys.pop(doc)
+            if digest is None:
+                return
+            _discard(self._exact, digest, doc)
+            for band, key in zip(self._buckets, keys):
+                _discard(band, key, doc)
+
+    def __len__(self):
+        return len(self._order)
+
+    @classmethod
+    def build(cls, records, **kwargs):
+        index = cls(**kwargs)
+        index.extend(records)
+        return index
+
+
+def _discard(table, key, doc):
+    docs = table.get(key)
+    if docs is not None:
+        docs.remove(doc)
+        if not docs:
+            del table[key]
+
+
+# ---------- Batch dedup ----------
+def find_duplicate_groups(records, threshold=DEFAULT_THRESHOLD, fields=DEFAULT_FIELDS):
+    """
+    Groups of 0-based positions whose records are exact or near duplicates of
+    each other (groups of size >= 2, first position first). Runs in one pass
+    with LSH candidates, i.e. sub-quadratic in the number of records.
+    """
+    index = DuplicateIndex(threshold=threshold, fields=fields)
+    parent = {}
+
+    def find(i):
+        while parent.get(i, i) != i:
+            parent[i] = parent.get(parent[i], parent[i])
+            i = parent[i]
+        return i
+
+    for pos, rec in enumerate(records):
+        for other, _, _ in index.check_and_add(rec):
+            ra, rb = find(pos), find(other)
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+    groups = {}
+    for pos in list(parent):
+        groups.setdefault(find(pos), set()).add(pos)
+    for root, members in groups.items():
+        members.add(root)
+    return sorted(sorted(g) for g in groups.values() if len(g) > 1)
+
+def dedupe_records(records, threshold=DEFAULT_THRESHOLD, fields=DEFAULT_FIELDS):
+    """Keep the first record of every duplicate group; returns (kept, removed_positions)."""
+    records = list(records)
+    removed = sorted(p for g in find_duplicate_groups(records, threshold, fields) for p in g[1:])
+    drop = set(removed)
+    return [r for i, r in enumerate(records) if i not in drop], removed
+
+def format_duplicates(dups):
+    """Short status text for check()/check_and_add() results (1-based #)."""
+    if not dups:
+        return ""
+    shown = ", ".join(
+        f"#{pos + 1} ({'exact' if kind == 'exact' else f'{sim:.0%} similar'})" for pos, sim, kind in dups[:5]
+    )
+    more = f" and {len(dups) - 5} more" if len(dups) > 5 else ""
+    return f"⚠️ Possible duplicate of {shown}{more}."
+
+
+# ---------- Per-dataset registry ----------
+_INDEXES = DatasetLRU()
+
+def dedup_index_for_dataset(dataset):
+    """Duplicate index for a recently used dataset store (anything with an 'id'), built on first use."""
+    return _INDEXES.get_or_create(dataset.id, lambda: DuplicateIndex.build(dataset))
+
+def on_record_deleted(dataset_id, position):
+    index = _INDEXES.get(dataset_id)
+    if index is not None:
+        index.delete(position)
+
+def drop_dataset_index(dataset_id):
+    _INDEXES.pop(dataset_id)
+
+
+# ---------- Command line ----------
+def main(argv=None):
+    """python dedup_utils.py dataset.jsonl --out deduped.jsonl [--threshold 0.8]"""
+    from builder_utils import stream_export_jsonl
+    from import_utils import load_records
+
+    p = argparse.ArgumentParser(description="Remove exact and near-duplicate examples from a dataset export.")
+    p.add_argument("input", help="JSONL or single-object JSON export")
+    p.add_argument("--out", help="write the deduplicated records here (JSONL); omit to only report")
+    p.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="near-duplicate Jaccard threshold")
+    p.add_argument("--fields", default=",".join(DEFAULT_FIELDS), help="comma-separated fields to compare")
+    args = p.parse_args(argv)
+
+    records, errors = load_records(args.input)
+    fields = tuple(f.strip() for f in args.fields.split(",") if f.strip())
+    groups = find_duplicate_groups(records, args.threshold, fields)
+    for g in groups:
+        print("duplicates: " + ", ".join(f"#{i + 1}" for i in g))
+    removed = sum(len(g) - 1 for g in groups)
+    print(f"{len(records)} records, {len(groups)} duplicate groups, {removed} removable "
+          f"({len(errors)} unreadable lines).", file=sys.stderr)
+    if args.out:
+        drop = {i for g in groups for i in g[1:]}
+        stream_export_jsonl((r for i, r in enumerate(records) if i not in drop), args.out)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,315 @@
+# edit_history.py
+"""
+Batch edits with undo / redo: delete many examples or a range, edit the
+fields of one example, find-and-replace across fields.
+
+Two histories share one interface (delete, delete_range, edit, replace,
+undo, redo):
+
+- EditHistory keeps records in memory. Every version is a PersistentSeq that
+  shares structure with the previous one, so a step costs about the records
+  it changed and undo just switches back to the older version.
+- SqliteEditHistory (used by the app) edits a SqliteDataset, which already
+  is the shared structure: a step keeps only the rows it changed (row seq,
+  old and new body), and deleted rows are re-inserted under their old seq,
+  i.e. at their old positions, even if examples were added in between.
+"""
+import re
+from collections import deque
+
+from builder_utils import _validate_inputs_template
+from dataset_store import DatasetLRU
+from import_utils import FIELD_SECTIONS
+from persistent_seq import PersistentSeq
+
+EDITABLE_FIELDS = ("question", "thought", "code", "answer", "apis", "global_apis", "system")
+DEFAULT_REPLACE_FIELDS = ("question", "thought", "code", "answer")
+MAX_UNDO = 50
+_JSON_ESCAPED = re.compile(r'["\\\x00-\x1f]')
+
+
+# ---------- Helpers ----------
+def parse_positions(text, total):
+    """
+    0-based sorted positions from 1-based example numbers and ranges,
+    e.g. "3, 7, 10-20". Raises ValueError for malformed or out-of-range parts.
+    """
+    positions = set()
+    for part in (text or "").replace(";", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        lo, sep, hi = part.partition("-")
+        try:
+            a = int(lo)
+            b = int(hi) if sep else a
+        except ValueError:
+            raise ValueError(f"Not an example number or range: {part!r}") from None
+        if a > b:
+            a, b = b, a
+        if a < 1 or b > total:
+            raise ValueError(f"{part} is outside 1–{total}")
+        positions.update(range(a - 1, b))
+    return sorted(positions)
+
+def _check_record(rec):
+    """(ok, message) under the rules the add path enforces (System is required)."""
+    return _validate_inputs_template(
+        rec.get("meta"), rec.get("system"), rec.get("global_apis"), rec.get("apis"),
+        rec.get("question"), rec.get("code"), rec.get("answer"),
+    )
+
+def _check_edit(old, new):
+    """Raise ValueError when an edit makes a valid record invalid (older invalid records stay editable)."""
+    ok, msg = _check_record(new)
+    if not ok and _check_record(old)[0]:
+        raise ValueError(msg)
+
+def _check_field(rec, field):
+    """Raise ValueError unless `field` is one the record's template stores (records without meta allow all)."""
+    if field not in EDITABLE_FIELDS:
+        raise ValueError(f"Field cannot be edited: {field}")
+    meta = rec.get("meta")
+    if field == "system" or not isinstance(meta, dict) or "included_sections" not in meta:
+        return
+    scope = meta.get("apis_scope", "per")
+    if field == "global_apis":
+        ok = scope == "global"
+    else:
+        ok = FIELD_SECTIONS[field] in meta["included_sections"] and not (field == "apis" and scope == "global")
+    if not ok:
+        raise ValueError(f"Field {field} is not part of this example's template")
+
+def edit_record(rec, changes):
+    """Copy of `rec` with {field: text} applied; empty text removes the field, as the add path leaves it out."""
+    out = dict(rec)
+    for field, value in changes.items():
+        _check_field(rec, field)
+        if (value or "").strip():
+            out[field] = value
+        else:
+            out.pop(field, None)
+    _check_edit(rec, out)
+    return out
+
+def compile_find(find, regex=False, case=True):
+    if not find:
+        raise ValueError("Nothing to find.")
+    return re.compile(find if regex else re.escape(find), 0 if case else re.IGNORECASE)
+
+def replace_in_record(rec, pattern, repl, fields=DEFAULT_REPLACE_FIELDS, regex=False):
+    """(new record, replacements), or (None, 0) when no field changed. Raises ValueError like edit_record."""
+    if not regex:
+        literal = repl
+        repl = lambda m: literal      # no backslash / group handling for plain text
+    out, total = None, 0
+    for field in fields:
+        value = rec.get(field)
+        if not isinstance(value, str):
+            continue
+        new, n = pattern.subn(repl, value)
+        if new != value:
+            if out is None:
+                out = dict(rec)
+            out[field] = new
+            total += n
+    if out is not None:
+        _check_edit(rec, out)
+    return out, total
+
+def _body_filter(find, regex, case, fields):
+    """Cheap test on a row's stored JSON that rules out rows without a match, or None."""
+    pooled = {"system", "apis", "global_apis"}
+    if regex or not case or pooled & set(fields) or _JSON_ESCAPED.search(find):
+        return None
+    return lambda body: find in body
+
+def _plural(n, word):
+    return f"{n} {word}" + ("" if n == 1 else "s")
+
+
+class _History:
+    """Undo / redo stacks of (label, step); subclasses say what a step is."""
+
+    def __init__(self, max_steps=MAX_UNDO):
+        self._undo = deque(maxlen=max_steps)
+        self._redo = []
+
+    @property
+    def can_undo(self):
+        return bool(self._undo)
+
+    @property
+    def can_redo(self):
+        return bool(self._redo)
+
+    def _push(self, label, step):
+        self._undo.append((label, step))
+        self._redo.clear()
+
+    def undo(self):
+        """Revert the last step; returns its label, or None when there is nothing to undo."""
+        if not self._undo:
+            return None
+        label, step = self._undo.pop()
+        self._redo.append((label, self._revert(step)))
+        return label
+
+    def redo(self):
+        if not self._redo:
+            return None
+        label, step = self._redo.pop()
+        self._undo.append((label, self._revert(step)))
+        return label
+
+    def describe(self):
+        parts = []
+        if self._undo:
+            parts.append(f"undo: {self._undo[-1][0]}")
+        if self._redo:
+            parts.append(f"redo: {self._redo[-1][0]}")
+        return "; ".join(parts) or "No edits to undo."
+
+
+# ---------- In memory ----------
+class EditHistory(_History):
+    """Versions of an in-memory dataset; `records` is the current version (a PersistentSeq)."""
+
+    def __init__(self, records=(), max_steps=MAX_UNDO):
+        super().__init__(max_steps)
+        self.records = records if isinstance(records, PersistentSeq) else PersistentSeq(records)
+
+    def _commit(self, label, records):
+        self._push(label, self.records)
+        self.records = records
+
+    def _revert(self, previous):
+        current, self.records = self.records, previous
+        return current
+
+    def delete(self, positions):
+        before = len(self.records)
+        records = self.records.delete(positions)
+        n = before - len(records)
+        if n:
+            self._commit(f"delete {_plural(n, 'example')}", records)
+        return n
+
+    def delete_range(self, start, stop):
+        before = len(self.records)
+        records = self.records.delete_range(start, stop)
+        n = before - len(records)
+        if n:
+            self._commit(f"delete #{start + 1}–#{start + n}", records)
+        return n
+
+    def edit(self, position, changes):
+        rec = self.records[position]
+        new = edit_record(rec, changes)
+        if new == rec:
+            return False
+        self._commit(f"edit #{position % len(self.records) + 1}", self.records.set(position, new))
+        return True
+
+    def replace(self, find, repl, fields=DEFAULT_REPLACE_FIELDS, regex=False, case=True):
+        """Replace in every record; returns (records changed, replacements)."""
+        pattern = compile_find(find, regex, case)
+        updates, total = {}, 0
+        for i, rec in enumerate(self.records):
+            try:
+                new, n = replace_in_record(rec, pattern, repl, fields, regex)
+            except ValueError as e:
+                raise ValueError(f"{e} (example #{i + 1}); nothing was replaced.") from None
+            if new is not None:
+                updates[i] = new
+                total += n
+        if updates:
+            self._commit(f"replace {find!r} in {_plural(len(updates), 'example')}", self.records.update(updates))
+        return len(updates), total
+
+
+# ---------- SQLite ----------
+class SqliteEditHistory(_History):
+    """Edits of a SqliteDataset; steps hold only the changed rows as (seq, body, cells)."""
+
+    def __init__(self, dataset, max_steps=MAX_UNDO):
+        super().__init__(max_steps)
+        self.dataset = dataset
+
+    # A step is ("deleted", rows), ("restored", rows) or ("updated", old rows, new rows);
+    # reverting one returns the step that re-applies it.
+    def _revert(self, step):
+        ds = self.dataset
+        if step[0] == "deleted":
+            ds.restore_rows(step[1])
+            return ("restored", step[1])
+        if step[0] == "restored":
+            ds.delete_seqs([row[0] for row in step[1]])
+            return ("deleted", step[1])
+        _, old, new = step
+        ds.update_rows(old)
+        return ("updated", new, old)
+
+    def _delete_seqs(self, seqs, label):
+        if not seqs:
+            return 0
+        rows = self.dataset.rows_by_seq(seqs)
+        self.dataset.delete_seqs(seqs)
+        self._push(label(len(rows)), ("deleted", rows))
+        return len(rows)
+
+    def delete(self, positions):
+        return self._delete_seqs(self.dataset.seqs_at(positions), lambda n: f"delete {_plural(n, 'example')}")
+
+    def delete_range(self, start, stop):
+        return self._delete_seqs(self.dataset.seqs(start, stop), lambda n: f"delete #{start + 1}–#{start + n}")
+
+    def _update(self, label, old_rows, new_items):
+        new_rows = self.dataset.encode_rows(new_items)
+        self.dataset.update_rows(new_rows)
+        self._push(label, ("updated", old_rows, new_rows))
+
+    def edit(self, position, changes):
+        ds = self.dataset
+        seqs = ds.seqs_at([position])
+        old = ds.rows_by_seq(seqs)
+        rec = ds.decode(old[0][1])
+        new = edit_record(rec, changes)
+        if new == rec:
+            return False
+        self._update(f"edit #{position + 1}", old, [(seqs[0], new)])
+        return True
+
+    def replace(self, find, repl, fields=DEFAULT_REPLACE_FIELDS, regex=False, case=True, progress=None):
+        """Replace in every record; returns (records changed, replacements). `progress(done, total)` per chunk."""
+        ds = self.dataset
+        pattern = compile_find(find, regex, case)
+        quick = _body_filter(find, regex, case, fields)
+        old, new, total = [], [], 0
+        n_rows = len(ds) if progress is not None else None
+        for done, row in enumerate(ds.iter_rows(), start=1):
+            if quick is None or quick(row[1]):
+                try:
+                    rec, n = replace_in_record(ds.decode(row[1]), pattern, repl, fields, regex)
+                except ValueError as e:
+                    raise ValueError(f"{e} (example #{done}); nothing was replaced.") from None
+                if rec is not None:
+                    old.append(row)
+                    new.append((row[0], rec))
+                    total += n
+            if progress is not None and done % 1000 == 0:
+                progress(done, n_rows)
+        if new:
+            self._update(f"replace {find!r} in {_plural(len(new), 'example')}", old, new)
+        return len(new), total
+
+
+# ---------- Per-dataset histories ----------
+_HISTORIES = DatasetLRU()
+
+def history_for_dataset(ds):
+    """The undo history of a SqliteDataset (one per recently used dataset id; an evicted one starts empty)."""
+    return _HISTORIES.get_or_create(ds.id, lambda: SqliteEditHistory(ds))
+
+def drop_history(dataset_id):
+    _HISTORIES.pop(dataset_id)
@@ -0,0 +1,125 @@
+# export_jobs.py
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import METRICS
+
+# ---------- Jobs ----------
+# Exports run on a small shared thread pool instead of the request handler, so
+# one large export does not hold up other users of the same instance. A job
+# reports progress through the `progress(done, total)` callback the writers in
+# builder_utils already accept; cancelling makes that callback raise, and the
+# writers then remove the partly written file.
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+EXPORT_WORKERS = 2
+KEEP_FINISHED = 100
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+class ExportJob:
+    __slots__ = ("id", "label", "status", "done", "total", "path", "message", "started", "finished", "_cancel")
+
+    def __init__(self, job_id, label):
+        self.id = job_id
+        self.label = label
+        self.status = QUEUED
+        self.done = 0
+        self.total = None
+        self.path = None
+        self.message = ""
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+
+    def progress(self, done, total=None):
+        if self._cancel.is_set():
+            raise ExportCancelled()
+        self.done = done
+        self.total = total
+
+    def cancel(self):
+        self._cancel.set()
+
+    def describe(self):
+        """One-line status for the UI."""
+        if self.status == QUEUED:
+            return f"⏳ {self.label}: queued…"
+        if self.status == RUNNING:
+            pct = f" ({self.done / self.total:.0%})" if self.total else ""
+            rate = ""
+            elapsed = time.monotonic() - self.started
+            if self.done and elapsed > 0:
+                rate = f", {self.done / elapsed:,.0f} records/s"
+            return f"⏳ {self.label}: {self.done} of {self.total if self.total is not None else '?'} records{pct}{rate}"
+        if self.status == CANCELLED:
+            return f"✖️ {self.label}: cancelled after {self.done} records."
+        return self.message
+
+
+class ExportJobManager:
+    """Run export functions in the background and track them by job id."""
+
+    def __init__(self, max_workers=EXPORT_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="export")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, label, fn, *args, **kwargs):
+        """
+        Start `fn(*args, progress=job.progress, **kwargs)`, which must return
+        (path, message) like the export_* functions. Returns the job.
+        """
+        with self._lock:
+            job = ExportJob(uuid.uuid4().hex, label)
+            self._jobs[job.id] = job
+            self._prune()
+        self._pool.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        if job._cancel.is_set():
+            job.status = CANCELLED
+            job.finished = time.monotonic()
+            return
+        job.status = RUNNING
+        job.started = time.monotonic()
+        try:
+            job.path, job.message = fn(*args, progress=job.progress, **kwargs)
+            job.status = DONE
+            METRICS.export_finished(job.label, job.done, time.monotonic() - job.started)
+        except ExportCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            job.message = f"⚠️ {job.label} failed: {e}"
+            job.status = FAILED
+        job.finished = time.monotonic()
+
+    def get(self, job_id):
+        return self._jobs.get(job_id) if job_id else None
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None and job.status not in FINISHED:
+            job.cancel()
+            return True
+        return False
+
+    def counts(self):
+        """{status: number of tracked jobs}."""
+        with self._lock:
+            return Counter(job.status for job in self._jobs.values())
+
+    def _prune(self):
+        finished = [j for j in self._jobs.values() if j.status in FINISHED]
+        for job in finished[:max(0, len(finished) - KEEP_FINISHED)]:
+            del self._jobs[job.id]
+
+
+EXPORT_JOBS = ExportJobManager()
@@ -0,0 +1,321 @@
+# import_utils.py
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from builder_utils import (
+    DEFAULT_TEMPLATE,
+    POOL_TABLE_KEY,
+    POOLED_FIELDS,
+    SHARED_POOL,
+    expand_record,
+    intern_record,
+)
+from incremental_export import has_tombstones, iter_live_lines
+
+# Record key <-> template section name
+FIELD_SECTIONS = {
+    "apis": "APIs",
+    "question": "Question",
+    "thought": "Thought",
+    "code": "Code",
+    "answer": "Answer",
+}
+_TEXT_FIELDS = ("system", "global_apis", "apis", "question", "thought", "code", "answer")
+_OPTIONAL_FIELDS = ("question", "thought", "code")
+
+PARALLEL_MIN_BYTES = 32 << 20     # files smaller than this are parsed in-process
+CHUNK_BYTES = 8 << 20
+IMPORT_BATCH_SIZE = 2000
+MAX_REPORTED_ERRORS = 20
+
+
+# ---------- Normalization ----------
+def _clean_meta(meta, rec):
+    """Meta as to_json_record_with_template writes it; derived from the fields when missing."""
+    if isinstance(meta, dict):
+        included = meta.get("included_sections")
+        if not isinstance(included, list):
+            raise ValueError("'meta.included_sections' must be a list")
+        return {
+            "included_sections": [str(s) for s in included],
+            "apis_scope": meta.get("apis_scope", "global" if "global_apis" in rec else "per"),
+            "show_system_in_preview": bool(meta.get("show_system_in_preview", True)),
+            "show_global_apis_in_preview": bool(meta.get("show_global_apis_in_preview", True)),
+        }
+    if meta is not None:
+        raise ValueError("'meta' must be an object")
+    included = [section for field, section in FIELD_SECTIONS.items() if field in rec]
+    if "global_apis" in rec:
+        included.insert(0, "APIs")
+    return {
+        "included_sections": included,
+        "apis_scope": "global" if "global_apis" in rec else "per",
+        "show_system_in_preview": DEFAULT_TEMPLATE["show_system_in_preview"],
+        "show_global_apis_in_preview": DEFAULT_TEMPLATE["show_global_apis_in_preview"],
+    }
+
+def normalize_record(obj, default_system=None):
+    """
+    Validate one imported record and return it in the shape produced by
+    to_json_record_with_template (same keys, same key order). Raises ValueError.
+    `default_system` fills in 'system' for exports written without it.
+    """
+    if not isinstance(obj, dict):
+        raise ValueError("record must be a JSON object")
+    for field in _TEXT_FIELDS:
+        v = obj.get(field)
+        if v is not None and not isinstance(v, str):
+            raise ValueError(f"'{field}' must be a string")
+    system = obj.get("system")
+    if system is None:
+        system = default_system
+    if not (system or "").strip():
+        raise ValueError("missing 'system'")
+
+    meta = _clean_meta(obj.get("meta"), obj)
+    rec = {"meta": meta, "system": system}
+    if meta["apis_scope"] == "global" and (obj.get("global_apis") or "").strip():
+        rec["global_apis"] = obj["global_apis"]
+    elif (obj.get("apis") or "").strip():
+        rec["apis"] = obj["apis"]
+    for field in _OPTIONAL_FIELDS:
+        if (obj.get(field) or "").strip():
+            rec[field] = obj[field]
+    if "answer" in obj and obj["answer"] is not None:
+        rec["answer"] = obj["answer"]
+    return intern_record(rec)
+
+def records_from_object(obj):
+    """Records from the single-object export: {system, apis?, example: [...]}."""
+    if not isinstance(obj, dict) or not isinstance(obj.get("example"), list):
+        raise ValueError("expected an object with an 'example' list")
+    system = obj.get("system")
+    global_apis = obj.get("apis")
+    records, errors = [], []
+    for i, ex in enumerate(obj["example"], start=1):
+        try:
+            if not isinstance(ex, dict):
+                raise ValueError("example must be a JSON object")
+            rec = {k: v for k, v in ex.items() if k in FIELD_SECTIONS}
+            if global_apis is not None:
+                rec.pop("apis", None)
+                rec["global_apis"] = global_apis
+            rec["system"] = system
+            records.append(normalize_record(rec))
+        except ValueError as e:
+            errors.append((i, str(e)))
+    return records, errors
+
+
+# ---------- JSONL parsing ----------
+def _parse_lines(lines, first_line_no, default_system):
+    """
+    Parse JSONL lines. Returns (entries, items, errors): string-table entries,
+    [(line_no, record, is_raw)] and [(line_no, message)]. Records that still
+    carry pooled refs are returned raw and resolved once all tables are known.
+    """
+    entries, items, errors = {}, [], []
+    for n, line in enumerate(lines, start=first_line_no):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = json.loads(line)
+        except ValueError as e:
+            errors.append((n, f"invalid JSON: {e}"))
+            continue
+        if isinstance(obj, dict) and len(obj) == 1 and POOL_TABLE_KEY in obj:
+            entries.update(obj[POOL_TABLE_KEY])
+            continue
+        if isinstance(obj, dict) and any(f + "_ref" in obj for f in POOLED_FIELDS):
+            items.append((n, obj, True))
+            continue
+        try:
+            items.append((n, normalize_record(obj, default_system), False))
+        except ValueError as e:
+            errors.append((n, str(e)))
+    return entries, items, errors
+
+def _parse_chunk(path, start, end, default_system):
+    # Worker entry point: lines are counted locally and offset by the caller.
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    lines = data.decode("utf-8").split("\n")
+    return _parse_lines(lines, 1, default_system) + (len(lines),)
+
+def _chunk_bounds(path, chunk_bytes):
+    """Byte ranges of roughly chunk_bytes, each ending on a newline."""
+    size = os.path.getsize(path)
+    bounds = []
+    with open(path, "rb") as f:
+        start = 0
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()
+            end = min(f.tell(), size)
+            bounds.append((start, end))
+            start = end
+    return bounds
+
+def _resolve(items, table, default_system):
+    records, errors = [], []
+    for n, item, is_raw in items:
+        if not is_raw:
+            # re-intern: records parsed in a worker process arrive with their own string copies
+            records.append(intern_record(item))
+            continue
+        try:
+            records.append(normalize_record(expand_record(item, table), default_system))
+        except KeyError as e:
+            errors.append((n, f"unknown string reference {e}"))
+        except ValueError as e:
+            errors.append((n, str(e)))
+    return records, errors
+
+def iter_jsonl_import(path, default_system=None, workers=None, chunk_bytes=CHUNK_BYTES):
+    """
+    Stream a JSONL export (plain or pooled) as batches of (records, errors).
+    Files above PARALLEL_MIN_BYTES are split on line boundaries and parsed on a
+    process pool; batches still come out in file order, and at most 2 x workers
+    chunks are in flight, so memory does not grow with the file.
+    """
+    table = {}
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or os.path.getsize(path) < PARALLEL_MIN_BYTES:
+        with open(path, "r", encoding="utf-8") as f:
+            batch, line_no = [], 1
+            for line in f:
+                batch.append(line)
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    yield _finish_batch(_parse_lines(batch, line_no, default_system), table, default_system)
+                    line_no += len(batch)
+                    batch = []
+            if batch:
+                yield _finish_batch(_parse_lines(batch, line_no, default_system), table, default_system)
+        return
+
+    bounds = iter(_chunk_bounds(path, chunk_bytes))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        queue = deque()
+        line_no = 1
+        while True:
+            for s, e in bounds:
+                queue.append(pool.submit(_parse_chunk, path, s, e, default_system))
+                if len(queue) >= 2 * workers:
+                    break
+            if not queue:
+                return
+            entries, items, errors, n_lines = queue.popleft().result()
+            items = [(n + line_no - 1, item, is_raw) for n, item, is_raw in items]
+            errors = [(n + line_no - 1, msg) for n, msg in errors]
+            yield _finish_batch((entries, items, errors), table, default_system)
+            # a chunk ends with "\n", so split() yields one trailing empty piece
+            line_no += n_lines - 1
+
+def _finish_batch(parsed, table, default_system):
+    entries, items, errors = parsed
+    for key, text in entries.items():
+        table[key] = SHARED_POOL.add(key, text)
+    records, more_errors = _resolve(items, table, default_system)
+    return records, sorted(errors + more_errors)
+
+
+def _iter_incremental_import(path, default_system=None):
+    """Incremental exports: live records only (line numbers count live records)."""
+    table = {}
+    batch, line_no = [], 1
+    for line in iter_live_lines(path):
+        batch.append(line)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            yield _finish_batch(_parse_lines(batch, line_no, default_system), table, default_system)
+            line_no += len(batch)
+            batch = []
+    if batch:
+        yield _finish_batch(_parse_lines(batch, line_no, default_system), table, default_system)
+
+
+# ---------- Entry points ----------
+def _is_jsonl(path):
+    """
+    JSONL unless the file is the single-object export: a .json file, or one
+    whose text opens with '[' or with a '{' alone on its line (indented JSON),
+    or whose one line is an object with an 'example' list. A malformed first
+    line does not change the format; it is reported as a row error.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".jsonl":
+        return True
+    if ext == ".json":
+        return False
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line[0] == "[" or line == "{":
+                return False
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                return True
+            return not (isinstance(obj, dict) and isinstance(obj.get("example"), list))
+    return True
+
+def iter_import_batches(path, default_system=None, workers=None):
+    """Yield (records, errors) batches from a JSONL or single-object JSON file."""
+    if _is_jsonl(path):
+        if has_tombstones(path):
+            yield from _iter_incremental_import(path, default_system)
+        else:
+            yield from iter_jsonl_import(path, default_system, workers)
+        return
+    # The object format carries system/apis at the top level (the exporter writes
+    # 'apis' after 'example'), so it is loaded whole.
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            obj = json.load(f)
+        batch = records_from_object(obj)
+    except json.JSONDecodeError as e:
+        yield [], [(e.lineno, f"invalid JSON: {e}")]
+        return
+    except ValueError as e:
+        yield [], [(1, str(e))]
+        return
+    yield batch
+
+def load_records(path, default_system=None, workers=None):
+    """Read a whole file; returns (records, errors)."""
+    records, errors = [], []
+    for batch, errs in iter_import_batches(path, default_system, workers):
+        records.extend(batch)
+        errors.extend(errs)
+    return records, errors
+
+def import_into(dataset, path, default_system=None, workers=None, progress=None, on_batch=None):
+    """
+    Append every valid record of `path` to `dataset` (list, Dataset or
+    SqliteDataset), batch by batch. Returns (n_imported, errors).
+    `on_batch(records)` is called before each batch is appended.
+    """
+    n, errors = 0, []
+    for batch, errs in iter_import_batches(path, default_system, workers):
+        if batch:
+            if on_batch is not None:
+                on_batch(batch)
+            dataset.extend(batch)
+            n += len(batch)
+        errors.extend(errs)
+        if progress is not None:
+            progress(n, None)
+    return n, errors
+
+def format_import_status(n, errors, path):
+    msg = f"📥 Imported {n} records from {os.path.basename(path)}."
+    if errors:
+        shown = "\n".join(f"  #{line}: {err}" for line, err in errors[:MAX_REPORTED_ERRORS])
+        more = f"\n  … and {len(errors) - MAX_REPORTED_ERRORS} more" if len(errors) > MAX_REPORTED_ERRORS else ""
+        msg += f"\n⚠️ Skipped {len(errors)} invalid records:\n{shown}{more}"
+    return msg
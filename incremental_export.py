@@ -0,0 +1,226 @@
+# incremental_export.py
+"""
+Append-only JSONL exports that only write what changed since the last export.
+
+The target file is ordinary JSONL plus tombstone lines {"__deleted__": <hash>}.
+A tombstone removes the earliest live record line with that line hash (sha1
+of the line, 16 hex chars), so identical records are counted, not merged.
+A sidecar checkpoint (<file>.checkpoint.json) holds the live records in file
+order as content key + line hash pairs. The next export computes content keys
+for the dataset (cheap: repeated System/APIs texts go by their pooled ref, and
+nothing is JSON-encoded), appends tombstones for records that are gone and
+encodes only the records that are new. compact() rewrites the file without
+dead lines.
+
+Exports and compactions of one file are serialized (see _path_lock): two jobs
+for the same dataset would otherwise both read the same checkpoint and append
+the same records.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import Counter
+
+from builder_utils import POOLED_FIELDS, SHARED_POOL, _encode_json
+from dataset_store import valid_dataset_id
+
+FORMAT = "fewshot-incremental-v1"
+KEY_BATCH = 1000
+TOMBSTONE_KEY = "__deleted__"
+CHECKPOINT_SUFFIX = ".checkpoint.json"
+COMPACT_RATIO = 0.5       # compact once dead lines outnumber this share of all lines
+_WRITE_BUFFER = 1 << 20
+_ENTRY = 32               # checkpoint entry: content key + line hash, 16 hex chars each
+_LOCK_STRIPES = 64
+_PATH_LOCKS = [threading.RLock() for _ in range(_LOCK_STRIPES)]
+
+
+def line_hash(line):
+    return hashlib.sha1(line.encode("utf-8")).hexdigest()[:16]
+
+def content_key(record, ref=SHARED_POOL.ref):
+    """Stable hash of a record's content, without encoding it as JSON."""
+    parts = []
+    for k, v in record.items():
+        if k in POOLED_FIELDS and isinstance(v, str):
+            v = ref(v)
+        elif not isinstance(v, str):
+            v = repr(v)     # meta: plain str/bool/list values, so repr is stable
+        parts.append(k)
+        parts.append(v)
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()[:16]
+
+def _line(record, duplicate_system):
+    if not duplicate_system and "system" in record:
+        record = {k: v for k, v in record.items() if k != "system"}
+    return _encode_json(record)
+
+def checkpoint_path(path):
+    return path + CHECKPOINT_SUFFIX
+
+def _tombstone(h):
+    return _encode_json({TOMBSTONE_KEY: h})
+
+def _path_lock(path):
+    """Lock for one target file (a fixed set of stripes, so nothing accumulates per path)."""
+    return _PATH_LOCKS[hash(os.path.abspath(path)) % _LOCK_STRIPES]
+
+def _is_tombstone(line):
+    # Cheap prefix test first: record lines start with {"meta" / {"system"
+    return line.startswith('{"' + TOMBSTONE_KEY)
+
+
+# ---------- Checkpoints ----------
+def load_checkpoint(path):
+    """Checkpoint for `path`, or None when missing or out of date with the file."""
+    try:
+        with open(checkpoint_path(path), "r", encoding="utf-8") as f:
+            cp = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cp.get("format") != FORMAT or not os.path.exists(path) or os.path.getsize(path) != cp.get("size"):
+        return None
+    live = cp["live"]
+    cp["live"] = [live[i:i + _ENTRY] for i in range(0, len(live), _ENTRY)]
+    return cp
+
+def _save_checkpoint(path, live, dead, duplicate_system):
+    cp = {
+        "format": FORMAT,
+        "size": os.path.getsize(path),
+        "duplicate_system": duplicate_system,
+        "dead": dead,
+        "live": "".join(live),     # one string of fixed-width entries loads much faster than a list
+    }
+    tmp = checkpoint_path(path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(_encode_json(cp))
+    os.replace(tmp, checkpoint_path(path))
+    return cp
+
+
+# ---------- Export ----------
+def export_incremental(records, path, duplicate_system=True, progress=None, total=None, compact_ratio=COMPACT_RATIO):
+    """
+    Bring `path` in line with `records`: append new records and tombstones for
+    removed ones. Without a valid checkpoint (first export, file edited, other
+    options) the file is rewritten in full. Returns (n_added, n_deleted, n_live).
+    `progress(done, total)` is called while the dataset is compared.
+    A second export of the same file waits until the first has finished.
+    """
+    if total is None and hasattr(records, "__len__"):
+        total = len(records)
+    with _path_lock(path):
+        return _export_incremental(records, path, duplicate_system, progress, total, compact_ratio)
+
+def _export_incremental(records, path, duplicate_system, progress, total, compact_ratio):
+    cp = load_checkpoint(path)
+    if cp is not None and cp.get("duplicate_system") != duplicate_system:
+        cp = None
+    old = cp["live"] if cp is not None else []     # [content key + line hash]
+    remaining = Counter(entry[:16] for entry in old)
+    added, added_live, done = [], [], 0
+    for rec in records:
+        key = content_key(rec)
+        if remaining[key] > 0:
+            remaining[key] -= 1
+        else:
+            line = _line(rec, duplicate_system)
+            added.append(line)
+            added_live.append(key + line_hash(line))
+        done += 1
+        if progress is not None and done % KEY_BATCH == 0:
+            progress(done, total)
+    if progress is not None:
+        progress(done, total)
+    deleted = +remaining
+
+    # Tombstones hit the earliest live occurrence, as readers apply them
+    live, tomb_lines = [], []
+    for entry in old:
+        key = entry[:16]
+        if deleted[key] > 0:
+            deleted[key] -= 1
+            tomb_lines.append(_tombstone(entry[16:]))
+        else:
+            live.append(entry)
+    live.extend(added_live)
+    with open(path, "a" if cp is not None else "w", encoding="utf-8", buffering=_WRITE_BUFFER) as f:
+        if tomb_lines:
+            f.write("\n".join(tomb_lines) + "\n")
+        if added:
+            f.write("\n".join(added) + "\n")
+
+    dead = (cp["dead"] if cp is not None else 0) + 2 * len(tomb_lines)
+    _save_checkpoint(path, live, dead, duplicate_system)
+    if dead and dead >= compact_ratio * (dead + len(live)):
+        _compact(path)
+    return len(added), len(tomb_lines), len(live)
+
+def compact(path):
+    """Rewrite `path` with live record lines only (same order); returns the number kept."""
+    with _path_lock(path):
+        return _compact(path)
+
+def _compact(path):
+    cp = load_checkpoint(path)
+    duplicate_system = cp["duplicate_system"] if cp is not None else True
+    tmp = path + ".compact.tmp"
+    live = []
+    with open(tmp, "w", encoding="utf-8", buffering=_WRITE_BUFFER) as out:
+        for line in iter_live_lines(path):
+            out.write(line + "\n")
+            if cp is None:
+                live.append(content_key(json.loads(line)) + line_hash(line))
+    if cp is not None:
+        # Dead lines are exactly the tombstoned ones, so the live list is unchanged
+        live = cp["live"]
+    os.replace(tmp, path)
+    _save_checkpoint(path, live, 0, duplicate_system)
+    return len(live)
+
+
+# ---------- Reading ----------
+def has_tombstones(path):
+    """Quick byte scan for tombstone lines."""
+    needle = b'{"' + TOMBSTONE_KEY.encode() + b'"'
+    tail = b""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(1 << 22)
+            if not chunk:
+                return False
+            if needle in tail + chunk:
+                return True
+            tail = chunk[-len(needle):]
+
+def iter_live_lines(path):
+    """Record lines of an incremental export with tombstones applied (two passes, memory ~ tombstones)."""
+    dropped = Counter()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and _is_tombstone(line):
+                dropped[json.loads(line)[TOMBSTONE_KEY]] += 1
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or _is_tombstone(line):
+                continue
+            if dropped:
+                h = line_hash(line)
+                if dropped[h] > 0:
+                    dropped[h] -= 1
+                    continue
+            yield line
+
+def export_incremental_for_dataset(state, dataset_id, duplicate_system=True, progress=None):
+    """UI wrapper: one fixed target file per dataset; returns (path, status message)."""
+    if not valid_dataset_id(dataset_id):
+        raise ValueError("Invalid dataset id.")      # it names the file: no paths from the client
+    if not state:
+        return None, "No examples to export yet."
+    path = f"./fewshot_{dataset_id}.jsonl"
+    added, deleted, live = export_incremental(state, path, duplicate_system, progress)
+    return path, f"📦 Incremental export: +{added} records, {deleted} tombstones, {live} live → {path}"
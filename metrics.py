@@ -0,0 +1,291 @@
+# metrics.py
+"""
+Opt-in instrumentation for a shared instance (FEWSHOT_METRICS=1).
+
+Event handlers wrapped with `handler(name)` record their latency and the
+(approximate JSON) size of what they send back to the browser; builder_utils
+operations wrapped with `timed(fn)` record their latency; export jobs record
+their throughput. `render_text()` is the Prometheus text format served at
+/metrics, `summary_rows()` feeds the Diagnostics tab. With metrics off the
+decorators return the function unchanged, so there is no per-call cost.
+
+SamplingProfiler samples every thread's stack from a background thread and
+reports collapsed stacks (flamegraph.pl / speedscope input). It can be started
+from the Diagnostics tab, or for the whole process with FEWSHOT_PROFILE=<file>.
+"""
+import atexit
+import functools
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+ENABLED = os.environ.get("FEWSHOT_METRICS", "").lower() in ("1", "true", "yes", "on")
+PROFILE_PATH = os.environ.get("FEWSHOT_PROFILE", "")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = tuple(256 * 4 ** i for i in range(10))                  # 256 B … 64 MiB
+THROUGHPUT_BUCKETS = (100, 1000, 5000, 10000, 25000, 50000, 100000, 250000, 500000, 1000000)
+PROFILE_INTERVAL = 0.005
+
+LATENCY = "fewshot_latency_seconds"
+PAYLOAD = "fewshot_response_bytes"
+ERRORS = "fewshot_errors_total"
+EXPORT_SECONDS = "fewshot_export_seconds"
+EXPORT_THROUGHPUT = "fewshot_export_records_per_second"
+
+_HELP = {
+    LATENCY: ("Latency of event handlers (kind=handler) and builder_utils operations (kind=op).", LATENCY_BUCKETS),
+    PAYLOAD: ("Approximate JSON size of handler responses sent to the browser.", SIZE_BUCKETS),
+    EXPORT_SECONDS: ("Wall time of finished export jobs.", LATENCY_BUCKETS),
+    EXPORT_THROUGHPUT: ("Records per second of finished export jobs.", THROUGHPUT_BUCKETS),
+}
+
+
+# ---------- Histograms ----------
+class Histogram:
+    """Fixed-bucket histogram; quantiles are bucket upper bounds (the max for the overflow bucket)."""
+    __slots__ = ("buckets", "counts", "count", "sum", "max")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+
+def payload_bytes(value):
+    """Rough size of `value` once JSON-encoded for the browser (strings count one byte per char)."""
+    if isinstance(value, str):
+        return len(value) + 2
+    if isinstance(value, (list, tuple)):
+        return sum(payload_bytes(v) for v in value) + len(value) + 1
+    if isinstance(value, dict):
+        return sum(len(str(k)) + 4 + payload_bytes(v) for k, v in value.items()) + 1
+    if value is None or isinstance(value, (bool, int, float)):
+        return 8
+    return 0        # components / gr.skip() updates carry no data
+
+
+def _format_labels(labels):
+    return ",".join(f'{k}="{v}"' for k, v in labels)
+
+
+# ---------- Registry ----------
+class Metrics:
+    def __init__(self, enabled=ENABLED):
+        self.enabled = enabled
+        self._hists = {}        # (name, ((label, value), ...)) -> Histogram
+        self._counters = Counter()
+        self._gauges = {}       # name -> (help, fn returning {label tuple: value})
+        self._lock = threading.Lock()
+
+    def observe(self, metric, value, **labels):
+        if not self.enabled:
+            return
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._hists.get(key)
+            if hist is None:
+                hist = self._hists[key] = Histogram(_HELP[metric][1])
+            hist.observe(value)
+
+    def count(self, metric, **labels):
+        if self.enabled:
+            with self._lock:
+                self._counters[(metric, tuple(sorted(labels.items())))] += 1
+
+    def gauge(self, name, help_text, fn):
+        """Register a gauge read at scrape time: fn() -> number or {((label, value), ...): number}."""
+        self._gauges[name] = (help_text, fn)
+
+    def timed(self, fn, kind="op", name=None):
+        if not self.enabled:
+            return fn
+        name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                self.count(ERRORS, kind=kind, name=name)
+                raise
+            finally:
+                self.observe(LATENCY, time.perf_counter() - t, kind=kind, name=name)
+        return wrapper
+
+    def handler(self, name):
+        """Decorator for event handlers: latency plus response size."""
+        def decorate(fn):
+            if not self.enabled:
+                return fn
+            timed = self.timed(fn, kind="handler", name=name)
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                result = timed(*args, **kwargs)
+                self.observe(PAYLOAD, payload_bytes(result), name=name)
+                return result
+            return wrapper
+        return decorate
+
+    def export_finished(self, label, records, seconds):
+        self.observe(EXPORT_SECONDS, seconds, label=label)
+        if records and seconds > 0:
+            self.observe(EXPORT_THROUGHPUT, records / seconds, label=label)
+
+    def reset(self):
+        with self._lock:
+            self._hists.clear()
+            self._counters.clear()
+
+    # ---------- Output ----------
+    def _snapshot(self):
+        with self._lock:
+            hists = sorted(
+                ((name, labels, h.buckets, list(h.counts), h.count, h.sum, h.max, h)
+                 for (name, labels), h in self._hists.items()),
+                key=lambda x: (x[0], x[1]),
+            )
+            counters = sorted(self._counters.items())
+        return hists, counters
+
+    def render_text(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        hists, counters = self._snapshot()
+        out, described = [], set()
+        for name, labels, buckets, counts, count, total, _, _ in hists:
+            if name not in described:
+                described.add(name)
+                out.append(f"# HELP {name} {_HELP[name][0]}")
+                out.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, n in zip(buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                out.append(f"{name}_bucket{{{_format_labels(labels + (('le', le),))}}} {cumulative}")
+            suffix = f"{{{_format_labels(labels)}}}" if labels else ""
+            out.append(f"{name}_sum{suffix} {total:.6g}")
+            out.append(f"{name}_count{suffix} {count}")
+        if counters:
+            out.append(f"# HELP {ERRORS} Handler / operation calls that raised.")
+            out.append(f"# TYPE {ERRORS} counter")
+            for (name, labels), n in counters:
+                out.append(f"{name}{{{_format_labels(labels)}}} {n}")
+        for name, (help_text, fn) in sorted(self._gauges.items()):
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} gauge")
+            value = fn()
+            items = value.items() if isinstance(value, dict) else [((), value)]
+            for labels, v in items:
+                suffix = f"{{{_format_labels(labels)}}}" if labels else ""
+                out.append(f"{name}{suffix} {v:.6g}")
+        return "\n".join(out) + "\n"
+
+    def summary_rows(self):
+        """[[metric, labels, count, p50, p95, p99, max, mean]] for the Diagnostics table."""
+        hists, _ = self._snapshot()
+        rows = []
+        for name, labels, _, _, count, total, mx, h in hists:
+            with self._lock:
+                p50, p95, p99 = h.quantile(0.5), h.quantile(0.95), h.quantile(0.99)
+            rows.append([
+                name, _format_labels(labels), count,
+                round(p50, 4), round(p95, 4), round(p99, 4), round(mx, 4), round(total / count, 4) if count else 0,
+            ])
+        return rows
+
+
+METRICS = Metrics()
+timed = METRICS.timed
+handler = METRICS.handler
+
+SUMMARY_COLUMNS = ["metric", "labels", "count", "p50", "p95", "p99", "max", "mean"]
+
+
+# ---------- Sampling profiler ----------
+class SamplingProfiler:
+    """Counts the stacks of all other threads every `interval` seconds."""
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.samples = 0
+        self._stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        """Start a new profile; samples from an earlier start/stop are discarded."""
+        if self._thread is None:
+            self.samples = 0
+            self._stacks = Counter()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        return self.collapsed()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(tid, str(tid)))
+                self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        """One `thread;outer;...;inner count` line per distinct stack."""
+        return "\n".join(f"{stack} {n}" for stack, n in self._stacks.most_common()) + "\n"
+
+
+def _profile_process(path):
+    profiler = SamplingProfiler().start()
+
+    def _write():
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(profiler.stop())
+    atexit.register(_write)
+    return profiler
+
+PROCESS_PROFILER = _profile_process(PROFILE_PATH) if PROFILE_PATH else None
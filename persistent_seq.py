@@ -0,0 +1,252 @@
+# persistent_seq.py
+"""
+Immutable sequence with structural sharing, for cheap undo history.
+
+Items live in leaves of up to LEAF items under nodes of up to BRANCH children
+(each node keeps the cumulative sizes of its children). Every "mutation"
+returns a new PersistentSeq that copies only the path to the touched leaves
+and shares everything else with the original: editing one record of 100k
+copies one 64-item leaf and ~3 small nodes, so keeping many versions costs
+roughly the changed records, not one full copy per version.
+
+    v1 = PersistentSeq(records)
+    v2 = v1.delete_range(10, 20).set(0, edited)    # v1 is unchanged
+"""
+from bisect import bisect_right
+from itertools import accumulate
+
+LEAF = 64
+BRANCH = 32
+
+
+class _Node:
+    __slots__ = ("children", "sizes")
+
+    def __init__(self, children, sizes=None):
+        self.children = children
+        self.sizes = sizes if sizes is not None else tuple(accumulate(_size(c) for c in children))
+
+
+def _size(node):
+    return node.sizes[-1] if type(node) is _Node else len(node)
+
+def _build(items):
+    """(root, height) for a list of items, with full leaves and nodes."""
+    level = [tuple(items[i:i + LEAF]) for i in range(0, len(items), LEAF)]
+    height = 0
+    while len(level) > 1:
+        level = [_Node(tuple(level[i:i + BRANCH])) for i in range(0, len(level), BRANCH)]
+        height += 1
+    return (level[0] if level else ()), height
+
+def _merge_small(children):
+    """Merge neighbouring children left under half full, so deletes do not leave a trail of tiny nodes."""
+    out = []
+    for child in children:
+        if out:
+            prev = out[-1]
+            if type(child) is _Node:
+                n_prev, n_child = len(prev.children), len(child.children)
+                if n_prev + n_child <= BRANCH and min(n_prev, n_child) < BRANCH // 2:
+                    out[-1] = _Node(prev.children + child.children)
+                    continue
+            elif len(prev) + len(child) <= LEAF and min(len(prev), len(child)) < LEAF // 2:
+                out[-1] = prev + child
+                continue
+        out.append(child)
+    return out
+
+def _delete(node, height, ranges):
+    """Copy of `node` without the sorted, disjoint, node-relative [start, stop) ranges."""
+    if height == 0:
+        out, last = [], 0
+        for start, stop in ranges:
+            out.extend(node[last:start])
+            last = stop
+        out.extend(node[last:])
+        return tuple(out)
+    children, r, start = [], 0, 0
+    for child, end in zip(node.children, node.sizes):
+        while r < len(ranges) and ranges[r][1] <= start:
+            r += 1
+        inner, j = [], r
+        while j < len(ranges) and ranges[j][0] < end:
+            a, b = ranges[j]
+            inner.append((max(a, start) - start, min(b, end) - start))
+            j += 1
+        if not inner:
+            children.append(child)
+        elif inner != [(0, end - start)]:
+            child = _delete(child, height - 1, inner)
+            if _size(child):
+                children.append(child)
+        start = end
+    return _Node(tuple(_merge_small(children)))
+
+def _set(node, height, updates):
+    """Copy of `node` with sorted node-relative (position, item) updates applied."""
+    if height == 0:
+        items = list(node)
+        for i, item in updates:
+            items[i] = item
+        return tuple(items)
+    children = list(node.children)
+    sizes = node.sizes
+    k = 0
+    while k < len(updates):
+        c = bisect_right(sizes, updates[k][0])
+        offset = sizes[c - 1] if c else 0
+        group = []
+        while k < len(updates) and updates[k][0] < sizes[c]:
+            group.append((updates[k][0] - offset, updates[k][1]))
+            k += 1
+        children[c] = _set(children[c], height - 1, group)
+    return _Node(tuple(children), sizes)
+
+def _replace_last(node, height, leaf):
+    if height == 0:
+        return leaf
+    child = _replace_last(node.children[-1], height - 1, leaf)
+    diff = _size(child) - _size(node.children[-1])
+    return _Node(node.children[:-1] + (child,), node.sizes[:-1] + (node.sizes[-1] + diff,))
+
+def _last_leaf(node, height):
+    for _ in range(height):
+        node = node.children[-1]
+    return node
+
+def _append_leaf(node, height, leaf):
+    """(node,) with `leaf` added as the rightmost leaf, or (node, new sibling) when full."""
+    if height == 1:
+        if len(node.children) < BRANCH:
+            return (_Node(node.children + (leaf,), node.sizes + (node.sizes[-1] + len(leaf),)),)
+        return node, _Node((leaf,))
+    res = _append_leaf(node.children[-1], height - 1, leaf)
+    total = node.sizes[-1] + len(leaf)
+    if len(res) == 1:
+        return (_Node(node.children[:-1] + res, node.sizes[:-1] + (total,)),)
+    sibling = res[1]        # res[0] is the last child, unchanged
+    if len(node.children) < BRANCH:
+        return (_Node(node.children + (sibling,), node.sizes + (total,)),)
+    return node, _Node((sibling,))
+
+
+class PersistentSeq:
+    """Immutable indexed sequence; set / delete / append return new versions sharing structure."""
+    __slots__ = ("_root", "_height", "_len")
+
+    def __init__(self, items=()):
+        items = list(items)
+        self._root, self._height = _build(items)
+        self._len = len(items)
+
+    @classmethod
+    def _make(cls, root, height):
+        out = cls.__new__(cls)
+        while height and len(root.children) == 1:
+            root, height = root.children[0], height - 1
+        if height and not root.children:
+            root, height = (), 0
+        out._root, out._height, out._len = root, height, _size(root)
+        return out
+
+    # ----- reading -----
+    def __len__(self):
+        return self._len
+
+    def _index(self, index):
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("PersistentSeq index out of range")
+        return index
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._len))]
+        i = self._index(index)
+        node = self._root
+        for _ in range(self._height):
+            c = bisect_right(node.sizes, i)
+            if c:
+                i -= node.sizes[c - 1]
+            node = node.children[c]
+        return node[i]
+
+    def __iter__(self):
+        if not self._height:
+            yield from self._root
+            return
+        stack = [iter(self._root.children)]
+        while stack:
+            child = next(stack[-1], None)
+            if child is None:
+                stack.pop()
+            elif len(stack) == self._height:
+                yield from child
+            else:
+                stack.append(iter(child.children))
+
+    def __repr__(self):
+        return f"PersistentSeq({self._len} items)"
+
+    def to_list(self):
+        return list(self)
+
+    # ----- new versions -----
+    def set(self, index, item):
+        return self.update({index: item})
+
+    def update(self, items):
+        """New version with {position: item} replaced."""
+        if not items:
+            return self
+        resolved = {self._index(i): item for i, item in items.items()}
+        updates = sorted(resolved.items(), key=lambda update: update[0])
+        return PersistentSeq._make(_set(self._root, self._height, updates), self._height)
+
+    def delete(self, positions):
+        """New version without the items at `positions` (any order, duplicates ignored)."""
+        ranges = []
+        for i in sorted({self._index(i) for i in positions}):
+            if ranges and ranges[-1][1] == i:
+                ranges[-1][1] = i + 1
+            else:
+                ranges.append([i, i + 1])
+        return self._delete_ranges([tuple(r) for r in ranges])
+
+    def delete_range(self, start, stop):
+        start, stop, _ = slice(start, stop).indices(self._len)
+        return self._delete_ranges([(start, stop)] if stop > start else [])
+
+    def _delete_ranges(self, ranges):
+        if not ranges:
+            return self
+        return PersistentSeq._make(_delete(self._root, self._height, ranges), self._height)
+
+    def append(self, item):
+        return self.extend((item,))
+
+    def extend(self, items):
+        items = list(items)
+        if not items:
+            return self
+        if not self._len:
+            return PersistentSeq(items)
+        root, height = self._root, self._height
+        last = _last_leaf(root, height)
+        room = LEAF - len(last)
+        if room > 0:
+            root = _replace_last(root, height, last + tuple(items[:room]))
+            items = items[room:]
+        for i in range(0, len(items), LEAF):
+            leaf = tuple(items[i:i + LEAF])
+            if height == 0:
+                root, height = _Node((root, leaf)), 1
+                continue
+            res = _append_leaf(root, height, leaf)
+            if len(res) == 1:
+                root = res[0]
+            else:
+                root, height = _Node(res), height + 1
+        return PersistentSeq._make(root, height)
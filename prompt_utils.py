@@ -0,0 +1,255 @@
+# prompt_utils.py
+import hashlib
+import re
+from bisect import bisect_right
+from collections import namedtuple
+from heapq import heappop, heapreplace
+from itertools import accumulate
+
+from builder_utils import compile_record_template, compile_template
+
+# ---------- Final prompt layout ----------
+# A full few-shot prompt is: System once, global APIs once, then every example
+# wrapped in <EXAMPLE> tags (rendered with its own template, minus the System /
+# global APIs blocks that now live in the prefix).
+EXAMPLE_OPEN = "<EXAMPLE>\n"
+EXAMPLE_CLOSE = "\n</EXAMPLE>\n\n"
+QUERY_OPEN = "<QUERY>\n"
+QUERY_CLOSE = "\n</QUERY>\n"
+
+def render_prefix(system, global_apis=None):
+    """System block plus the optional global APIs block, ending with a blank line."""
+    out = f"<SYSTEM>{(system or '').strip()}</SYSTEM>\n\n"
+    if (global_apis or "").strip():
+        out += f"<APIs>\n{global_apis.rstrip()}\n</APIs>\n\n"
+    return out
+
+def _example_template(meta):
+    meta = dict(meta or {})
+    meta["show_system_in_preview"] = False
+    meta["show_global_apis_in_preview"] = False
+    return compile_record_template(meta)
+
+def render_example(record):
+    """One record as an <EXAMPLE> block of the final prompt."""
+    return EXAMPLE_OPEN + _example_template(record.get("meta")).render(record) + EXAMPLE_CLOSE
+
+
+# ---------- Token estimation ----------
+# Any callable text -> int works as an estimator. The default needs no model
+# files: words are split into ~4-character pieces, punctuation counts as one.
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+def estimate_tokens(text):
+    n = 0
+    for piece in _TOKEN_RE.findall(text or ""):
+        n += 1 + (len(piece) - 1) // 4
+    return n
+
+def tiktoken_estimator(encoding="cl100k_base"):
+    """Estimator backed by tiktoken (optional dependency, used only if installed)."""
+    try:
+        import tiktoken
+    except ImportError as e:
+        raise ImportError("tiktoken is not installed; use estimate_tokens or pass your own callable.") from e
+    enc = tiktoken.get_encoding(encoding)
+    return lambda text: len(enc.encode(text or "", disallowed_special=()))
+
+class TokenCountCache:
+    """Token counts keyed by (estimator, text hash), shared across packers and budgets."""
+    __slots__ = ("estimator", "_counts", "hits", "misses")
+
+    def __init__(self, estimator=estimate_tokens):
+        self.estimator = estimator
+        self._counts = {}
+        self.hits = 0
+        self.misses = 0
+
+    def count(self, text):
+        key = hashlib.sha1(text.encode("utf-8")).digest()
+        n = self._counts.get(key)
+        if n is None:
+            n = self._counts[key] = self.estimator(text)
+            self.misses += 1
+        else:
+            self.hits += 1
+        return n
+
+    def __len__(self):
+        return len(self._counts)
+
+
+# ---------- Packing ----------
+PackResult = namedtuple("PackResult", ["indices", "tokens", "prefix_tokens", "budget"])
+
+_CALL_RE = re.compile(r"([A-Za-z_]\w*)\s*\(")
+
+def coverage_features(record):
+    """Features an example 'covers': API functions called in its code, plus its answer."""
+    feats = set(_CALL_RE.findall(record.get("code") or ""))
+    answer = (record.get("answer") or "").strip().lower()
+    if answer:
+        feats.add("answer:" + answer)
+    return feats
+
+class ExamplePacker:
+    """
+    Select few-shot examples that fit a token budget.
+
+    Example blocks and their token counts are computed once per packer (and
+    cached by content in `cache`), and the cost order is sorted once, so
+    packing the same dataset for another budget is a bisect plus a slice.
+    Coverage packs start from a score heap built once per packer and only
+    re-score the examples that reach its top (lazy greedy).
+    """
+
+    def __init__(self, records, system, global_apis=None, estimator=estimate_tokens, cache=None,
+                 features=coverage_features):
+        self.records = list(records)
+        self.cache = cache if cache is not None else TokenCountCache(estimator)
+        count = self.cache.count
+        self.prefix = render_prefix(system, global_apis)
+        self.prefix_tokens = count(self.prefix)
+        self.blocks = [render_example(rec) for rec in self.records]
+        self.costs = [count(block) for block in self.blocks]
+        self._features = features
+        self._feature_sets = None
+        self._coverage_heap = None
+        # Cheapest-first order and its running totals, for count-maximizing packs
+        self._by_cost = sorted(range(len(self.costs)), key=self.costs.__getitem__)
+        self._cum = list(accumulate(self.costs[i] for i in self._by_cost))
+
+    def pack(self, budget, reserve=0, strategy="count", order="dataset"):
+        """
+        Pick examples so prefix + examples + `reserve` (room for the live query
+        and the answer) stays within `budget` tokens.
+
+        strategy: "count"    - as many examples as possible (cheapest first)
+                  "coverage" - greedily cover the most distinct features per token,
+                               then fill what is left with the cheapest examples
+        order:    "dataset"  - keep dataset order;  "short_first" - cheapest first
+        """
+        room = budget - reserve - self.prefix_tokens
+        if room <= 0 or not self.costs:
+            return PackResult([], self.prefix_tokens, self.prefix_tokens, budget)
+        if strategy == "count":
+            k = bisect_right(self._cum, room)
+            chosen = self._by_cost[:k]
+        elif strategy == "coverage":
+            chosen = self._pack_coverage(room)
+        else:
+            raise ValueError(f"Unknown strategy: {strategy!r}")
+
+        if order == "dataset":
+            chosen = sorted(chosen)
+        elif order == "short_first":
+            chosen = sorted(chosen, key=lambda i: (self.costs[i], i))
+        else:
+            raise ValueError(f"Unknown order: {order!r}")
+        used = sum(self.costs[i] for i in chosen)
+        return PackResult(chosen, self.prefix_tokens + used, self.prefix_tokens, budget)
+
+    def pack_many(self, budgets, reserve=0, strategy="count", order="dataset"):
+        """Pack once per budget; returns {budget: PackResult}."""
+        return {b: self.pack(b, reserve, strategy, order) for b in budgets}
+
+    def render(self, result):
+        """Prompt text (prefix + chosen examples) for a pack result."""
+        return self.prefix + "".join(self.blocks[i] for i in result.indices)
+
+    def _pack_coverage(self, room):
+        feats, costs = self._feature_sets, self.costs
+        if self._coverage_heap is None:
+            feats = self._feature_sets = [self._features(rec) for rec in self.records]
+            # (-score, index, round scored): a score is new features per token. New features
+            # only shrink as more is covered, so a stale score is an upper bound; a sorted
+            # list is a valid heap.
+            self._coverage_heap = sorted(
+                (-len(f) / max(c, 1), i, 0) for i, (f, c) in enumerate(zip(feats, costs)) if f
+            )
+        heap = list(self._coverage_heap)
+        covered = set()
+        chosen = []
+        left = room
+        while heap:
+            _, i, scored = heap[0]
+            if costs[i] > left:
+                heappop(heap)           # the budget only shrinks: it will not fit later either
+            elif scored == len(chosen):
+                heappop(heap)           # up to date and at least as good as every bound left
+                chosen.append(i)
+                covered |= feats[i]
+                left -= costs[i]
+            else:
+                gain = len(feats[i] - covered)
+                if gain:
+                    heapreplace(heap, (-gain / max(costs[i], 1), i, len(chosen)))
+                else:
+                    heappop(heap)
+        taken = set(chosen)
+        # Spend the rest of the budget on the cheapest remaining examples
+        for i in self._by_cost:
+            if self.costs[i] > left:
+                break
+            if i not in taken:
+                chosen.append(i)
+                taken.add(i)
+                left -= self.costs[i]
+        return chosen
+
+
+# ---------- Assembly ----------
+DEFAULT_QUERY_SECTIONS = ("APIs", "Question")
+
+class PromptAssembler:
+    """
+    Build inference prompts from one fixed few-shot set.
+
+    The invariant prefix (System + global APIs + examples) is rendered once and
+    reused verbatim, so every prompt starts with the same bytes and inference
+    servers can reuse their prefix/KV cache; only the <QUERY> suffix is rendered
+    per call. `prefix_hash` identifies the prefix for cache keys.
+    """
+    __slots__ = ("prefix", "prefix_hash", "n_examples", "_query")
+
+    def __init__(self, system, global_apis=None, examples=(), query_sections=DEFAULT_QUERY_SECTIONS,
+                 apis_scope=None):
+        examples = list(examples)
+        if apis_scope is None:
+            apis_scope = "global" if (global_apis or "").strip() else "per"
+        self.prefix = render_prefix(system, global_apis) + "".join(render_example(r) for r in examples)
+        self.prefix_hash = hashlib.sha256(self.prefix.encode("utf-8")).hexdigest()
+        self.n_examples = len(examples)
+        # The query shows the inputs only; the model produces thought/code/answer.
+        self._query = compile_template({
+            "include_sections": list(query_sections),
+            "apis_scope": "per" if apis_scope == "per" else "none",
+            "show_system_in_preview": False,
+            "show_global_apis_in_preview": False,
+        })
+
+    @classmethod
+    def from_pack(cls, packer, result, system, global_apis=None, **kwargs):
+        """Assembler over the examples chosen by ExamplePacker.pack."""
+        return cls(system, global_apis, [packer.records[i] for i in result.indices], **kwargs)
+
+    def suffix(self, query):
+        """Per-query part only. `query` is a question string or a dict of fields."""
+        if isinstance(query, str):
+            query = {"question": query}
+        return QUERY_OPEN + self._query.render(query) + QUERY_CLOSE
+
+    def build(self, query):
+        """Full prompt: the cached prefix followed by the query block."""
+        return self.prefix + self.suffix(query)
+
+    def build_many(self, queries, split=False):
+        """
+        Prompts for many queries. With split=True returns only the suffixes
+        (send `self.prefix` once and each suffix separately).
+        """
+        suffix = self.suffix
+        if split:
+            return [suffix(q) for q in queries]
+        prefix = self.prefix
+        return [prefix + suffix(q) for q in queries]
@@ -0,0 +1,335 @@
+# retrieval_index.py
+import json
+import math
+import os
+import re
+import threading
+import zlib
+from array import array
+from bisect import bisect_left
+
+import numpy as np
+
+from builder_utils import _truncate
+from dataset_store import DatasetLRU
+
+# ---------- Features ----------
+# Hashed word unigrams + bigrams over question / code / apis. crc32 keeps the
+# hashing stable across processes, so saved indexes stay valid.
+DEFAULT_FIELD_WEIGHTS = {"question": 1.0, "code": 0.5, "apis": 0.25, "global_apis": 0.25}
+DEFAULT_N_FEATURES = 1 << 20
+_WORD_RE = re.compile(r"\w+")
+_FEATURE_CACHE_MAX = 200_000
+
+
+class _Hasher:
+    __slots__ = ("mask", "_cache")
+
+    def __init__(self, n_features):
+        if n_features & (n_features - 1):
+            raise ValueError("n_features must be a power of two")
+        self.mask = n_features - 1
+        self._cache = {}
+
+    def __call__(self, gram):
+        f = self._cache.get(gram)
+        if f is None:
+            if len(self._cache) >= _FEATURE_CACHE_MAX:
+                self._cache.clear()
+            f = self._cache[gram] = zlib.crc32(gram.encode("utf-8")) & self.mask
+        return f
+
+
+# Texts repeated across records (API docs) are tokenized once.
+_REPEATED_FIELDS = ("apis", "global_apis")
+_COUNTS_CACHE_MAX = 4096
+
+
+def _gram_counts(text, hasher):
+    """{feature: count} of hashed unigrams + bigrams."""
+    counts = {}
+    prev = None
+    for word in _WORD_RE.findall(text.lower()):
+        f = hasher(word)
+        counts[f] = counts.get(f, 0) + 1
+        if prev is not None:
+            f = hasher(prev + " " + word)
+            counts[f] = counts.get(f, 0) + 1
+        prev = word
+    return counts
+
+
+# ---------- Index ----------
+class RetrievalIndex:
+    """
+    TF-IDF retrieval over dataset records with hashed n-gram features.
+
+    Postings live in a NumPy CSR "base" built in bulk, plus small per-feature
+    "delta" arrays for records added since, so a query only touches the
+    postings of its own terms. Documents can be appended and deleted by
+    dataset position to stay in step with the dataset; deletes are tombstones
+    until the next rebuild (run automatically once most documents are dead).
+    IDF is applied at query time.
+    """
+
+    BULK_MIN = 256   # extend() with at least this many records rebuilds the base instead
+
+    def __init__(self, n_features=DEFAULT_N_FEATURES, field_weights=None):
+        self.n_features = n_features
+        self.field_weights = dict(field_weights or DEFAULT_FIELD_WEIGHTS)
+        self._hash = _Hasher(n_features)
+        self._counts_cache = {}
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._docs = []         # doc id -> (array('i') features, array('f') weights) or None if deleted
+        self._alive = bytearray()
+        self._order = []        # live doc ids in dataset order (ascending)
+        self._df = {}           # feature -> number of live docs containing it
+        self._base = None       # (keys, ptr, doc ids, weights) CSR by feature
+        self._delta = {}        # feature -> (array('i') doc ids, array('f') weights) added after the base
+
+    # ----- vectors -----
+    def _vector(self, record):
+        """(features, weights): sublinear tf, L2-normalized."""
+        # Weighted counts of the repeated fields are cached as one dict and copied.
+        key = tuple(record.get(f) for f in _REPEATED_FIELDS)
+        cache = self._counts_cache
+        base = cache.get(key)
+        if base is None:
+            base = {}
+            for field, text in zip(_REPEATED_FIELDS, key):
+                w = self.field_weights.get(field, 0.0)
+                if w and text:
+                    for f, c in _gram_counts(text, self._hash).items():
+                        base[f] = base.get(f, 0.0) + w * c
+            if len(cache) >= _COUNTS_CACHE_MAX:
+                cache.clear()
+            cache[key] = base
+        tf = dict(base)
+        for field, w in self.field_weights.items():
+            text = record.get(field)
+            if not w or not text or field in _REPEATED_FIELDS:
+                continue
+            for f, c in _gram_counts(text, self._hash).items():
+                tf[f] = tf.get(f, 0.0) + w * c
+        feats = array("i", tf.keys())
+        vals = np.fromiter(tf.values(), dtype=np.float32, count=len(tf))
+        big = vals >= 1.0
+        vals[big] = 1.0 + np.log(vals[big])
+        norm = float(np.sqrt(np.dot(vals, vals)))
+        if norm:
+            vals /= norm
+        return feats, array("f", vals.tobytes())
+
+    # ----- building -----
+    @classmethod
+    def build(cls, records, **kwargs):
+        index = cls(**kwargs)
+        index.extend(records)
+        return index
+
+    def add(self, record):
+        """Append one record (same position as its append to the dataset)."""
+        feats, vals = self._vector(record)
+        with self._lock:
+            doc = self._append_doc(feats, vals)
+            delta, df = self._delta, self._df
+            for f, v in zip(feats, vals):
+                p = delta.get(f)
+                if p is None:
+                    p = delta[f] = (array("i"), array("f"))
+                p[0].append(doc)
+                p[1].append(v)
+                df[f] = df.get(f, 0) + 1
+        return doc
+
+    def extend(self, records):
+        records = list(records)
+        if len(records) < self.BULK_MIN:
+            for rec in records:
+                self.add(rec)
+            return
+        vectors = [self._vector(rec) for rec in records]
+        with self._lock:
+            for feats, vals in vectors:
+                self._append_doc(feats, vals)
+            self.rebuild()
+
+    def _append_doc(self, feats, vals):
+        doc = len(self._docs)
+        self._docs.append((feats, vals))
+        self._alive.append(1)
+        self._order.append(doc)
+        return doc
+
+    def delete(self, position):
+        """Remove the record at a 0-based dataset position."""
+        with self._lock:
+            doc = self._order.pop(position)
+            self._alive[doc] = 0
+            feats, _ = self._docs[doc]
+            df = self._df
+            for f in feats:
+                df[f] -= 1
+            self._docs[doc] = None
+            if len(self._docs) > 1000 and len(self._order) * 2 < len(self._docs):
+                self.rebuild()
+
+    def rebuild(self):
+        """Renumber live documents and rebuild all postings as one CSR base."""
+        with self._lock:
+            live = [self._docs[d] for d in self._order]
+            n = len(live)
+            self._docs = live
+            self._alive = bytearray(b"\x01") * n
+            self._order = list(range(n))
+            self._delta = {}
+            if not n:
+                self._base, self._df = None, {}
+                return
+            lengths = np.fromiter((len(f) for f, _ in live), dtype=np.int64, count=n)
+            feats = np.concatenate([np.frombuffer(f, dtype=np.int32) for f, _ in live])
+            vals = np.concatenate([np.frombuffer(v, dtype=np.float32) for _, v in live])
+            ids = np.repeat(np.arange(n, dtype=np.int32), lengths)
+            order = np.argsort(feats, kind="stable")
+            feats, ids, vals = feats[order], ids[order], vals[order]
+            keys, starts, counts = np.unique(feats, return_index=True, return_counts=True)
+            ptr = np.append(starts, len(feats)).astype(np.int64)
+            self._base = (keys, ptr, ids, vals)
+            self._df = dict(zip(keys.tolist(), counts.tolist()))
+
+    compact = rebuild
+
+    def __len__(self):
+        return len(self._order)
+
+    # ----- querying -----
+    def search(self, query, k=5):
+        """
+        Top-k most similar records for a question string (or a record dict).
+        Returns [(position, score)] with 0-based dataset positions, best first.
+        """
+        feats, qvals = self._vector({"question": query} if isinstance(query, str) else query)
+        with self._lock:
+            n_live = len(self._order)
+            if not len(feats) or not n_live:
+                return []
+            scores = np.zeros(len(self._docs), dtype=np.float32)
+            df = self._df
+            weights = {}
+            for f, qv in zip(feats, qvals):
+                d = df.get(f, 0)
+                if d > 0:
+                    idf = math.log((n_live + 1) / (d + 1)) + 1.0
+                    weights[f] = np.float32(qv * idf * idf)
+            if self._base is not None and weights:
+                keys, ptr, ids, vals = self._base
+                q = np.fromiter(weights.keys(), dtype=np.int32, count=len(weights))
+                slots = np.searchsorted(keys, q)
+                for f, slot in zip(q.tolist(), slots.tolist()):
+                    if slot < len(keys) and keys[slot] == f:
+                        a, b = ptr[slot], ptr[slot + 1]
+                        scores[ids[a:b]] += weights[f] * vals[a:b]
+            for f, w in weights.items():
+                p = self._delta.get(f)
+                if p is not None:
+                    ids = np.frombuffer(p[0], dtype=np.int32)
+                    vals = np.frombuffer(p[1], dtype=np.float32)
+                    scores[ids] += w * vals
+                    del ids, vals   # release the buffers before the arrays can grow again
+            if n_live < len(self._docs):
+                scores[np.frombuffer(self._alive, dtype=np.uint8) == 0] = 0.0
+            hits = np.flatnonzero(scores > 0)
+            if len(hits) > k:
+                hits = hits[np.argpartition(scores[hits], -k)[-k:]]
+            hits = hits[np.argsort(-scores[hits], kind="stable")]
+            order = self._order
+            return [(bisect_left(order, int(d)), float(scores[d])) for d in hits]
+
+    def search_records(self, dataset, query, k=5):
+        """Like search, but returns [(position, score, record)] from `dataset`."""
+        return [(pos, score, dataset[pos]) for pos, score in self.search(query, k)]
+
+    # ----- persistence -----
+    def save(self, path):
+        """Save to a .npz file (document vectors only; postings are rebuilt on load)."""
+        with self._lock:
+            live = [self._docs[d] for d in self._order]
+            lengths = np.fromiter((len(f) for f, _ in live), dtype=np.int64, count=len(live))
+            ptr = np.zeros(len(live) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=ptr[1:])
+            feats = np.concatenate([np.frombuffer(f, dtype=np.int32) for f, _ in live]) if live else np.zeros(0, np.int32)
+            vals = np.concatenate([np.frombuffer(v, dtype=np.float32) for _, v in live]) if live else np.zeros(0, np.float32)
+            config = json.dumps({"n_features": self.n_features, "field_weights": self.field_weights})
+        np.savez_compressed(path, ptr=ptr, feats=feats, vals=vals, config=np.array(config))
+        return path
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path, allow_pickle=False)
+        config = json.loads(str(data["config"]))
+        index = cls(config["n_features"], config["field_weights"])
+        ptr, feats, vals = data["ptr"], data["feats"].astype(np.int32), data["vals"].astype(np.float32)
+        for i in range(len(ptr) - 1):
+            a, b = ptr[i], ptr[i + 1]
+            f, v = array("i"), array("f")
+            f.frombytes(feats[a:b].tobytes())
+            v.frombytes(vals[a:b].tobytes())
+            index._append_doc(f, v)
+        index.rebuild()
+        return index
+
+
+def index_path_for_export(export_path):
+    return export_path + ".index.npz"
+
+def save_index_for_export(index, export_path):
+    """Save the index next to an export, e.g. fewshot_X.jsonl -> fewshot_X.jsonl.index.npz."""
+    return index.save(index_path_for_export(export_path))
+
+
+def export_with_index(export_fn, dataset, *args, **kwargs):
+    """
+    Run an export_* function, then save the dataset's index next to what it wrote
+    (the file, or the directory of a sharded export). Returns (path, message).
+    Only for exports in dataset order: index positions are record numbers in the file.
+    """
+    path, msg = export_fn(dataset, *args, **kwargs)
+    if path:
+        index = index_for_dataset(dataset) if hasattr(dataset, "id") else RetrievalIndex.build(dataset)
+        target = os.path.dirname(path[0]) if isinstance(path, list) else path
+        msg += f"\n🔎 Retrieval index → {save_index_for_export(index, target)}"
+    return path, msg
+
+
+def similar_rows(dataset, index, query, k=10, max_len=120):
+    """Table rows [#, score, question, answer] for the top-k matches (1-based #)."""
+    rows = []
+    for pos, score, rec in index.search_records(dataset, query, k):
+        rows.append([pos + 1, round(score, 3), _truncate(rec.get("question") or "", max_len), rec.get("answer") or ""])
+    return rows
+
+
+# ---------- Per-dataset registry ----------
+# The app keeps one index per recently used dataset id, built on first search
+# and then kept in step with add/delete/import so it never has to be rebuilt.
+_INDEXES = DatasetLRU()
+
+def index_for_dataset(dataset):
+    """Index for a dataset store (anything with an 'id'), built on first use."""
+    return _INDEXES.get_or_create(dataset.id, lambda: RetrievalIndex.build(dataset))
+
+def on_records_added(dataset_id, records):
+    index = _INDEXES.get(dataset_id)
+    if index is not None:
+        index.extend(records)
+
+def on_record_deleted(dataset_id, position):
+    index = _INDEXES.get(dataset_id)
+    if index is not None:
+        index.delete(position)
+
+def drop_dataset_index(dataset_id):
+    _INDEXES.pop(dataset_id)
@@ -0,0 +1,187 @@
+# search_index.py
+import re
+import threading
+from array import array
+from bisect import bisect_left
+
+import numpy as np
+
+from builder_utils import DEFAULT_PAGE_SIZE, _record_cells, _sanitize_page, page_count
+from dataset_store import DatasetLRU
+
+# ---------- Terms ----------
+# Words of the text fields, plus filter terms for the template meta. Filter
+# terms contain ':' so they can never collide with a word.
+SEARCH_FIELDS = ("answer", "question", "thought", "code")
+_WORD_RE = re.compile(r"\w+")
+
+def query_terms(text):
+    return sorted(set(_WORD_RE.findall((text or "").lower())))
+
+def scope_term(scope):
+    return "scope:" + scope
+
+def section_term(section):
+    return "section:" + section
+
+def record_terms(record):
+    terms = set()
+    for field in SEARCH_FIELDS:
+        text = record.get(field)
+        if text:
+            terms.update(_WORD_RE.findall(text.lower()))
+    meta = record.get("meta") or {}
+    if meta.get("apis_scope"):
+        terms.add(scope_term(meta["apis_scope"]))
+    for section in meta.get("included_sections") or ():
+        terms.add(section_term(section))
+    return terms
+
+
+# ---------- Index ----------
+class SearchIndex:
+    """
+    Inverted index for finding records by words and template filters.
+
+    Every term maps to an ascending array of document ids, so a query
+    intersects the postings of its terms (smallest first) instead of scanning
+    records, and matches come out in dataset order. Appends and deletes by
+    dataset position keep it in step with the dataset; deletes are tombstones
+    until the next rebuild (run automatically once most documents are dead).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}       # term -> array('i') of doc ids, ascending
+        self._alive = bytearray()
+        self._order = []          # live doc ids in dataset order (ascending)
+
+    @classmethod
+    def build(cls, records):
+        index = cls()
+        index.extend(records)
+        return index
+
+    def add(self, record):
+        """Append one record (same position as its append to the dataset)."""
+        terms = record_terms(record)
+        with self._lock:
+            doc = len(self._alive)
+            self._alive.append(1)
+            self._order.append(doc)
+            postings = self._postings
+            for term in terms:
+                p = postings.get(term)
+                if p is None:
+                    p = postings[term] = array("i")
+                p.append(doc)
+        return doc
+
+    def extend(self, records):
+        for rec in records:
+            self.add(rec)
+
+    def delete(self, position):
+        """Remove the record at a 0-based dataset position."""
+        with self._lock:
+            doc = self._order.pop(position)
+            self._alive[doc] = 0
+            if len(self._alive) > 1000 and len(self._order) * 2 < len(self._alive):
+                self.rebuild()
+
+    def rebuild(self):
+        """Drop deleted documents from all postings and renumber the rest."""
+        with self._lock:
+            alive = np.frombuffer(self._alive, dtype=np.uint8).astype(bool)
+            new_ids = np.cumsum(alive, dtype=np.int32) - 1
+            postings = {}
+            for term, p in self._postings.items():
+                ids = np.frombuffer(p, dtype=np.int32)
+                ids = new_ids[ids[alive[ids]]]
+                if len(ids):
+                    postings[term] = array("i", ids.tobytes())
+            n = len(self._order)
+            self._postings = postings
+            self._alive = bytearray(b"\x01") * n
+            self._order = list(range(n))
+
+    def __len__(self):
+        return len(self._order)
+
+    # ----- querying -----
+    def _match_docs(self, terms):
+        if not terms:
+            return None
+        lists = []
+        for term in terms:
+            p = self._postings.get(term)
+            if p is None:
+                return np.zeros(0, dtype=np.int32)
+            lists.append(p)
+        lists.sort(key=len)
+        ids = np.frombuffer(lists[0], dtype=np.int32).copy()
+        for p in lists[1:]:
+            if not len(ids):
+                break
+            ids = np.intersect1d(ids, np.frombuffer(p, dtype=np.int32), assume_unique=True)
+        if len(self._order) < len(self._alive) and len(ids):
+            ids = ids[np.frombuffer(self._alive, dtype=np.uint8)[ids] == 1]
+        return ids
+
+    def search(self, query="", scope=None, sections=(), offset=0, limit=None):
+        """
+        0-based dataset positions of records containing every word of `query`,
+        with meta.apis_scope == `scope` (if given) and all of `sections` included.
+        Returns (positions for [offset, offset + limit), total number of matches).
+        """
+        terms = query_terms(query)
+        if scope:
+            terms.append(scope_term(scope))
+        terms.extend(section_term(s) for s in sections or ())
+        with self._lock:
+            ids = self._match_docs(terms)
+            order = self._order
+            if ids is None:
+                total = len(order)
+                end = total if limit is None else min(offset + limit, total)
+                return list(range(offset, end)), total
+            total = len(ids)
+            end = total if limit is None else offset + limit
+            return [bisect_left(order, int(d)) for d in ids[offset:end]], total
+
+
+def search_page(dataset, index, query="", scope=None, sections=(), page=1, page_size=DEFAULT_PAGE_SIZE,
+                max_len=120):
+    """
+    Table rows for one page of matches (1-based '#' = dataset position).
+    Returns (rows, page, n_pages, total).
+    """
+    _, total = index.search(query, scope, sections, 0, 0)
+    page = _sanitize_page(page, total, page_size)
+    positions, total = index.search(query, scope, sections, (page - 1) * page_size, page_size)
+    if hasattr(dataset, "row_cells"):
+        rows = [[pos + 1] + dataset.row_cells(pos, max_len) for pos in positions]
+    else:
+        rows = [[pos + 1] + _record_cells(dataset[pos], max_len) for pos in positions]
+    return rows, page, page_count(total, page_size), total
+
+
+# ---------- Per-dataset registry ----------
+_INDEXES = DatasetLRU()
+
+def search_index_for_dataset(dataset):
+    """Search index for a recently used dataset store (anything with an 'id'), built on first use."""
+    return _INDEXES.get_or_create(dataset.id, lambda: SearchIndex.build(dataset))
+
+def on_records_added(dataset_id, records):
+    index = _INDEXES.get(dataset_id)
+    if index is not None:
+        index.extend(records)
+
+def on_record_deleted(dataset_id, position):
+    index = _INDEXES.get(dataset_id)
+    if index is not None:
+        index.delete(position)
+
+def drop_dataset_index(dataset_id):
+    _INDEXES.pop(dataset_id)
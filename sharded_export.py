@@ -0,0 +1,226 @@
+# sharded_export.py
+"""
+Sharded, block-compressed JSONL exports with random access by position.
+
+An export is a directory:
+
+    manifest.json            format, compression, records per block, shard files
+    shard-00000.jsonl.gz     blocks of `block_records` JSONL lines, each block an
+    shard-00001.jsonl.gz     independent gzip member / xz stream (or plain text)
+    index.npy                one row per block: shard, byte offset, byte length
+
+Concatenated gzip members / xz streams are valid files, so `zcat shard-*.gz`
+still yields plain JSONL. Readers memory-map index.npy and decompress only the
+blocks holding the requested records.
+"""
+import gzip
+import json
+import lzma
+import os
+import shutil
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from builder_utils import _timestamped_path, intern_record, iter_jsonl_batches
+
+FORMAT = "fewshot-shards-v1"
+MANIFEST = "manifest.json"
+INDEX = "index.npy"
+COMPRESSIONS = {
+    "none": ("", lambda data: data, lambda data: data),
+    "gzip": (".gz", lambda data: gzip.compress(data, compresslevel=6, mtime=0), gzip.decompress),
+    "lzma": (".xz", lambda data: lzma.compress(data, preset=6), lzma.decompress),
+}
+BLOCK_RECORDS = 256
+SHARD_BYTES = 256 << 20
+BLOCK_CACHE = 64        # decompressed blocks kept by a reader
+
+
+# ---------- Writing ----------
+def _compressed_blocks(records, compress, duplicate_system, block_records, workers):
+    """(n_records, compressed bytes) per block, in order; compression runs on threads (zlib/lzma release the GIL)."""
+    batches = iter_jsonl_batches(records, duplicate_system, block_records)
+    if workers == 1:
+        for n, text in batches:
+            yield n, compress(text.encode("utf-8"))
+        return
+    workers = workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for n, text in batches:
+            pending.append((n, pool.submit(compress, text.encode("utf-8"))))
+            if len(pending) >= 2 * workers:
+                n, fut = pending.popleft()
+                yield n, fut.result()
+        while pending:
+            n, fut = pending.popleft()
+            yield n, fut.result()
+
+def write_sharded_export(records, out_dir, compression="gzip", block_records=BLOCK_RECORDS, shard_bytes=SHARD_BYTES,
+                         duplicate_system=True, progress=None, total=None, workers=None, cleanup_on_error=None):
+    """
+    Write records to `out_dir` (created if missing) as size-bounded shards of
+    independently compressed blocks plus an offset index. `progress(done, total)`
+    is called after every block. Returns the number of records written.
+    On failure or cancellation `out_dir` is removed when `cleanup_on_error` is
+    true (default: only if this call created it).
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {compression!r}")
+    ext, compress, _ = COMPRESSIONS[compression]
+    if total is None and hasattr(records, "__len__"):
+        total = len(records)
+    if cleanup_on_error is None:
+        cleanup_on_error = not os.path.isdir(out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    shards, index, done = [], [], 0
+    f = None
+    try:
+        for n, block in _compressed_blocks(records, compress, duplicate_system, block_records, workers):
+            if f is None or f.tell() >= shard_bytes:
+                if f is not None:
+                    f.close()
+                shards.append(f"shard-{len(shards):05d}.jsonl{ext}")
+                f = open(os.path.join(out_dir, shards[-1]), "wb")
+            index.append((len(shards) - 1, f.tell(), len(block)))
+            f.write(block)
+            done += n
+            if progress is not None:
+                progress(done, total)
+        if f is not None:
+            f.close()
+            f = None
+        np.save(os.path.join(out_dir, INDEX), np.array(index, dtype=np.uint64).reshape(-1, 3))
+        manifest = {
+            "format": FORMAT,
+            "compression": compression,
+            "block_records": block_records,
+            "n_records": done,
+            "shards": shards,
+            "index": INDEX,
+        }
+        with open(os.path.join(out_dir, MANIFEST), "w", encoding="utf-8") as mf:
+            json.dump(manifest, mf, indent=2)
+    except BaseException:
+        if f is not None:
+            f.close()
+        if cleanup_on_error:
+            shutil.rmtree(out_dir, ignore_errors=True)
+        raise
+    return done
+
+def export_sharded(state, compression="gzip", duplicate_system=True, progress=None):
+    """
+    Export dataset as a sharded directory (see module docstring).
+    Returns (list of written files, status message) like the other export_* functions.
+    """
+    if not state:
+        return None, "No examples to export yet."
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {compression!r}")
+    out_dir = _timestamped_path("./fewshot_shards", "", directory=True)
+    # The directory was claimed just above, so it is ours to remove if the export fails or is cancelled
+    n = write_sharded_export(
+        state, out_dir, compression, duplicate_system=duplicate_system, progress=progress, cleanup_on_error=True
+    )
+    with open(os.path.join(out_dir, MANIFEST), "r", encoding="utf-8") as f:
+        files = [os.path.join(out_dir, name) for name in json.load(f)["shards"]]
+    files += [os.path.join(out_dir, INDEX), os.path.join(out_dir, MANIFEST)]
+    note = "" if compression == "none" else f", {compression} blocks"
+    return files, f"📦 Exported {n} records in {len(files) - 2} shard(s){note} → {out_dir}"
+
+
+# ---------- Reading ----------
+class ShardedExport:
+    """
+    Random access to a sharded export: `export[i]`, `export.read(positions)`,
+    iteration. The block index is memory-mapped; each read decompresses only
+    the blocks it needs (recently used blocks are kept in a small cache).
+    """
+
+    def __init__(self, path, cache_blocks=BLOCK_CACHE):
+        with open(os.path.join(path, MANIFEST), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format") != FORMAT:
+            raise ValueError(f"{path}: not a sharded export")
+        self.path = path
+        self.compression = manifest["compression"]
+        self.block_records = manifest["block_records"]
+        self.n_records = manifest["n_records"]
+        self.shards = manifest["shards"]
+        self.index = np.load(os.path.join(path, manifest["index"]), mmap_mode="r")
+        self._decompress = COMPRESSIONS[self.compression][2]
+        self._files = [None] * len(self.shards)
+        self._cache = OrderedDict()
+        self._cache_blocks = cache_blocks
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.n_records
+
+    def _block(self, b):
+        with self._lock:
+            lines = self._cache.get(b)
+            if lines is not None:
+                self._cache.move_to_end(b)
+                return lines
+            shard, offset, length = (int(v) for v in self.index[b])
+            f = self._files[shard]
+            if f is None:
+                f = self._files[shard] = open(os.path.join(self.path, self.shards[shard]), "rb")
+            f.seek(offset)
+            data = f.read(length)
+        lines = self._decompress(data).decode("utf-8").split("\n")[:-1]
+        with self._lock:
+            self._cache[b] = lines
+            if len(self._cache) > self._cache_blocks:
+                self._cache.popitem(last=False)
+        return lines
+
+    def _line(self, position):
+        if position < 0:
+            position += self.n_records
+        if not 0 <= position < self.n_records:
+            raise IndexError("record index out of range")
+        b, i = divmod(position, self.block_records)
+        return self._block(b)[i]
+
+    def __getitem__(self, position):
+        return intern_record(json.loads(self._line(position)))
+
+    def read(self, positions):
+        """Records at `positions` (in that order); every needed block is decompressed once."""
+        positions = list(positions)
+        by_block = {}
+        for i, p in enumerate(positions):
+            if p < 0:
+                p += self.n_records
+            if not 0 <= p < self.n_records:
+                raise IndexError("record index out of range")
+            by_block.setdefault(p // self.block_records, []).append((i, p % self.block_records))
+        out = [None] * len(positions)
+        for b in sorted(by_block):
+            lines = self._block(b)
+            for i, j in by_block[b]:
+                out[i] = intern_record(json.loads(lines[j]))
+        return out
+
+    def __iter__(self):
+        for b in range(len(self.index)):
+            for line in self._block(b):
+                yield intern_record(json.loads(line))
+
+    def close(self):
+        for i, f in enumerate(self._files):
+            if f is not None:
+                f.close()
+                self._files[i] = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,204 @@
+# template_variants.py
+"""
+Render or export one dataset under several templates in a single pass.
+
+Records freeze the template they were added with (meta); here every record is
+re-rendered under each variant instead. Field normalization (strip / rstrip,
+default answer) is done once per record and shared by all variants.
+
+    python template_variants.py fewshot.jsonl --variants variants.json --out-dir ab/
+
+variants.json maps a variant name to template settings (DEFAULT_TEMPLATE keys;
+missing keys fall back to DEFAULT_TEMPLATE). Each variant gets
+<name>.previews.txt and/or <name>.jsonl in the output directory.
+
+A variant can only show fields the record kept: sections that were disabled
+when the example was added are not stored and render as empty. Per-example
+and global API texts stand in for each other when a variant switches scope.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+
+from builder_utils import (
+    DEFAULT_TEMPLATE,
+    EXPORT_BATCH_SIZE,
+    _encode_json,
+    compile_template,
+    normalize_fields,
+    to_json_record_with_template,
+)
+
+PREVIEW_SEPARATOR = "\n\n" + "=" * 60 + "\n\n"
+FORMATS = ("previews", "jsonl")
+_NAME_RE = re.compile(r"[^\w.-]+")
+
+
+def variant_template(settings):
+    tmpl = DEFAULT_TEMPLATE.copy()
+    tmpl.update(settings or {})
+    return tmpl
+
+
+class TemplateVariants:
+    """Several templates compiled together; render() returns one text per variant."""
+
+    def __init__(self, templates, system=None, global_apis=None):
+        self.names = list(templates)
+        self.templates = [variant_template(templates[name]) for name in self.names]
+        self.compiled = [compile_template(t) for t in self.templates]
+        self.system = system
+        self.global_apis = global_apis
+        # Union of every (field, mode) any variant needs: each is normalized once per record
+        self._pairs = sorted({(field, mode) for c in self.compiled for field, _, _, mode in c.plan})
+
+    def fields(self, record):
+        """Raw field values of a record, with the run's System / global APIs overrides applied."""
+        apis = record.get("apis") or record.get("global_apis") or ""
+        return {
+            "system": self.system if self.system is not None else record.get("system") or "",
+            "global_apis": self.global_apis if self.global_apis is not None else
+                           record.get("global_apis") or record.get("apis") or "",
+            "apis": apis,
+            "question": record.get("question") or "",
+            "thought": record.get("thought") or "",
+            "code": record.get("code") or "",
+            "answer": record.get("answer") or "",
+        }
+
+    def render(self, record):
+        norm = normalize_fields(self.fields(record), self._pairs)
+        return [c.render_normalized(norm) for c in self.compiled]
+
+    def render_many(self, records):
+        """{name: [text per record]} from one pass over `records`."""
+        out = [[] for _ in self.names]
+        for rec in records:
+            for texts, text in zip(out, self.render(rec)):
+                texts.append(text)
+        return dict(zip(self.names, out))
+
+    def records(self, record):
+        """The record as each variant would have stored it (to_json_record_with_template)."""
+        f = self.fields(record)
+        return [
+            to_json_record_with_template(tmpl, f["system"], f["global_apis"], f["apis"],
+                                         f["question"], f["thought"], f["code"], f["answer"])
+            for tmpl in self.templates
+        ]
+
+
+def _file_name(name):
+    return _NAME_RE.sub("_", name).strip("._") or "variant"
+
+def export_variants(records, templates, out_dir, formats=FORMATS, system=None, global_apis=None,
+                    progress=None, total=None):
+    """
+    Write every variant's outputs in one pass over `records`.
+    Returns {name: {format: path}}; `progress(done, total)` as in the other exporters.
+    If writing fails or is cancelled, the files written so far are removed.
+    """
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise ValueError(f"Unknown formats: {sorted(unknown)}")
+    variants = TemplateVariants(templates, system, global_apis)
+    if total is None and hasattr(records, "__len__"):
+        total = len(records)
+    os.makedirs(out_dir, exist_ok=True)
+    paths, files, buffers = {}, [], []
+    for name in variants.names:
+        paths[name] = {}
+        for fmt in formats:
+            ext = ".previews.txt" if fmt == "previews" else ".jsonl"
+            paths[name][fmt] = os.path.join(out_dir, _file_name(name) + ext)
+    try:
+        for name in variants.names:
+            files.append({fmt: open(paths[name][fmt], "w", encoding="utf-8", buffering=1 << 20) for fmt in formats})
+            buffers.append({fmt: [] for fmt in formats})
+        want_previews = "previews" in formats
+        want_jsonl = "jsonl" in formats
+        done = 0
+        for rec in records:
+            texts = variants.render(rec) if want_previews else None
+            recs = variants.records(rec) if want_jsonl else None
+            for i, buf in enumerate(buffers):
+                if want_previews:
+                    buf["previews"].append(texts[i])
+                if want_jsonl:
+                    buf["jsonl"].append(_encode_json(recs[i]))
+            done += 1
+            if done % EXPORT_BATCH_SIZE == 0:
+                _flush(files, buffers, done - EXPORT_BATCH_SIZE == 0)
+                if progress is not None:
+                    progress(done, total)
+        if done % EXPORT_BATCH_SIZE:
+            _flush(files, buffers, done <= EXPORT_BATCH_SIZE)
+        if progress is not None:
+            progress(done, total)
+    except BaseException:
+        # Failed or cancelled (progress raising): remove the partly written files
+        for fs in files:
+            for f in fs.values():
+                f.close()
+                try:
+                    os.remove(f.name)
+                except OSError:
+                    pass
+        raise
+    finally:
+        for fs in files:
+            for f in fs.values():
+                f.close()
+    return paths
+
+def _flush(files, buffers, first):
+    for fs, buf in zip(files, buffers):
+        for fmt, items in buf.items():
+            if not items:
+                continue
+            if fmt == "previews":
+                text = PREVIEW_SEPARATOR.join(items)
+                fs[fmt].write(text if first else PREVIEW_SEPARATOR + text)
+            else:
+                fs[fmt].write("\n".join(items) + "\n")
+            items.clear()
+
+
+# ---------- Command line ----------
+def main(argv=None):
+    from import_utils import iter_import_batches
+
+    p = argparse.ArgumentParser(description="Render one dataset under several templates in one pass.")
+    p.add_argument("input", help="JSONL or single-object JSON export")
+    p.add_argument("--variants", required=True, help="JSON file: {variant name: template settings}")
+    p.add_argument("--out-dir", required=True, help="directory for <variant>.previews.txt / <variant>.jsonl")
+    p.add_argument("--formats", default=",".join(FORMATS), help="comma-separated: previews,jsonl")
+    p.add_argument("--system-file", help="use this System message for every record")
+    args = p.parse_args(argv)
+
+    with open(args.variants, "r", encoding="utf-8") as f:
+        templates = json.load(f)
+    system = None
+    if args.system_file:
+        with open(args.system_file, "r", encoding="utf-8") as f:
+            system = f.read()
+    formats = tuple(x.strip() for x in args.formats.split(",") if x.strip())
+
+    n_err = 0
+    def records():
+        nonlocal n_err
+        for batch, errors in iter_import_batches(args.input):
+            n_err += len(errors)
+            yield from batch
+
+    paths = export_variants(records(), templates, args.out_dir, formats, system=system)
+    for name, outs in paths.items():
+        print(f"{name}: " + ", ".join(outs.values()))
+    if n_err:
+        print(f"({n_err} unreadable records skipped)", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
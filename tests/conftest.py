@@ -0,0 +1,25 @@
+# tests/conftest.py
+"""The modules live flat in the repository root; make them importable from tests/."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from builder_utils import DEFAULT_APIS, DEFAULT_SYSTEM, DEFAULT_TEMPLATE, to_json_record_with_template  # noqa: E402
+
+
+def _records(n, start=0):
+    return [
+        to_json_record_with_template(
+            DEFAULT_TEMPLATE, DEFAULT_SYSTEM, "", DEFAULT_APIS, f"question {i}?", f"thought {i}", f"x = f({i})", f"a{i}"
+        )
+        for i in range(start, start + n)
+    ]
+
+
+@pytest.fixture
+def make_records():
+    """make_records(n, start=0): n distinct valid records, numbered from `start`."""
+    return _records
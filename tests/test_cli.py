@@ -0,0 +1,88 @@
+# tests/test_cli.py
+import csv
+import json
+
+import pytest
+
+import cli
+from builder_utils import POOL_TABLE_KEY
+from import_utils import load_records
+from retrieval_index import RetrievalIndex, index_path_for_export
+
+
+def _raw_rows(n):
+    return [{"apis": "def f(x): ...", "question": f"q{i}?", "code": f"f({i})", "answer": f"a{i}"} for i in range(n)]
+
+
+def _write_jsonl(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(row if isinstance(row, str) else json.dumps(row))
+            f.write("\n")
+    return str(path)
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_pooled_jsonl_has_one_string_table(tmp_path, workers):
+    src = _write_jsonl(tmp_path / "raw.jsonl", _raw_rows(5000))     # three CHUNK_ROWS chunks
+    out = str(tmp_path / "out.jsonl")
+    assert cli.main(["--input", src, "--jsonl", out, "--pooled", "--workers", str(workers), "--quiet"]) == 0
+    lines = _read(out).splitlines()
+    assert sum(line.startswith('{"' + POOL_TABLE_KEY) for line in lines) == 1
+    records, errors = load_records(out)
+    assert errors == [] and [r["question"] for r in records] == [f"q{i}?" for i in range(5000)]
+
+
+def test_outputs_do_not_depend_on_workers(tmp_path):
+    src = _write_jsonl(tmp_path / "raw.jsonl", _raw_rows(4500))
+    outputs = []
+    for workers in ("1", "3"):
+        prefix = str(tmp_path / f"w{workers}")
+        cli.main(["--input", src, "--workers", workers, "--quiet",
+                  "--previews", prefix + ".txt", "--jsonl", prefix + ".jsonl", "--json", prefix + ".json"])
+        outputs.append([_read(prefix + ext) for ext in (".txt", ".jsonl", ".json")])
+    assert outputs[0] == outputs[1]
+    assert outputs[0][0].count(cli.PREVIEW_SEPARATOR) == 4499
+
+
+def test_bad_rows_are_reported_and_skipped(tmp_path, capsys):
+    rows = _raw_rows(3)
+    src = _write_jsonl(tmp_path / "raw.jsonl", [rows[0], "{oops", "[1, 2]", rows[1], rows[2]])
+    out = str(tmp_path / "out.jsonl")
+    assert cli.main(["--input", src, "--jsonl", out, "--workers", "1", "--quiet"]) == 0
+    err = capsys.readouterr().err
+    assert "row 2: invalid JSON" in err and "row 3: row must be a JSON object" in err
+    assert "Built 3 records (2 skipped)." in err
+    assert [r["question"] for r in load_records(out)[0]] == ["q0?", "q1?", "q2?"]
+
+
+def test_csv_input_and_system_override(tmp_path, capsys):
+    src = str(tmp_path / "raw.csv")
+    with open(src, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["question", "answer", "system"])
+        writer.writeheader()
+        writer.writerow({"question": "q?", "answer": "a", "system": ""})
+        writer.writerow({"question": "r?", "answer": "b", "system": "Row system"})
+    out = str(tmp_path / "out.jsonl")
+    assert cli.main(["--input", src, "--jsonl", out, "--system", "Global", "--quiet"]) == 0
+    assert [r["system"] for r in load_records(out)[0]] == ["Global", "Row system"]
+
+
+def test_nothing_to_do_is_a_usage_error(tmp_path):
+    with pytest.raises(SystemExit):
+        cli.main(["--input", str(tmp_path / "raw.jsonl")])
+
+
+def test_index_is_saved_next_to_each_export(tmp_path):
+    src = _write_jsonl(tmp_path / "raw.jsonl", _raw_rows(50))
+    out, shards = str(tmp_path / "out.jsonl"), str(tmp_path / "shards")
+    assert cli.main(["--input", src, "--jsonl", out, "--sharded", shards + "/", "--index", "--quiet"]) == 0
+    for target in (out, shards):
+        index = RetrievalIndex.load(index_path_for_export(target))
+        assert len(index) == 50
+        assert index.search("q17?", k=1)[0][0] == 17
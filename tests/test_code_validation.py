@@ -0,0 +1,95 @@
+# tests/test_code_validation.py
+import pytest
+
+import code_validation
+from builder_utils import DEFAULT_APIS
+from code_validation import (
+    SYNTAX,
+    UNDECLARED,
+    CodeValidator,
+    check_code,
+    declared_names,
+    issue_rows,
+    summarize,
+    validate_records,
+)
+
+
+def test_declared_names_fall_back_to_def_lines():
+    assert {"classify_image", "read_rgb"} <= declared_names(DEFAULT_APIS)
+    assert declared_names("def crop(img, box) -> img:\n  returns the crop\nclass Box") == {"crop", "Box"}
+    assert declared_names("   ") == frozenset()
+
+
+def test_check_code_reports_syntax_and_undeclared_calls():
+    declared = declared_names(DEFAULT_APIS)
+    code = (
+        "import numpy as np\n"
+        "def helper(x):\n    return len(x)\n"
+        "img = read_rgb(path)\n"
+        "cls = classify_image(img)\n"
+        "segment(img)\n"
+        "helper(np.mean(img))\n"
+        "segment(img.crop())\n"
+    )
+    assert check_code(code, declared) == ((UNDECLARED, 6, "call to undeclared API: segment()"),)
+    assert check_code("segment(img)", frozenset()) == ()          # nothing declared: syntax only
+    (kind, line, msg), = check_code("x = (\n", declared)
+    assert kind == SYNTAX and msg.startswith("syntax error")
+    assert check_code("  \n", declared) == ()
+
+
+def test_validator_caches_by_code_and_apis():
+    validator = CodeValidator()
+    assert validator.validate("segment(img)", DEFAULT_APIS) != ()
+    assert validator.validate("segment(img)", DEFAULT_APIS) != ()
+    assert validator.validate("segment(img)", "", "def segment(img): ...") == ()
+    assert validator.stats()["hits"] == 1 and validator.stats()["misses"] == 2
+    assert validator.stats()["api_blocks"] == 2
+
+
+def _records():
+    good = {"apis": DEFAULT_APIS, "code": "classify_image(read_rgb(p))"}
+    bad = {"apis": DEFAULT_APIS, "code": "segment(img)"}
+    broken = {"global_apis": DEFAULT_APIS, "code": "def f(:\n"}
+    return [good, bad, {"answer": "no code"}, broken, dict(bad), {"code": "anything_goes()"}] * 3
+
+
+def test_validate_records_reports_every_position():
+    progress = []
+    found = validate_records(_records(), workers=1, validator=CodeValidator(),
+                             progress=lambda done, total: progress.append((done, total)))
+    assert [pos for pos, _ in found] == [1, 3, 4, 7, 9, 10, 13, 15, 16]
+    assert found[0][1][0][0] == UNDECLARED and found[1][1][0][0] == SYNTAX
+    assert progress[-1] == (4, 4)                   # distinct code + APIs items
+
+
+def test_parallel_validation_matches_in_process(monkeypatch):
+    expected = validate_records(_records(), workers=1, validator=CodeValidator())
+    monkeypatch.setattr(code_validation, "PARALLEL_MIN_RECORDS", 0)
+    assert validate_records(_records(), workers=2, validator=CodeValidator(), chunk_records=1) == expected
+
+
+def test_cached_results_are_not_checked_again(monkeypatch):
+    validator = CodeValidator()
+    expected = validate_records(_records(), workers=1, validator=validator)
+    monkeypatch.setattr(code_validation, "check_code", None)     # any re-check would fail
+    assert validate_records(_records(), workers=1, validator=validator) == expected
+
+
+def test_reporting():
+    found = validate_records(_records()[:6], workers=1, validator=CodeValidator())
+    assert issue_rows(found, offset=10, limit=2) == [
+        [12, 1, "call to undeclared API: segment()"],
+        [14, 1, found[1][1][0][2]],
+    ]
+    assert summarize(found, 6) == "⚠️ 3 of 6 examples have code issues: #2, #4, #5"
+    assert summarize([], 6).startswith("✅ Code of all 6 examples")
+
+
+@pytest.mark.parametrize("workers", [None, 0])
+def test_single_cpu_checks_in_process(monkeypatch, workers):
+    monkeypatch.setattr(code_validation, "PARALLEL_MIN_RECORDS", 0)
+    monkeypatch.setattr(code_validation.os, "cpu_count", lambda: 1)
+    monkeypatch.setattr(code_validation, "ProcessPoolExecutor", None)
+    assert len(validate_records(_records(), workers=workers, validator=CodeValidator())) == 9
@@ -0,0 +1,95 @@
+# tests/test_dataset_store.py
+import random
+import sqlite3
+
+import pytest
+
+import dataset_store
+from dataset_store import DatasetLRU, open_dataset
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "datasets.sqlite3")
+
+
+def test_open_dataset_rejects_bad_ids(db):
+    with pytest.raises(ValueError):
+        open_dataset("../elsewhere", db)
+    assert len(open_dataset("0123456789abcdef0123456789abcdef", db)) == 0
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_positions_match_a_list(db, seed, make_records):
+    rng = random.Random(seed)
+    ds = open_dataset(path=db)
+    other = open_dataset(ds.id, db)       # a second handle (another handler) on the same dataset
+    ref = []
+    made = 0
+    for _ in range(300):
+        op = rng.random()
+        if op < 0.3 or not ref:
+            new = make_records(rng.randint(1, 5), start=made)
+            made += len(new)
+            ds.extend(new)
+            ref.extend(new)
+        elif op < 0.5:
+            i = rng.randrange(-len(ref), len(ref))
+            assert other.pop(i) == ref.pop(i)
+        elif op < 0.6:
+            i = rng.randrange(len(ref))
+            del ds[i]
+            del ref[i]
+        elif op < 0.7:
+            positions = sorted({rng.randrange(len(ref)) for _ in range(rng.randint(1, 80))})
+            seqs = ds.seqs_at(positions)
+            rows = ds.rows_by_seq(seqs)
+            assert ds.delete_seqs(seqs) == len(seqs)
+            assert other.restore_rows(rows) == len(rows)
+        else:
+            a = rng.randrange(len(ref))
+            b = rng.randrange(a, len(ref) + 3)
+            assert other[a:b] == ref[a:b]
+            assert ds[a] == ref[a] and ds[-1] == ref[-1]
+        assert len(ds) == len(ref)
+    assert list(ds) == ref
+    with pytest.raises(IndexError):
+        ds[len(ref)]
+
+
+def test_writes_from_another_connection_are_picked_up(db, make_records):
+    ds = open_dataset(path=db)
+    ds.extend(make_records(10))
+    assert ds[5]["answer"] == "a5"
+    conn = sqlite3.connect(db)
+    with conn:
+        seq = conn.execute("SELECT seq FROM records WHERE dataset = ? ORDER BY seq LIMIT 1 OFFSET 2",
+                           (ds.id,)).fetchone()[0]
+        conn.execute("DELETE FROM records WHERE seq = ?", (seq,))
+        conn.execute("UPDATE datasets SET n = n - 1 WHERE id = ?", (ds.id,))
+    conn.close()
+    assert ds[5]["answer"] == "a6"
+    assert [rec["answer"] for rec in ds[:4]] == ["a0", "a1", "a3", "a4"]
+
+
+def test_dataset_lru_keeps_the_most_recent():
+    lru = DatasetLRU(max_datasets=2)
+    lru.put("a", 1)
+    lru.put("b", 2)
+    assert lru.get("a") == 1                # "b" is now the least recently used
+    assert lru.get_or_create("c", lambda: 3) == 3
+    assert "b" not in lru and len(lru) == 2
+    assert lru.get_or_create("a", lambda: 99) == 1
+    assert lru.pop("a") == 1 and lru.get("a") is None
+
+
+def test_evicted_seq_lists_are_reloaded(db, make_records, monkeypatch):
+    monkeypatch.setattr(dataset_store, "_SEQS", DatasetLRU(max_datasets=1))
+    first, second = open_dataset(path=db), open_dataset(path=db)
+    first.extend(make_records(5))
+    second.extend(make_records(3, start=10))
+    assert first[4]["answer"] == "a4"           # evicts second's list
+    del second[0]
+    first.extend(make_records(1, start=20))
+    assert [r["answer"] for r in second] == ["a11", "a12"] and second[-1]["answer"] == "a12"
+    assert first[5]["answer"] == "a20" and len(dataset_store._SEQS) == 1
@@ -0,0 +1,46 @@
+# tests/test_dedup_utils.py
+import dedup_utils
+from dataset_store import DatasetLRU, open_dataset
+from dedup_utils import DuplicateIndex, find_duplicate_groups
+
+
+def test_exact_and_near_duplicates():
+    records = [
+        {"question": "How many red cars are in the image?", "code": "count(find(img, 'red car'))"},
+        {"question": "how many RED cars are in the image", "code": "count(find(img, 'red car'))"},
+        {"question": "What color is the sky?", "code": "query(img, 'sky color')"},
+    ]
+    assert find_duplicate_groups(records) == [[0, 1]]
+
+
+def test_records_without_compared_text_never_match():
+    records = [
+        {"answer": "yes", "thought": "one"},
+        {"answer": "no"},
+        {"question": "  ", "code": "\n", "answer": "maybe"},
+        {"question": "Is there a dog?", "code": "exists(img, 'dog')"},
+        {"question": "Is there a dog?", "code": "exists(img, 'dog')"},
+    ]
+    assert find_duplicate_groups(records) == [[3, 4]]
+
+    index = DuplicateIndex.build(records)
+    assert index.check({"answer": "yes"}) == []
+    index.delete(1)
+    index.delete(0)
+    assert len(index) == 3
+    assert index.check(records[3]) == [(1, 1.0, "exact"), (2, 1.0, "exact")]
+
+
+def test_registry_keeps_recently_used_datasets(tmp_path, make_records, monkeypatch):
+    monkeypatch.setattr(dedup_utils, "_INDEXES", DatasetLRU(max_datasets=1))
+    db = str(tmp_path / "datasets.sqlite3")
+    first, second = open_dataset(path=db), open_dataset(path=db)
+    first.extend(make_records(4))
+    second.extend(make_records(2))
+    index = dedup_utils.dedup_index_for_dataset(first)
+    assert dedup_utils.dedup_index_for_dataset(first) is index
+    dedup_utils.dedup_index_for_dataset(second)                 # evicts first's index
+    del first[0]
+    dedup_utils.on_record_deleted(first.id, 0)                  # no index to update
+    rebuilt = dedup_utils.dedup_index_for_dataset(first)
+    assert rebuilt is not index and len(rebuilt) == 3
@@ -0,0 +1,159 @@
+# tests/test_edit_history.py
+import random
+
+import pytest
+
+from builder_utils import DEFAULT_APIS, DEFAULT_SYSTEM, DEFAULT_TEMPLATE, to_json_record_with_template
+import edit_history
+from dataset_store import DatasetLRU, open_dataset
+from edit_history import EditHistory, SqliteEditHistory, edit_record, parse_positions
+
+
+@pytest.fixture
+def dataset(tmp_path, make_records):
+    ds = open_dataset(path=str(tmp_path / "datasets.sqlite3"))
+    ds.extend(make_records(50))
+    return ds
+
+
+# ---------- Helpers ----------
+def test_parse_positions():
+    assert parse_positions("3, 7; 10-12, 12", 20) == [2, 6, 9, 10, 11]
+    assert parse_positions("5-3", 20) == [2, 3, 4]
+    assert parse_positions("  ", 20) == []
+    with pytest.raises(ValueError):
+        parse_positions("0", 20)
+    with pytest.raises(ValueError):
+        parse_positions("19-21", 20)
+    with pytest.raises(ValueError):
+        parse_positions("x", 20)
+
+
+def test_edit_record_keeps_system_required(make_records):
+    rec = make_records(1)[0]
+    with pytest.raises(ValueError, match="System"):
+        edit_record(rec, {"system": ""})
+    with pytest.raises(ValueError, match="System"):
+        edit_record(rec, {"system": "   "})
+    with pytest.raises(ValueError):
+        edit_record(rec, {"meta": {}})
+    assert edit_record(rec, {"question": "new?"})["question"] == "new?"
+    legacy = {k: v for k, v in rec.items() if k != "system"}
+    assert edit_record(legacy, {"answer": "b"})["answer"] == "b"     # already invalid records stay editable
+
+
+
+def test_edit_record_drops_emptied_fields(make_records):
+    rec = make_records(1)[0]
+    out = edit_record(rec, {"thought": "", "code": "  \n"})
+    assert "thought" not in out and "code" not in out
+    assert edit_record(out, {"thought": ""}) == out
+
+
+def test_edit_record_rejects_fields_outside_the_template(make_records):
+    rec = make_records(1)[0]
+    with pytest.raises(ValueError, match="global_apis"):
+        edit_record(rec, {"global_apis": "def g(): ..."})
+    tmpl = {**DEFAULT_TEMPLATE, "include_sections": ["APIs", "Question", "Answer"], "apis_scope": "global"}
+    rec = to_json_record_with_template(tmpl, DEFAULT_SYSTEM, DEFAULT_APIS, "", "q?", "t", "c", "a")
+    for field in ("thought", "code", "apis"):
+        with pytest.raises(ValueError, match=field):
+            edit_record(rec, {field: "x"})
+    assert edit_record(rec, {"global_apis": "def g(): ..."})["global_apis"] == "def g(): ..."
+    assert edit_record({"system": "S"}, {"code": "x"}) == {"system": "S", "code": "x"}    # no meta, no template
+
+# ---------- In memory ----------
+def test_edit_history_undo_redo(make_records):
+    records = make_records(10)
+    history = EditHistory(records)
+    assert history.delete([1, 3]) == 2
+    assert history.edit(0, {"answer": "changed"})
+    assert not history.edit(0, {"answer": "changed"})
+    assert history.replace("question", "Q") == (8, 8)
+    assert history.records[0]["question"] == "Q 0?"
+
+    assert history.undo().startswith("replace")
+    assert history.undo() == "edit #1"
+    assert history.undo() == "delete 2 examples"
+    assert history.undo() is None
+    assert list(history.records) == records
+    assert history.redo() == "delete 2 examples"
+    assert len(history.records) == 8
+    history.delete_range(0, 2)
+    assert not history.can_redo       # a new step drops the redo stack
+
+
+def test_replace_that_empties_system_changes_nothing(make_records):
+    history = EditHistory(make_records(5))
+    with pytest.raises(ValueError, match="nothing was replaced"):
+        history.replace(DEFAULT_SYSTEM, "", fields=["system"])
+    assert not history.can_undo
+    assert all(rec["system"] == DEFAULT_SYSTEM for rec in history.records)
+
+
+# ---------- SQLite ----------
+def test_sqlite_undo_restores_positions_after_later_adds(dataset, make_records):
+    history = SqliteEditHistory(dataset)
+    before = list(dataset)
+    assert history.delete([0, 10, 11, 49]) == 4
+    dataset.extend(make_records(3, start=100))        # added after the delete, not part of the history
+    assert history.undo() == "delete 4 examples"
+    assert list(dataset) == before + make_records(3, start=100)
+    assert history.redo() == "delete 4 examples"
+    assert len(dataset) == 49
+
+
+def test_sqlite_edit_and_replace_undo(dataset):
+    history = SqliteEditHistory(dataset)
+    before = list(dataset)
+    with pytest.raises(ValueError):
+        history.edit(4, {"system": ""})
+    assert not history.can_undo
+    assert history.edit(4, {"code": "y = g()"})
+    assert dataset[4]["code"] == "y = g()"
+    assert history.replace("thought 1", "T1") == (11, 11)        # "thought 1", "thought 10" … "thought 19"
+    assert dataset[1]["thought"] == "T1"
+    history.undo()
+    history.undo()
+    assert list(dataset) == before
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_sqlite_history_matches_in_memory_history(dataset, seed):
+    rng = random.Random(seed)
+    mem = EditHistory(list(dataset))
+    sql = SqliteEditHistory(dataset)
+    for step in range(120):
+        op = rng.random()
+        n = len(mem.records)
+        if op < 0.2 and n:
+            positions = sorted({rng.randrange(n) for _ in range(rng.randint(1, 5))})
+            assert mem.delete(positions) == sql.delete(positions)
+        elif op < 0.3 and n:
+            a = rng.randrange(n)
+            b = min(n, a + rng.randint(1, 6))
+            assert mem.delete_range(a, b) == sql.delete_range(a, b)
+        elif op < 0.5 and n:
+            i = rng.randrange(n)
+            changes = {rng.choice(["question", "answer", "code"]): f"edit {step}"}
+            assert mem.edit(i, changes) == sql.edit(i, changes)
+        elif op < 0.6:
+            find = f"{rng.randrange(10)}"
+            assert mem.replace(find, "#") == sql.replace(find, "#")
+        elif op < 0.8:
+            assert mem.undo() == sql.undo()
+        else:
+            assert mem.redo() == sql.redo()
+        assert list(mem.records) == list(dataset)
+        assert mem.describe() == sql.describe()
+
+
+def test_histories_are_kept_for_recently_used_datasets(dataset, monkeypatch):
+    monkeypatch.setattr(edit_history, "_HISTORIES", DatasetLRU(max_datasets=1))
+    history = edit_history.history_for_dataset(dataset)
+    assert edit_history.history_for_dataset(dataset) is history
+    history.delete([0])
+    other = open_dataset(path=dataset.path)
+    edit_history.history_for_dataset(other)                    # evicts the first history
+    fresh = edit_history.history_for_dataset(dataset)
+    assert fresh is not history and not fresh.can_undo
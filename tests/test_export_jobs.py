@@ -0,0 +1,92 @@
+# tests/test_export_jobs.py
+import os
+import threading
+import time
+
+import pytest
+
+from builder_utils import EXPORT_BATCH_SIZE, export_jsonl_with_options
+from export_jobs import CANCELLED, DONE, FAILED, FINISHED, QUEUED, ExportJobManager
+
+
+def _wait(job, timeout=10):
+    deadline = time.monotonic() + timeout
+    while job.status not in FINISHED:
+        assert time.monotonic() < deadline, f"job still {job.status}"
+        time.sleep(0.005)
+    return job
+
+
+@pytest.fixture
+def jobs():
+    return ExportJobManager(max_workers=1)
+
+
+def test_finished_export_reports_path_and_message(tmp_path, make_records, jobs, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    job = _wait(jobs.submit("JSONL", export_jsonl_with_options, make_records(50), True))
+    assert job.status == DONE and job.done == job.total == 50
+    assert os.path.exists(job.path) and job.describe() == job.message
+    assert jobs.counts() == {DONE: 1}
+
+
+def test_cancel_stops_a_running_export_at_its_next_progress_call(jobs):
+    started, resume, calls = threading.Event(), threading.Event(), []
+
+    def export(progress):
+        progress(1, 3)
+        started.set()
+        resume.wait(10)
+        calls.append("after cancel")
+        progress(2, 3)
+        calls.append("not reached")
+        return "path", "message"
+
+    job = jobs.submit("slow", export)
+    assert started.wait(10)
+    assert "1 of 3 records" in job.describe()
+    assert jobs.cancel(job.id)
+    resume.set()
+    _wait(job)
+    assert job.status == CANCELLED and calls == ["after cancel"] and job.path is None
+    assert job.describe() == "✖️ slow: cancelled after 1 records."
+    assert not jobs.cancel(job.id)              # already finished
+
+
+def test_cancelled_queued_job_never_runs(jobs):
+    gate, ran = threading.Event(), []
+    first = jobs.submit("first", lambda progress: (gate.wait(10), "done"))
+    second = jobs.submit("second", lambda progress: ran.append(1) or ("path", "msg"))
+    assert second.status == QUEUED and jobs.cancel(second.id)
+    gate.set()
+    _wait(first)
+    _wait(second)
+    assert second.status == CANCELLED and ran == []
+
+
+def test_cancelled_writer_removes_its_partial_file(tmp_path, make_records, jobs, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    submitted, written, ready = [], [], threading.Event()
+
+    def export(records, progress):
+        ready.wait(10)
+
+        def cancel_after_first_batch(done, total):
+            progress(done, total)
+            written.extend(os.listdir(tmp_path))
+            submitted[0].cancel()
+        return export_jsonl_with_options(records, True, progress=cancel_after_first_batch)
+
+    submitted.append(jobs.submit("JSONL", export, make_records(3 * EXPORT_BATCH_SIZE)))
+    ready.set()
+    job = _wait(submitted[0])
+    assert job.status == CANCELLED and job.done == EXPORT_BATCH_SIZE
+    assert len(written) == 1 and os.listdir(tmp_path) == []
+
+
+def test_failed_export_keeps_the_error(jobs):
+    def broken(progress):
+        raise OSError("disk full")
+
+    job = _wait(jobs.submit("JSONL", broken))
+    assert job.status == FAILED and job.describe() == "⚠️ JSONL failed: disk full"
@@ -0,0 +1,269 @@
+# tests/test_golden_output.py
+"""
+Rendered text, records and export files must stay byte-identical to the
+original implementation. The reference functions below are copied unchanged
+from the first version of builder_utils.py.
+
+One deliberate difference: records list meta.included_sections in template
+order. The original used set order, which changes with PYTHONHASHSEED, so
+that list is compared as a set; everything else must match byte for byte.
+"""
+import json
+import os
+import random
+from datetime import datetime
+
+import pytest
+
+import builder_utils
+from builder_utils import DEFAULT_ANSWER, DEFAULT_APIS, DEFAULT_SYSTEM
+from dataset_store import Dataset, open_dataset
+
+
+# ---------- Reference (original builder_utils) ----------
+def _resolve_default_answer(answer):
+    ans = (answer or "").strip()
+    return DEFAULT_ANSWER if ans == "" else answer
+
+def _validate_inputs_template(tmpl, system, global_apis, apis, question, code, answer):
+    if not (system or "").strip():
+        return False, "Please fill: System."
+    return True, ""
+
+def ref_build_text(tmpl, system, global_apis, apis, question, thought, code, answer):
+    sections = set((tmpl or {}).get("include_sections", []))
+    scope = (tmpl or {}).get("apis_scope", "per")
+    show_system = bool((tmpl or {}).get("show_system_in_preview", True))
+    show_global_apis = bool((tmpl or {}).get("show_global_apis_in_preview", True))
+    answer = _resolve_default_answer(answer)
+
+    blocks = []
+    idx = 1
+
+    if show_system:
+        blocks.append(f"{idx}. Instruction\n<SYSTEM>{(system or '').strip()}</SYSTEM>\n")
+        idx += 1
+
+    if scope == "global" and show_global_apis and (global_apis or "").strip():
+        blocks.append(f"{idx}. Tool APIs (Global)\n<APIs>\n{(global_apis or '').rstrip()}\n</APIs>\n")
+        idx += 1
+
+    if scope == "per" and "APIs" in sections and (apis or "").strip():
+        blocks.append(f"{idx}. Tool APIs\n<APIs>\n{(apis or '').rstrip()}\n</APIs>\n")
+        idx += 1
+
+    if "Question" in sections and (question or "").strip():
+        blocks.append(f"{idx}. The VQA question:\n{(question or '').strip()}\n")
+        idx += 1
+
+    if "Thought" in sections and (thought or "").strip():
+        blocks.append(f"{idx}. Thought\n<THOUGHT>\n{(thought or '').strip()}\n</THOUGHT>\n")
+        idx += 1
+
+    if "Code" in sections and (code or "").strip():
+        blocks.append(f"{idx}. The generated code\n<CODE>\n{(code or '').rstrip()}\n</CODE>\n")
+        idx += 1
+
+    if "Answer" in sections:
+        blocks.append(f"{idx}. Answer: {(answer or '').strip()}\n")
+        idx += 1
+
+    return "\n".join(blocks).strip()
+
+def ref_render_preview(tmpl, system, global_apis, apis, question, thought, code, answer):
+    sections = set((tmpl or {}).get("include_sections", []))
+    scope = (tmpl or {}).get("apis_scope", "per")
+
+    if scope != "global" and "APIs" not in sections:
+        apis = ""
+    if "Question" not in sections:
+        question = ""
+    if "Code" not in sections:
+        code = ""
+    if "Thought" not in sections:
+        thought = ""
+    if "Answer" not in sections:
+        answer = ""
+
+    ok, msg = _validate_inputs_template(tmpl, system, global_apis, apis, question, code, answer)
+    if not ok:
+        return msg, None
+
+    text = ref_build_text(tmpl, system, global_apis, apis, question, thought, code, answer)
+    return text, text
+
+def ref_to_json_record(tmpl, system, global_apis, apis, question, thought, code, answer):
+    sections = set((tmpl or {}).get("include_sections", []))
+    scope = (tmpl or {}).get("apis_scope", "per")
+    answer = _resolve_default_answer(answer)
+
+    rec = {
+        "meta": {
+            "included_sections": list(sections),
+            "apis_scope": scope,
+            "show_system_in_preview": bool((tmpl or {}).get("show_system_in_preview", True)),
+            "show_global_apis_in_preview": bool((tmpl or {}).get("show_global_apis_in_preview", True)),
+        },
+        "system": system,
+    }
+
+    if scope == "global" and (global_apis or "").strip():
+        rec["global_apis"] = global_apis
+    elif "APIs" in sections and (apis or "").strip():
+        rec["apis"] = apis
+
+    if "Question" in sections and (question or "").strip():
+        rec["question"] = question
+    if "Thought" in sections and (thought or "").strip():
+        rec["thought"] = thought
+    if "Code" in sections and (code or "").strip():
+        rec["code"] = code
+    if "Answer" in sections:
+        rec["answer"] = answer
+    return rec
+
+def ref_format_record_for_view(record):
+    meta = record.get("meta") or {}
+    included = set(meta.get("included_sections") or [])
+    tmpl = {
+        "include_sections": list(included),
+        "apis_scope": meta.get("apis_scope", "per"),
+        "show_system_in_preview": bool(meta.get("show_system_in_preview", True)),
+        "show_global_apis_in_preview": bool(meta.get("show_global_apis_in_preview", True)),
+    }
+    return ref_build_text(
+        tmpl=tmpl,
+        system=record.get("system"),
+        global_apis=record.get("global_apis"),
+        apis=record.get("apis"),
+        question=record.get("question"),
+        thought=record.get("thought"),
+        code=record.get("code"),
+        answer=record.get("answer"),
+    )
+
+def ref_export_jsonl(state, duplicate_system=True):
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = f"./ref_fewshot_{ts}.jsonl"
+    with open(path, "w", encoding="utf-8") as f:
+        for rec in state:
+            out = dict(rec)
+            if not duplicate_system:
+                out.pop("system", None)
+            f.write(json.dumps(out, ensure_ascii=False) + "\n")
+    return path
+
+def ref_export_json_object(state, system_text, template, global_apis_from_ui):
+    scope = (template or {}).get("apis_scope", "per")
+    obj = {"system": system_text, "example": []}
+    if scope == "global":
+        obj["apis"] = global_apis_from_ui
+
+    for rec in state:
+        ex = {}
+        if scope == "per" and "apis" in rec:
+            ex["apis"] = rec["apis"]
+        if "question" in rec: ex["question"] = rec["question"]
+        if "code" in rec:     ex["code"] = rec["code"]
+        if "thought" in rec:  ex["thought"] = rec["thought"]
+        if "answer" in rec:   ex["answer"] = rec["answer"]
+        obj["example"].append(ex)
+
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = f"./ref_fewshot_object_{ts}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
+    return path
+
+
+# ---------- Random inputs ----------
+SECTIONS = ["APIs", "Question", "Thought", "Code", "Answer"]
+TEXTS = [
+    None, "", " ", "\n\t ", "x", "  padded  ", "line one\nline two\n", "\nleading newline",
+    "trailing spaces   \n  ", 'quotes " and \\ backslash', "unicode é ✓ 漢字  ", "{braces} {0} %s",
+    DEFAULT_SYSTEM, DEFAULT_APIS, "<SYSTEM>tags</SYSTEM>",
+]
+
+def random_template(rng):
+    if rng.random() < 0.05:
+        return None
+    tmpl = {}
+    if rng.random() < 0.95:
+        tmpl["include_sections"] = rng.sample(SECTIONS, rng.randint(0, len(SECTIONS)))
+    if rng.random() < 0.95:
+        tmpl["apis_scope"] = rng.choice(["per", "global", "global", "other"])
+    for key in ("show_system_in_preview", "show_global_apis_in_preview"):
+        if rng.random() < 0.9:
+            tmpl[key] = rng.choice([True, False, 0, 1, "", "yes"])
+    return tmpl
+
+def random_args(rng):
+    return [random_template(rng)] + [rng.choice(TEXTS) for _ in range(7)]
+
+def _sections_as_set(rec):
+    out = dict(rec)
+    out["meta"] = dict(rec["meta"], included_sections=sorted(rec["meta"]["included_sections"]))
+    return out
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+# ---------- Tests ----------
+@pytest.mark.parametrize("seed", range(4))
+def test_render_and_records_match_reference(seed):
+    rng = random.Random(seed)
+    builder_utils.RENDER_CACHE.clear()
+    for _ in range(5000):
+        args = random_args(rng)
+        assert builder_utils._build_text(*args) == ref_build_text(*args)
+        assert builder_utils.render_preview_with_template(*args) == ref_render_preview(*args)
+        if args[1] is not None:     # the original crashes on records without a System
+            rec = builder_utils.to_json_record_with_template(*args)
+            ref = ref_to_json_record(*args)
+            assert list(rec) == list(ref) and list(rec["meta"]) == list(ref["meta"])
+            assert json.dumps(_sections_as_set(rec), ensure_ascii=False) == json.dumps(
+                _sections_as_set(ref), ensure_ascii=False
+            )
+            assert builder_utils.get_example_detail([rec], 1) == ref_format_record_for_view(ref)
+
+
+def test_render_is_stable_on_cache_hits():
+    rng = random.Random(99)
+    cases = [random_args(rng) for _ in range(300)]
+    first = [builder_utils.render_preview_with_template(*args) for args in cases]
+    assert [builder_utils.render_preview_with_template(*args) for args in cases] == first
+    assert first == [ref_render_preview(*args) for args in cases]
+
+
+def _dataset_records(n, seed=7):
+    rng = random.Random(seed)
+    records = []
+    while len(records) < n:
+        args = random_args(rng)
+        if (args[1] or "").strip():
+            records.append(builder_utils.to_json_record_with_template(*args))
+    return records
+
+
+@pytest.mark.parametrize("duplicate_system", [True, False])
+@pytest.mark.parametrize("store", ["list", "columnar", "sqlite"])
+def test_exports_match_reference(tmp_path, monkeypatch, duplicate_system, store):
+    monkeypatch.chdir(tmp_path)
+    records = _dataset_records(2500)        # more than one export batch
+    if store == "columnar":
+        state = Dataset(records)
+    elif store == "sqlite":
+        state = open_dataset(path=str(tmp_path / "datasets.sqlite3"))
+        state.extend(records)
+    else:
+        state = records
+
+    path, _ = builder_utils.export_jsonl_with_options(state, duplicate_system)
+    assert _read(path) == _read(ref_export_jsonl(records, duplicate_system))
+
+    for tmpl, gapis in (({"apis_scope": "per"}, None), ({"apis_scope": "global"}, DEFAULT_APIS), (None, "")):
+        path, _ = builder_utils.export_single_json_object(state, DEFAULT_SYSTEM, tmpl, gapis)
+        assert _read(path) == _read(ref_export_json_object(records, DEFAULT_SYSTEM, tmpl, gapis))
+        os.remove(path)
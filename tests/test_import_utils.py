@@ -0,0 +1,100 @@
+# tests/test_import_utils.py
+import json
+
+import pytest
+
+import import_utils
+from builder_utils import DEFAULT_SYSTEM, DEFAULT_TEMPLATE, _encode_json, stream_export_jsonl, write_json_object
+from incremental_export import export_incremental
+from import_utils import format_import_status, load_records
+
+
+def _fields(rec):
+    return {k: v for k, v in rec.items() if k != "meta"}
+
+
+def _write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return str(path)
+
+
+@pytest.mark.parametrize("pooled", [False, True])
+@pytest.mark.parametrize("duplicate_system", [True, False])
+def test_jsonl_round_trip(tmp_path, make_records, pooled, duplicate_system):
+    records = make_records(30)
+    path = str(tmp_path / "export.jsonl")
+    stream_export_jsonl(records, path, duplicate_system=duplicate_system, pooled=pooled)
+    default = None if duplicate_system else DEFAULT_SYSTEM
+    assert load_records(path, default_system=default) == (records, [])
+
+
+def test_records_without_system_need_a_default(tmp_path, make_records):
+    path = str(tmp_path / "export.jsonl")
+    stream_export_jsonl(make_records(3), path, duplicate_system=False)
+    records, errors = load_records(path)
+    assert records == [] and [line for line, _ in errors] == [1, 2, 3]
+
+
+@pytest.mark.parametrize("name", ["export.json", "export"])
+def test_object_round_trip(tmp_path, make_records, name):
+    records = make_records(12)
+    path = str(tmp_path / name)
+    write_json_object(records, path, DEFAULT_SYSTEM, DEFAULT_TEMPLATE, None)
+    loaded, errors = load_records(path)
+    assert errors == []
+    assert [_fields(r) for r in loaded] == [_fields(r) for r in records]
+
+
+def test_tombstoned_export_imports_live_records(tmp_path, make_records):
+    records = make_records(10)
+    path = str(tmp_path / "export.jsonl")
+    export_incremental(records, path)
+    live = records[:2] + records[5:] + make_records(2, start=50)
+    export_incremental(live, path, compact_ratio=1.0)
+    assert load_records(path) == (live, [])
+
+
+@pytest.mark.parametrize("name", ["export.jsonl", "export"])
+def test_bad_lines_are_reported_not_fatal(tmp_path, make_records, name):
+    records = make_records(4)
+    lines = [_encode_json(r) for r in records]
+    text = "{oops\n" + lines[0] + "\n\n" + "[1, 2]\n" + lines[1] + "\n" + '{"question": "q?"}\n' + lines[2] + "\n"
+    loaded, errors = load_records(_write(tmp_path / name, text))
+    assert loaded == records[:3]
+    assert [line for line, _ in errors] == [1, 4, 6]
+    assert errors[0][1].startswith("invalid JSON")
+    assert "Skipped 3 invalid records" in format_import_status(len(loaded), errors, name)
+
+
+def test_malformed_object_file_is_an_import_error(tmp_path):
+    path = _write(tmp_path / "export.json", '{\n  "system": "S",\n  "example": [\n    {"question": \n')
+    loaded, errors = load_records(path)
+    assert loaded == [] and len(errors) == 1
+    assert errors[0][0] == 5 and errors[0][1].startswith("invalid JSON")
+
+
+def test_object_file_without_examples_is_an_import_error(tmp_path):
+    path = _write(tmp_path / "export.json", json.dumps({"system": "S"}, indent=2))
+    assert load_records(path) == ([], [(1, "expected an object with an 'example' list")])
+
+
+def test_parallel_parse_matches_in_process(tmp_path, make_records, monkeypatch):
+    records = make_records(300)
+    path = str(tmp_path / "export.jsonl")
+    stream_export_jsonl(records, path, pooled=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("not json\n")
+    expected = load_records(path, workers=1)
+    monkeypatch.setattr(import_utils, "PARALLEL_MIN_BYTES", 0)
+    assert load_records(path, workers=2) == expected
+    assert len(expected[0]) == 300 and len(expected[1]) == 1
+
+
+def test_single_cpu_parses_in_process(tmp_path, make_records, monkeypatch):
+    path = str(tmp_path / "export.jsonl")
+    stream_export_jsonl(make_records(5), path)
+    monkeypatch.setattr(import_utils, "PARALLEL_MIN_BYTES", 0)
+    monkeypatch.setattr(import_utils.os, "cpu_count", lambda: 1)
+    monkeypatch.setattr(import_utils, "ProcessPoolExecutor", None)     # any pool start would fail
+    assert load_records(path) == (make_records(5), [])
@@ -0,0 +1,152 @@
+# tests/test_incremental_export.py
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from builder_utils import _encode_json
+from incremental_export import (
+    checkpoint_path,
+    compact,
+    export_incremental,
+    export_incremental_for_dataset,
+    has_tombstones,
+    iter_live_lines,
+    load_checkpoint,
+)
+
+
+def _live(path):
+    return [json.loads(line) for line in iter_live_lines(path)]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "export.jsonl")
+
+
+def test_first_export_then_no_changes(path, make_records):
+    records = make_records(20)
+    assert export_incremental(records, path) == (20, 0, 20)
+    with open(path, encoding="utf-8") as f:
+        assert f.read().splitlines() == [_encode_json(rec) for rec in records]
+    size = os.path.getsize(path)
+    assert export_incremental(records, path) == (0, 0, 20)
+    assert os.path.getsize(path) == size
+
+
+def test_deletes_and_adds_after_checkpoint(path, make_records):
+    records = make_records(20)
+    export_incremental(records, path)
+    current = records[:3] + records[5:17] + make_records(4, start=100)
+    assert export_incremental(current, path, compact_ratio=1.0) == (4, 5, 19)
+    assert has_tombstones(path)
+    assert _live(path) == current
+    assert load_checkpoint(path)["dead"] == 10        # 5 tombstones + the 5 lines they hide
+
+
+def test_identical_records_are_counted_not_merged(path, make_records):
+    rec = make_records(1)[0]
+    export_incremental([rec, rec, rec], path)
+    assert export_incremental([rec], path, compact_ratio=1.0) == (0, 2, 1)
+    assert _live(path) == [rec]
+    assert export_incremental([rec, rec], path, compact_ratio=1.0) == (1, 0, 2)
+    assert _live(path) == [rec, rec]
+
+
+def test_compacts_when_dead_lines_dominate(path, make_records):
+    records = make_records(10)
+    export_incremental(records, path)
+    export_incremental(records[:2], path)        # 8 tombstones: well past COMPACT_RATIO
+    assert not has_tombstones(path)
+    with open(path, encoding="utf-8") as f:
+        assert f.read().splitlines() == [_encode_json(rec) for rec in records[:2]]
+    assert load_checkpoint(path)["dead"] == 0
+    assert export_incremental(records[:2], path) == (0, 0, 2)
+
+
+def test_compact_without_checkpoint(path, make_records):
+    records = make_records(6)
+    export_incremental(records, path)
+    export_incremental(records[1:], path, compact_ratio=1.0)
+    os.remove(checkpoint_path(path))
+    assert compact(path) == 5
+    assert _live(path) == records[1:]
+    assert export_incremental(records[1:], path) == (0, 0, 5)     # compact wrote a fresh checkpoint
+
+
+def test_edited_file_invalidates_checkpoint_and_rewrites(path, make_records):
+    records = make_records(8)
+    export_incremental(records, path)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"question": "added by hand"}\n')
+    assert load_checkpoint(path) is None
+    assert export_incremental(records[2:], path) == (6, 0, 6)       # truncated and written in full
+    assert not has_tombstones(path)
+    assert _live(path) == records[2:]
+
+
+@pytest.mark.parametrize("damage", ["missing", "corrupt", "format"])
+def test_unusable_checkpoint_rewrites(path, damage, make_records):
+    records = make_records(5)
+    export_incremental(records, path)
+    cp = checkpoint_path(path)
+    if damage == "missing":
+        os.remove(cp)
+    elif damage == "corrupt":
+        with open(cp, "w", encoding="utf-8") as f:
+            f.write("{not json")
+    else:
+        with open(cp, encoding="utf-8") as f:
+            data = json.load(f)
+        data["format"] = "something-else"
+        with open(cp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+    assert load_checkpoint(path) is None
+    assert export_incremental(records[:3], path) == (3, 0, 3)
+    assert _live(path) == records[:3]
+    assert load_checkpoint(path) is not None
+
+
+def test_changed_options_rewrite(path, make_records):
+    records = make_records(4)
+    export_incremental(records, path, duplicate_system=True)
+    assert export_incremental(records, path, duplicate_system=False) == (4, 0, 4)
+    assert all("system" not in rec for rec in _live(path))
+    assert export_incremental(records, path, duplicate_system=False) == (0, 0, 4)
+
+
+def test_dataset_file_name_only_from_valid_ids(tmp_path, monkeypatch, make_records):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(ValueError):
+        export_incremental_for_dataset(make_records(1), "shards_20260101_000000/../../outside/pwned")
+    assert os.listdir(tmp_path) == []
+    path, _ = export_incremental_for_dataset(make_records(1), "0123456789abcdef0123456789abcdef")
+    assert os.path.exists(tmp_path / os.path.basename(path))
+
+
+def test_concurrent_exports_of_one_file_are_serialized(path, make_records):
+    records = make_records(5)
+    export_incremental(records, path)
+    current = records + make_records(3, start=100)
+    barrier = threading.Barrier(2)
+    results = []
+
+    def slow_progress(done, total):
+        if done == total:
+            time.sleep(0.05)        # widen the window between comparing and writing
+
+    def run():
+        barrier.wait()
+        results.append(export_incremental(current, path, progress=slow_progress))
+
+    threads = [threading.Thread(target=run) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(results) == [(0, 0, 8), (3, 0, 8)]
+    assert _live(path) == current
+    assert export_incremental(current, path) == (0, 0, 8)
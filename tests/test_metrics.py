@@ -0,0 +1,31 @@
+# tests/test_metrics.py
+import threading
+import time
+
+from metrics import SamplingProfiler
+
+
+def _busy(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def test_restarted_profiler_starts_empty():
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy, args=(stop,), name="busy")
+    worker.start()
+    try:
+        profiler = SamplingProfiler(interval=0.001).start()
+        time.sleep(0.05)
+        first = profiler.stop()
+        assert profiler.samples > 0 and "_busy" in first
+        stop.set()
+        worker.join()
+        samples = profiler.samples
+        profiler.start()
+        time.sleep(0.005)
+        assert "_busy" not in profiler.stop()
+        assert profiler.samples < samples
+    finally:
+        stop.set()
+        worker.join()
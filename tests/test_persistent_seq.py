@@ -0,0 +1,102 @@
+# tests/test_persistent_seq.py
+import random
+
+import pytest
+
+from persistent_seq import BRANCH, LEAF, PersistentSeq, _Node, _size
+
+
+def _check_invariants(seq):
+    """Cumulative sizes match the children, leaves sit at the same depth, the length is right."""
+    def walk(node, height):
+        if height == 0:
+            assert type(node) is tuple
+            return len(node)
+        assert type(node) is _Node
+        assert 0 < len(node.children) <= BRANCH
+        total = 0
+        for child, end in zip(node.children, node.sizes):
+            total += walk(child, height - 1)
+            assert end == total
+        return total
+    assert walk(seq._root, seq._height) == len(seq) == _size(seq._root)
+
+
+@pytest.mark.parametrize("n", [0, 1, LEAF - 1, LEAF, LEAF + 1, LEAF * BRANCH + 3, 5000])
+def test_build_and_read(n):
+    items = list(range(n))
+    seq = PersistentSeq(items)
+    _check_invariants(seq)
+    assert len(seq) == n
+    assert list(seq) == items == seq.to_list()
+    assert [seq[i] for i in range(n)] == items
+    assert seq[n // 3:n // 2] == items[n // 3:n // 2]
+    assert seq[::7] == items[::7]
+    if n:
+        assert seq[-1] == items[-1]
+    with pytest.raises(IndexError):
+        seq[n]
+    with pytest.raises(IndexError):
+        seq[-n - 1]
+
+
+def test_versions_are_independent():
+    v1 = PersistentSeq(range(1000))
+    v2 = v1.set(5, "x").delete_range(100, 200).append("end")
+    assert list(v1) == list(range(1000))
+    expected = list(range(1000))
+    expected[5] = "x"
+    del expected[100:200]
+    expected.append("end")
+    assert list(v2) == expected
+
+
+def test_update_resolves_negative_and_duplicate_indices():
+    seq = PersistentSeq(range(10))
+    out = seq.update({-1: "a", 9: "b", 0: "c"})
+    assert list(out) == ["c", 1, 2, 3, 4, 5, 6, 7, 8, "b"]
+    with pytest.raises(IndexError):
+        seq.update({10: "x"})
+
+
+def test_delete_ignores_order_and_duplicates():
+    seq = PersistentSeq(range(10))
+    assert list(seq.delete([7, 1, 1, -1])) == [0, 2, 3, 4, 5, 6, 8]
+    assert seq.delete([]) is seq
+    assert seq.delete_range(5, 5) is seq
+
+
+def test_random_operations_match_a_list():
+    rng = random.Random(1234)
+    ref = list(range(3000))
+    seq = PersistentSeq(ref)
+    versions = [(seq, list(ref))]
+    for step in range(600):
+        op = rng.random()
+        if op < 0.25 and ref:
+            positions = [rng.randrange(len(ref)) for _ in range(rng.randint(1, 40))]
+            seq = seq.delete(positions)
+            drop = set(positions)
+            ref = [x for i, x in enumerate(ref) if i not in drop]
+        elif op < 0.45 and ref:
+            a = rng.randrange(len(ref))
+            b = min(len(ref), a + rng.randint(0, 300))
+            seq = seq.delete_range(a, b)
+            del ref[a:b]
+        elif op < 0.7 and ref:
+            updates = {rng.randrange(-len(ref), len(ref)): f"u{step}.{k}" for k in range(rng.randint(1, 20))}
+            seq = seq.update(updates)
+            for i, item in updates.items():
+                ref[i] = item
+        else:
+            new = [f"a{step}.{k}" for k in range(rng.randint(0, 150))]
+            seq = seq.extend(new)
+            ref.extend(new)
+        _check_invariants(seq)
+        assert len(seq) == len(ref)
+        if step % 20 == 0:
+            assert list(seq) == ref
+            versions.append((seq, list(ref)))
+    assert list(seq) == ref
+    for old, expected in versions:        # older versions never change
+        assert list(old) == expected
@@ -0,0 +1,117 @@
+# tests/test_prompt_utils.py
+import random
+
+import pytest
+
+import builder_utils
+from builder_utils import DEFAULT_APIS, DEFAULT_SYSTEM, DEFAULT_TEMPLATE, to_json_record_with_template
+from prompt_utils import (
+    EXAMPLE_CLOSE,
+    EXAMPLE_OPEN,
+    ExamplePacker,
+    PromptAssembler,
+    coverage_features,
+    render_example,
+)
+
+
+def test_render_example_hides_prefix_blocks(make_records):
+    block = render_example(make_records(1)[0])
+    assert block.startswith(EXAMPLE_OPEN + "1. Tool APIs\n") and block.endswith(EXAMPLE_CLOSE)
+    assert "<SYSTEM>" not in block
+
+
+def test_packing_leaves_the_preview_cache_alone(make_records):
+    builder_utils.RENDER_CACHE.clear()
+    preview = builder_utils.render_preview_with_template(DEFAULT_TEMPLATE, DEFAULT_SYSTEM, "", DEFAULT_APIS,
+                                                         "q?", "", "x = 1", "a")
+    cached = len(builder_utils.RENDER_CACHE)
+    records = make_records(200)
+    packer = ExamplePacker(records, DEFAULT_SYSTEM)
+    PromptAssembler.from_pack(packer, packer.pack(10_000), DEFAULT_SYSTEM)
+    assert len(builder_utils.RENDER_CACHE) == cached
+    assert builder_utils.render_preview_with_template(DEFAULT_TEMPLATE, DEFAULT_SYSTEM, "", DEFAULT_APIS,
+                                                      "q?", "", "x = 1", "a") == preview
+
+
+# ---------- Packing ----------
+def _reference_coverage(packer, room):
+    """The original greedy: rescan every candidate at each step."""
+    feats = [coverage_features(rec) for rec in packer.records]
+    covered, chosen, taken, left = set(), [], set(), room
+    candidates = [i for i, c in enumerate(packer.costs) if c <= left]
+    while candidates:
+        best, best_score = None, 0.0
+        for i in candidates:
+            gain = len(feats[i] - covered)
+            if gain and gain / max(packer.costs[i], 1) > best_score:
+                best, best_score = i, gain / max(packer.costs[i], 1)
+        if best is None:
+            break
+        chosen.append(best)
+        taken.add(best)
+        covered |= feats[best]
+        left -= packer.costs[best]
+        candidates = [i for i in candidates if i not in taken and packer.costs[i] <= left]
+    for i in sorted(range(len(packer.costs)), key=packer.costs.__getitem__):
+        if packer.costs[i] <= left and i not in taken:
+            chosen.append(i)
+            taken.add(i)
+            left -= packer.costs[i]
+        elif packer.costs[i] > left:
+            break
+    return chosen
+
+
+def _varied_records(n, seed=0):
+    rng = random.Random(seed)
+    apis = [f"api_{k}" for k in range(40)]
+    records = []
+    for i in range(n):
+        calls = "\n".join(f"y = {rng.choice(apis)}(x)" for _ in range(rng.randint(0, 4)))
+        code = calls + "\n# " + "pad " * rng.randint(0, 60)
+        records.append(to_json_record_with_template(
+            DEFAULT_TEMPLATE, DEFAULT_SYSTEM, "", "", f"question {i}?", "", code, rng.choice(["yes", "no", str(i % 7)])
+        ))
+    return records
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_coverage_pack_matches_reference_greedy(seed):
+    packer = ExamplePacker(_varied_records(400, seed), DEFAULT_SYSTEM)
+    for budget in (0, 300, 1_000, 4_000, 12_000, 10 ** 6):
+        room = budget - packer.prefix_tokens
+        expected = sorted(_reference_coverage(packer, room)) if room > 0 else []
+        assert packer.pack(budget, strategy="coverage").indices == expected
+
+
+@pytest.mark.parametrize("strategy", ["count", "coverage"])
+@pytest.mark.parametrize("order", ["dataset", "short_first"])
+def test_packs_fit_the_budget_in_the_requested_order(strategy, order):
+    packer = ExamplePacker(_varied_records(300), DEFAULT_SYSTEM)
+    for budget in (600, 2_000, 8_000):
+        result = packer.pack(budget, reserve=100, strategy=strategy, order=order)
+        assert result.tokens == packer.prefix_tokens + sum(packer.costs[i] for i in result.indices)
+        assert result.tokens + 100 <= budget
+        assert len(set(result.indices)) == len(result.indices)
+        if order == "dataset":
+            assert result.indices == sorted(result.indices)
+        else:
+            assert result.indices == sorted(result.indices, key=lambda i: (packer.costs[i], i))
+        assert packer.render(result) == packer.prefix + "".join(packer.blocks[i] for i in result.indices)
+
+
+def test_count_pack_takes_the_most_examples():
+    packer = ExamplePacker(_varied_records(300), DEFAULT_SYSTEM)
+    room = 3_000 - packer.prefix_tokens
+    costs = sorted(packer.costs)
+    most = max(k for k in range(len(costs) + 1) if sum(costs[:k]) <= room)
+    assert len(packer.pack(3_000).indices) == most
+
+
+def test_unknown_strategy_or_order():
+    packer = ExamplePacker(_varied_records(5), DEFAULT_SYSTEM)
+    with pytest.raises(ValueError):
+        packer.pack(10_000, strategy="best")
+    with pytest.raises(ValueError):
+        packer.pack(10_000, order="random")
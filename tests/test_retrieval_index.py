@@ -0,0 +1,107 @@
+# tests/test_retrieval_index.py
+import json
+import os
+
+import pytest
+
+import retrieval_index
+from builder_utils import DEFAULT_SYSTEM, DEFAULT_TEMPLATE, export_jsonl_with_options
+from dataset_store import DatasetLRU, open_dataset
+from retrieval_index import RetrievalIndex, export_with_index, index_path_for_export
+
+TOPICS = ["red cars", "sky color", "dogs playing", "traffic lights", "ocean waves", "mountain snow"]
+
+
+def _records(n):
+    return [
+        {"question": f"How many {TOPICS[i % 6]} are in photo {i}?", "code": f"count(img, '{TOPICS[i % 6]}')",
+         "apis": "def count(img, what): ...", "answer": str(i)}
+        for i in range(n)
+    ]
+
+
+def _positions(hits):
+    return [pos for pos, _ in hits]
+
+
+@pytest.mark.parametrize("n", [30, 600])         # per-record adds, and a bulk-built base
+def test_search_ranks_the_matching_topic_first(n):
+    records = _records(n)
+    index = RetrievalIndex.build(records)
+    hits = index.search("how many dogs playing", k=5)
+    assert len(hits) == 5
+    assert all("dogs playing" in records[pos]["question"] for pos in _positions(hits))
+    assert [s for _, s in hits] == sorted((s for _, s in hits), reverse=True)
+    assert index.search("zebra", k=5) == [] and index.search("", k=5) == []
+
+
+def test_add_and_delete_follow_dataset_positions():
+    records = _records(12)
+    index = RetrievalIndex.build(records)
+    index.add({"question": "unique zebra question", "code": "zebra()"})
+    assert _positions(index.search("unique zebra", k=1)) == [12]
+    for position in (0, 0, 5):
+        index.delete(position)
+    assert len(index) == 10
+    assert _positions(index.search("unique zebra", k=1)) == [9]
+    # photos 0, 1 and 7 are gone, so photo 9 moved to position 6
+    assert _positions(index.search("traffic lights photo 9", k=1)) == [6]
+
+
+def test_rebuild_after_many_deletes_keeps_results():
+    index = RetrievalIndex.build(_records(1200))
+    before = index.search("ocean waves photo 1198", k=3)
+    for _ in range(700):
+        index.delete(0)
+    assert len(index) == 500
+    assert index.search("ocean waves photo 1198", k=3)[0] == (before[0][0] - 700, pytest.approx(before[0][1], rel=0.2))
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = RetrievalIndex.build(_records(300), field_weights={"question": 1.0, "code": 0.5})
+    index.delete(4)
+    index.add({"question": "late addition about sky color"})
+    path = index.save(str(tmp_path / "index.npz"))
+    loaded = RetrievalIndex.load(path)
+    assert len(loaded) == len(index)
+    assert loaded.field_weights == {"question": 1.0, "code": 0.5}
+    for query in ("sky color", "red cars photo 17", "late addition"):
+        assert loaded.search(query, k=7) == pytest.approx(index.search(query, k=7))
+    empty = RetrievalIndex.load(RetrievalIndex().save(str(tmp_path / "empty.npz")))
+    assert len(empty) == 0 and empty.search("anything") == []
+
+
+def test_export_with_index_saves_next_to_the_export(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ds = open_dataset(path=str(tmp_path / "datasets.sqlite3"))
+    ds.extend({**rec, "system": DEFAULT_SYSTEM, "meta": {"included_sections": DEFAULT_TEMPLATE["include_sections"]}}
+              for rec in _records(40))
+    path, msg = export_with_index(export_jsonl_with_options, ds, True)
+    saved = index_path_for_export(path)
+    assert os.path.exists(saved) and saved in msg
+    with open(path, encoding="utf-8") as f:
+        exported = [json.loads(line) for line in f]
+    pos, _ = RetrievalIndex.load(saved).search("mountain snow photo 11", k=1)[0]
+    assert exported[pos]["question"] == "How many mountain snow are in photo 11?"
+    assert retrieval_index._INDEXES.get(ds.id) is not None      # the app's index is reused, not rebuilt
+    retrieval_index.drop_dataset_index(ds.id)
+
+
+def test_export_with_index_skips_empty_exports():
+    assert export_with_index(export_jsonl_with_options, [], True) == (None, "No examples to export yet.")
+
+
+def test_evicted_dataset_index_is_rebuilt(tmp_path, monkeypatch):
+    monkeypatch.setattr(retrieval_index, "_INDEXES", DatasetLRU(max_datasets=1))
+    db = str(tmp_path / "datasets.sqlite3")
+    first, second = open_dataset(path=db), open_dataset(path=db)
+    first.extend(_records(6))
+    second.extend(_records(3))
+    index = retrieval_index.index_for_dataset(first)
+    assert retrieval_index.index_for_dataset(first) is index
+    retrieval_index.index_for_dataset(second)                  # evicts first's index
+    retrieval_index.on_records_added(first.id, [{"question": "unique zebra question"}])
+    first.append({**_records(1)[0], "question": "unique zebra question"})
+    rebuilt = retrieval_index.index_for_dataset(first)
+    assert rebuilt is not index and len(rebuilt) == 7
+    assert _positions(rebuilt.search("unique zebra", k=1)) == [6]
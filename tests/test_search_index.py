@@ -0,0 +1,66 @@
+# tests/test_search_index.py
+import search_index
+from dataset_store import DatasetLRU, open_dataset
+from search_index import SearchIndex, search_page
+
+
+def test_registry_keeps_recently_used_datasets(tmp_path, make_records, monkeypatch):
+    monkeypatch.setattr(search_index, "_INDEXES", DatasetLRU(max_datasets=1))
+    db = str(tmp_path / "datasets.sqlite3")
+    first, second = open_dataset(path=db), open_dataset(path=db)
+    first.extend(make_records(5))
+    second.extend(make_records(2))
+    index = search_index.search_index_for_dataset(first)
+    assert search_index.search_index_for_dataset(first) is index
+    search_index.search_index_for_dataset(second)               # evicts first's index
+    first.extend(make_records(1, start=40))
+    search_index.on_records_added(first.id, make_records(1, start=40))     # no index to update
+    rebuilt = search_index.search_index_for_dataset(first)
+    assert rebuilt is not index and len(rebuilt) == 6
+    assert rebuilt.search("question 40") == ([5], 1)
+
+
+def _meta_records(make_records):
+    records = make_records(6)
+    records[1]["question"] = "How many RED cars?"
+    records[4]["question"] = "red cars parked"
+    records[4]["meta"] = {**records[4]["meta"], "apis_scope": "global", "included_sections": ["Question", "Answer"]}
+    return records
+
+
+def test_words_and_filters_intersect(make_records):
+    index = SearchIndex.build(_meta_records(make_records))
+    assert index.search("red cars") == ([1, 4], 2)
+    assert index.search("RED", scope="per") == ([1], 1)
+    assert index.search("", sections=["Code"]) == ([0, 1, 2, 3, 5], 5)
+    assert index.search("red", sections=["Code"]) == ([1], 1)
+    assert index.search("red zebra") == ([], 0)
+    assert index.search() == ([0, 1, 2, 3, 4, 5], 6)
+    assert index.search("question", offset=1, limit=2) == ([2, 3], 4)
+
+
+def test_deletes_shift_positions(make_records):
+    records = _meta_records(make_records)
+    index = SearchIndex.build(records)
+    index.delete(0)
+    index.add({"question": "red bus"})
+    assert len(index) == 6
+    assert index.search("red") == ([0, 3, 5], 3)
+
+
+def test_rebuild_after_many_deletes_keeps_results(make_records):
+    records = make_records(1500)
+    index = SearchIndex.build(records)
+    for _ in range(1000):
+        index.delete(0)
+    assert len(index._alive) < 1500          # rebuilt once most documents were dead
+    assert index.search("a1234") == ([234], 1)
+    assert index.search("thought")[1] == 500
+
+
+def test_search_page_numbers_rows_by_position(make_records):
+    records = _meta_records(make_records)
+    index = SearchIndex.build(records)
+    rows, page, n_pages, total = search_page(records, index, "question", page=9, page_size=2)
+    assert (page, n_pages, total) == (2, 2, 4)
+    assert [row[0] for row in rows] == [4, 6] and rows[1][1] == "a5"
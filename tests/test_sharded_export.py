@@ -0,0 +1,58 @@
+# tests/test_sharded_export.py
+import gzip
+import os
+
+import pytest
+
+from sharded_export import MANIFEST, ShardedExport, write_sharded_export
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip", "lzma"])
+def test_random_access_matches_records(tmp_path, make_records, compression):
+    records = make_records(100)
+    out = str(tmp_path / "shards")
+    assert write_sharded_export(records, out, compression, block_records=8, shard_bytes=2000, workers=2) == 100
+    with ShardedExport(out, cache_blocks=2) as export:
+        assert len(export) == 100 and len(export.shards) > 1
+        assert export[0] == records[0] and export[57] == records[57] and export[-1] == records[-1]
+        positions = [99, 3, 64, 3, -2, 8]
+        assert export.read(positions) == [records[p] for p in positions]
+        assert list(export) == records
+        assert len(export._cache) <= 2
+        with pytest.raises(IndexError):
+            export[100]
+        with pytest.raises(IndexError):
+            export.read([0, -101])
+
+
+def test_gzip_shards_concatenate_to_plain_jsonl(tmp_path, make_records):
+    out = str(tmp_path / "shards")
+    write_sharded_export(make_records(20), out, "gzip", block_records=6, duplicate_system=False)
+    with ShardedExport(out) as export:
+        lines = []
+        for name in export.shards:
+            with gzip.open(os.path.join(out, name)) as f:
+                lines += f.read().splitlines()
+        assert len(lines) == 20
+        assert all("system" not in rec for rec in export)
+
+
+def test_failed_export_removes_only_a_directory_it_created(tmp_path, make_records):
+    def cancel(done, total):
+        raise KeyboardInterrupt
+
+    created = str(tmp_path / "new")
+    with pytest.raises(KeyboardInterrupt):
+        write_sharded_export(make_records(20), created, block_records=4, progress=cancel)
+    assert not os.path.exists(created)
+    existing = tmp_path / "existing"
+    existing.mkdir()
+    with pytest.raises(KeyboardInterrupt):
+        write_sharded_export(make_records(20), str(existing), block_records=4, progress=cancel)
+    assert existing.is_dir() and not (existing / MANIFEST).exists()
+
+
+def test_reader_rejects_other_directories(tmp_path):
+    (tmp_path / MANIFEST).write_text('{"format": "something-else"}')
+    with pytest.raises(ValueError, match="not a sharded export"):
+        ShardedExport(str(tmp_path))
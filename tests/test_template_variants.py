@@ -0,0 +1,78 @@
+# tests/test_template_variants.py
+import json
+import os
+
+import pytest
+
+import template_variants
+from builder_utils import DEFAULT_TEMPLATE, render_preview_with_template
+from template_variants import PREVIEW_SEPARATOR, TemplateVariants, export_variants
+
+VARIANTS = {
+    "full": {},
+    "short": {"include_sections": ["Question", "Answer"], "show_system_in_preview": False},
+    "global": {"apis_scope": "global"},
+}
+
+
+def _expected(settings, rec):
+    tmpl = {**DEFAULT_TEMPLATE, **settings}
+    apis = rec.get("apis") or ""
+    text, _ = render_preview_with_template(tmpl, rec["system"], apis, apis, rec.get("question"), rec.get("thought"),
+                                           rec.get("code"), rec.get("answer"))
+    return text
+
+
+def test_render_matches_single_template_previews(make_records):
+    records = make_records(5)
+    records[2] = {k: v for k, v in records[2].items() if k not in ("thought", "answer")}
+    rendered = TemplateVariants(VARIANTS).render_many(records)
+    assert list(rendered) == list(VARIANTS)
+    for name, settings in VARIANTS.items():
+        assert rendered[name] == [_expected(settings, rec) for rec in records]
+
+
+def test_export_writes_every_variant(tmp_path, make_records):
+    records = make_records(7)
+    calls = []
+    paths = export_variants(records, VARIANTS, str(tmp_path / "out"), progress=lambda d, t: calls.append((d, t)))
+    assert calls[-1] == (7, 7)
+    stored = {}
+    for name, settings in VARIANTS.items():
+        with open(paths[name]["previews"], encoding="utf-8") as f:
+            assert f.read().split(PREVIEW_SEPARATOR) == [_expected(settings, rec) for rec in records]
+        with open(paths[name]["jsonl"], encoding="utf-8") as f:
+            stored[name] = [json.loads(line) for line in f]
+    assert stored["full"] == records
+    assert set(stored["short"][0]) == {"meta", "system", "question", "answer"}
+    assert stored["global"][0]["global_apis"] == records[0]["apis"] and "apis" not in stored["global"][0]
+
+
+def test_export_batches_match_one_pass(tmp_path, make_records, monkeypatch):
+    records = make_records(11)
+    whole = export_variants(records, VARIANTS, str(tmp_path / "whole"))
+    monkeypatch.setattr(template_variants, "EXPORT_BATCH_SIZE", 3)
+    batched = export_variants(records, VARIANTS, str(tmp_path / "batched"))
+    for name in VARIANTS:
+        for fmt in ("previews", "jsonl"):
+            with open(whole[name][fmt], encoding="utf-8") as a, open(batched[name][fmt], encoding="utf-8") as b:
+                assert a.read() == b.read()
+
+
+def test_cancelled_export_removes_partial_files(tmp_path, make_records, monkeypatch):
+    monkeypatch.setattr(template_variants, "EXPORT_BATCH_SIZE", 2)
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    (out_dir / "keep.txt").write_text("not ours")
+
+    def cancel(done, total):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        export_variants(make_records(6), VARIANTS, str(out_dir), progress=cancel)
+    assert os.listdir(out_dir) == ["keep.txt"]
+
+
+def test_unknown_format_is_rejected(tmp_path, make_records):
+    with pytest.raises(ValueError, match="Unknown formats"):
+        export_variants(make_records(1), VARIANTS, str(tmp_path), formats=("csv",))